@@ -1,23 +1,592 @@
 # CARDlongread_ONT_meth_benchmark.py
 # full methylation benchmark based on https://github.com/NIH-CARD/CARDlongread_meth_R.9vs10
 # takes multiple ONT methylBeds and/or corresponding bisulfite methylation as inputs
+# all inputs are merged on CpG position in one chunked pass (CARDlongread_meth_merge.py) and reduced to fixed-size summaries,
+# so genome-wide per CpG tables are never held in memory for every sample at once
+# the spreadsheet is streamed row by row (xlsxwriter constant memory mode) and holds summary tables and figures only;
+# tables too long for a worksheet and the optional per CpG detail (--cpg_detail) go to companion Parquet files listed on its Index sheet
 # import needed libraries
 import pandas as pd
 # possibly switch to polars for speed/memory efficiency improvements
 # import polars as pl
 import numpy as np
 import argparse
+import seaborn as sb
+import matplotlib.pyplot as plt
+import importlib.util
+import time
+import glob
+import re
+import os
+from matplotlib.patches import Patch
+from CARDlongread_meth_merge import iter_merged_methylation_blocks
+from CARDlongread_meth_stats import init_histogram_accumulator, update_histogram_accumulator, merge_histogram_accumulators, scott_bandwidth, fft_kde
+from CARDlongread_meth_plotting import hue_colors
+from CARDlongread_meth_render_pool import plot_task, render_plots, report_render_errors
+from CARDlongread_meth_render_manifest import add_render_manifest_arguments, render_manifest_path
+from CARDlongread_meth_figure_output import add_figure_output_arguments, figure_output_options, figure_output_path, figure_data_only, set_figure_data, save_figure
+from CARDlongread_meth_io import report_stream_usage, detect_compression, build_chromosome_offsets
+from CARDlongread_meth_regions import add_region_arguments, region_selection, chromosome_selection, unindexed_region_inputs, check_selection_chromosomes
+from CARDlongread_meth_concordance import DEFAULT_COVERAGE_STRATA, init_concordance_accumulator, update_concordance_accumulator, merge_concordance_accumulators, concordance_table, coverage_stratified_table, confusion_table
+from CARDlongread_meth_parallel import add_parallel_arguments, parallel_workers, iter_chromosome_jobs
+from CARDlongread_meth_instrument import add_instrument_arguments, init_run_report, measure_stage, stage_file_name
+
+# percent methylated axis shared by every plot
+METH_RANGE=(0.0,100.0)
+# default rows per parsed chunk and input
+BENCHMARK_CHUNKSIZE=1000000
+# default maximum rows of a table worksheet - longer tables are written to companion files
+MAX_SHEET_ROWS=100000
+# data rows of an Excel worksheet below its header row
+EXCEL_MAX_ROWS=1048575
+# characters Excel does not allow in worksheet names
+INVALID_SHEET_NAME_CHARACTERS=r'[\[\]:*?/\\]'
 
 def parse_args():
-def meth_split_violinplot():
-def meth_lineplot():
-def meth_prop_grouped_barplot():
-def meth_prop_heatmap():
+    parser = argparse.ArgumentParser(description="Benchmark ONT methylation calls (modkit pileup bedMethyls) across samples and against bisulfite sequencing ground truths (Bismark coverage files).")
+    # argument for ONT methylBed inputs
+    parser.add_argument("--ont_methylbeds", required=True, nargs="+", help="Input ONT modkit pileup bedMethyl file(s), coordinate sorted with strands combined (modkit pileup --cpg --combine-strands).")
+    # argument for ONT sample names
+    parser.add_argument("--ont_names", required=False, nargs="+", help="Name(s) of ONT samples (default file names).")
+    # argument for bisulfite inputs
+    parser.add_argument("--bisulfite", required=False, nargs="*", default=[], help="Bisulfite sequencing ground truth Bismark coverage file(s), coordinate sorted with CpG strands merged (coverage2cytosine --merge_CpG). Give one for all ONT samples or one per ONT sample.")
+    # argument for bisulfite names
+    parser.add_argument("--bisulfite_names", required=False, nargs="+", help="Name(s) of bisulfite ground truths (default file names).")
+    # argument for output prefix
+    parser.add_argument("--output_prefix", required=True, help="Prefix for output plots and spreadsheet.")
+    # argument for plot title
+    parser.add_argument("--plot_title", required=False, default="ONT methylation benchmark", help="Title for each output plot.")
+    # argument for modification code
+    parser.add_argument("--mod_code", required=False, default="m", help="Modified base code to benchmark from modkit pileup (default m, 5mC).")
+    # argument for coverage cutoff
+    parser.add_argument("--min_coverage", required=False, type=int, default=5, help="Minimum valid coverage per CpG in each input (default 5).")
+    # argument for number of methylation categories
+    parser.add_argument("--prop_bins", required=False, type=int, default=5, help="Number of equal-width methylation categories for proportion barplot and heatmap (default 5, i.e., 0-20%%, ..., 80-100%%).")
+    # argument for number of lineplot bins
+    parser.add_argument("--lineplot_bins", required=False, type=int, default=20, help="Number of bisulfite methylation bins for ONT vs. bisulfite lineplot (default 20).")
+    # argument for coverage strata
+    parser.add_argument("--coverage_strata", required=False, type=int, nargs="+", default=DEFAULT_COVERAGE_STRATA, help="Lower bounds of ONT coverage strata above --min_coverage for coverage-stratified concordance (default " + " ".join(str(bound) for bound in DEFAULT_COVERAGE_STRATA) + ").")
+    # argument for Spearman correlation resolution
+    parser.add_argument("--rank_bins", required=False, type=int, default=500, help="Number of methylation bins per axis of the joint ONT/bisulfite distribution used for Spearman correlation (default 500, i.e., 0.2%% resolution).")
+    # argument for number of histogram bins
+    parser.add_argument("--hist_bins", required=False, type=int, default=100, help="Number of methylation histogram bins behind violin medians (default 100).")
+    # argument for chunked parsing
+    parser.add_argument("--chunksize", required=False, type=int, default=BENCHMARK_CHUNKSIZE, help="Number of rows per parsed chunk and input (default " + str(BENCHMARK_CHUNKSIZE) + ").")
+    # argument for maximum worksheet rows
+    parser.add_argument("--max_sheet_rows", required=False, type=int, default=MAX_SHEET_ROWS, help="Tables longer than this are written to companion files ((output_prefix)_(table).parquet, or .tsv.gz without pyarrow) listed on the spreadsheet's Index sheet instead of worksheets (default " + str(MAX_SHEET_ROWS) + ", at most " + str(EXCEL_MAX_ROWS) + ").")
+    # argument for per CpG detail output
+    parser.add_argument("--cpg_detail", required=False, action='store_true', help="Also write merged per CpG values (percent methylated and valid coverage of every input, before --min_coverage) to (output_prefix)_cpg_detail/(chromosome).parquet, one file per chromosome listed on the spreadsheet's Index sheet (requires pyarrow).")
+    # argument for number of parallel plot rendering processes
+    parser.add_argument("--jobs", required=False, type=int, default=1, help="Number of worker processes rendering figures in parallel (default 1).")
+    # argument to redraw figures with unchanged inputs and parameters
+    add_render_manifest_arguments(parser)
+    # arguments for figure format, resolution, and data only output
+    add_figure_output_arguments(parser)
+    # arguments for chromosome-parallel merging
+    add_parallel_arguments(parser)
+    # arguments for restricting the benchmark to chromosomes or regions
+    add_region_arguments(parser)
+    # argument for per stage cProfile dumps (timing and memory are always written to the run report)
+    add_instrument_arguments(parser)
+    # return parsed arguments
+    return parser.parse_args()
+
+# subroutine to start benchmark summaries - per input methylation category counts, per ONT/bisulfite pair histograms/KDEs, lineplot bins,
+# and concordance statistics (CARDlongread_meth_concordance.py; confusion matrices use the methylation categories)
+# inputs are ONT samples followed by bisulfite ground truths; pairs are (ONT input index, bisulfite input index)
+def init_benchmark_summary(ont_names,bisulfite_names,pairs,prop_bins=5,lineplot_bins=20,hist_bins=100,coverage_bounds=(5,),rank_bins=500):
+    num_inputs=len(ont_names)+len(bisulfite_names)
+    num_pairs=len(pairs)
+    # violin levels - ONT then bisulfite per pair
+    violin_levels=[]
+    for ont_idx, bisulfite_idx in pairs:
+        violin_levels.extend([ont_names[ont_idx] + " ONT",ont_names[ont_idx] + " bisulfite"])
+    return {
+        'ont_names': list(ont_names),
+        'bisulfite_names': list(bisulfite_names),
+        'pairs': list(pairs),
+        'prop_bins': prop_bins,
+        'lineplot_bins': lineplot_bins,
+        # CpGs per input and methylation category
+        'prop_counts': np.zeros((num_inputs,prop_bins),dtype=np.int64),
+        # sum of percent methylated per input
+        'meth_sum': np.zeros(num_inputs),
+        # ONT and bisulfite methylation distributions on CpGs covered in both
+        'violin': init_histogram_accumulator(violin_levels,METH_RANGE,hist_bins),
+        # ONT methylation per bisulfite methylation bin
+        'line_n': np.zeros((num_pairs,lineplot_bins),dtype=np.int64),
+        'line_sum': np.zeros((num_pairs,lineplot_bins)),
+        'line_sum_squares': np.zeros((num_pairs,lineplot_bins)),
+        # ONT vs. bisulfite concordance
+        'concordance': init_concordance_accumulator([ont_names[ont_idx] + " vs. " + bisulfite_names[bisulfite_idx-len(ont_names)] for ont_idx, bisulfite_idx in pairs],coverage_bounds,METH_RANGE,rank_bins,prop_bins)
+    }
+
+# subroutine to get equal-width bin positions of percent methylated values (100% falls into the last bin)
+def meth_bin_positions(percent_modified,bins):
+    return np.minimum((percent_modified*(bins/METH_RANGE[1])).astype(np.int64),bins-1)
+
+# subroutine to add one merged block (CARDlongread_meth_merge.iter_merged_methylation_blocks) to benchmark summaries
+# calls with coverage below min_coverage are left out
+def update_benchmark_summary(summary,block,min_coverage):
+    percent_modified=block['percent_modified']
+    covered=(block['coverage']>=min_coverage) & np.isfinite(percent_modified)
+    prop_bins=summary['prop_bins']
+    lineplot_bins=summary['lineplot_bins']
+    for input_idx in range(percent_modified.shape[0]):
+        values=percent_modified[input_idx,covered[input_idx]].astype(np.float64)
+        summary['prop_counts'][input_idx]+=np.bincount(meth_bin_positions(values,prop_bins),minlength=prop_bins)
+        summary['meth_sum'][input_idx]+=values.sum()
+    if len(summary['pairs'])==0:
+        return summary
+    # all pairs as (pairs x CpGs) arrays for the concordance kernel
+    ont_idxs, bisulfite_idxs = np.array(summary['pairs']).T
+    pair_shared=covered[ont_idxs] & covered[bisulfite_idxs]
+    update_concordance_accumulator(summary['concordance'],percent_modified[ont_idxs],percent_modified[bisulfite_idxs],block['coverage'][ont_idxs],pair_shared)
+    for pair_idx, (ont_idx, bisulfite_idx) in enumerate(summary['pairs']):
+        shared=pair_shared[pair_idx]
+        ont_values=percent_modified[ont_idx,shared].astype(np.float64)
+        bisulfite_values=percent_modified[bisulfite_idx,shared].astype(np.float64)
+        update_histogram_accumulator(summary['violin'],np.concatenate([ont_values,bisulfite_values]),np.repeat([2*pair_idx,2*pair_idx+1],len(ont_values)))
+        line_positions=meth_bin_positions(bisulfite_values,lineplot_bins)
+        summary['line_n'][pair_idx]+=np.bincount(line_positions,minlength=lineplot_bins)
+        summary['line_sum'][pair_idx]+=np.bincount(line_positions,weights=ont_values,minlength=lineplot_bins)
+        summary['line_sum_squares'][pair_idx]+=np.bincount(line_positions,weights=ont_values*ont_values,minlength=lineplot_bins)
+    return summary
+
+# subroutine to merge benchmark summaries with the same inputs and bins (e.g., from separate chromosomes)
+def merge_benchmark_summaries(summaries):
+    merged=dict(summaries[0])
+    for key in ['prop_counts','meth_sum','line_n','line_sum','line_sum_squares']:
+        merged[key]=sum(summary[key] for summary in summaries)
+    merged['violin']=merge_histogram_accumulators([summary['violin'] for summary in summaries])
+    merged['concordance']=merge_concordance_accumulators([summary['concordance'] for summary in summaries])
+    return merged
+
+# subroutine to get the per CpG detail directory of an output prefix
+def cpg_detail_dir(output_prefix):
+    return output_prefix + "_cpg_detail"
+
+# subroutine to start per CpG detail output - merged blocks are appended to (detail_dir)/(chromosome).parquet as row groups,
+# so memory stays bounded by one block; files lists the written files as dicts of chrom, path, and rows
+def init_cpg_detail(detail_dir,input_names):
+    return {'dir': detail_dir, 'input_names': input_names, 'chrom': None, 'writer': None, 'files': []}
+
+# subroutine to append one merged block (see CARDlongread_meth_merge.aligned_block) to per CpG detail output
+def update_cpg_detail(detail,block):
+    import pyarrow
+    import pyarrow.parquet
+    num_positions=len(block['position'])
+    if num_positions==0:
+        return
+    columns={
+        # one dictionary entry per block instead of a chromosome name per CpG
+        'chrom': pyarrow.DictionaryArray.from_arrays(np.zeros(num_positions,dtype=np.int32),[block['chrom']]),
+        'position': block['position']
+    }
+    for input_idx, input_name in enumerate(detail['input_names']):
+        columns[input_name + " percent methylated"]=block['percent_modified'][input_idx]
+        columns[input_name + " coverage"]=block['coverage'][input_idx]
+    block_table=pyarrow.table(columns)
+    # blocks of one chromosome are consecutive - start a new file when the chromosome changes
+    if block['chrom']!=detail['chrom']:
+        close_cpg_detail(detail)
+        detail['chrom']=block['chrom']
+        detail['files'].append({'chrom': block['chrom'], 'path': os.path.join(detail['dir'],stage_file_name(block['chrom']) + ".parquet"), 'rows': 0})
+        detail['writer']=pyarrow.parquet.ParquetWriter(detail['files'][-1]['path'],block_table.schema)
+    detail['writer'].write_table(block_table)
+    detail['files'][-1]['rows']+=num_positions
+
+# subroutine to finish per CpG detail output - returns the written files
+def close_cpg_detail(detail):
+    if detail['writer'] is not None:
+        detail['writer'].close()
+        detail['writer']=None
+    return detail['files']
+
+# subroutine to merge all inputs on one chromosome and reduce it to benchmark summaries - one chromosome-parallel job
+# chrom_selection holds the chromosome's regions (whole chromosome without --regions); with a detail_dir, per CpG values are also written there
+# returns (summary, number of merged CpG positions, per CpG detail files)
+def benchmark_chromosome_summary(inputs,chrom_selection,summary_args,mod_code,chunksize,min_coverage,detail_dir=None):
+    summary=init_benchmark_summary(*summary_args)
+    detail=init_cpg_detail(detail_dir,summary_args[0]+summary_args[1]) if detail_dir is not None else None
+    total_positions=0
+    for block in iter_merged_methylation_blocks(inputs,mod_code,chunksize,chrom_selection):
+        update_benchmark_summary(summary,block,min_coverage)
+        if detail is not None:
+            update_cpg_detail(detail,block)
+        total_positions+=len(block['position'])
+    return summary, total_positions, (close_cpg_detail(detail) if detail is not None else [])
+
+# subroutine to get the methylation category labels of equal-width bins (e.g., 0-20%)
+def meth_category_labels(prop_bins):
+    edges=np.linspace(METH_RANGE[0],METH_RANGE[1],prop_bins+1)
+    return [f"{low:g}-{high:g}%" for low, high in zip(edges[:-1],edges[1:])]
+
+# subroutine to make the long-format methylation category proportion table (one row per input and category)
+def meth_prop_table(summary):
+    input_names=summary['ont_names']+summary['bisulfite_names']
+    input_types=['ONT']*len(summary['ont_names'])+['bisulfite']*len(summary['bisulfite_names'])
+    categories=meth_category_labels(summary['prop_bins'])
+    prop_counts=summary['prop_counts']
+    totals=prop_counts.sum(axis=1,keepdims=True)
+    proportions=np.divide(prop_counts,totals,out=np.zeros(prop_counts.shape),where=totals>0)
+    return pd.DataFrame({
+        'Sample': np.repeat(input_names,len(categories)),
+        'Type': np.repeat(input_types,len(categories)),
+        'Methylation category': np.tile(categories,len(input_names)),
+        'CpGs': prop_counts.ravel(),
+        'Proportion': proportions.ravel()
+    })
+
+# subroutine to make the per input summary table - CpGs passing the coverage cutoff and mean percent methylated
+def input_summary_table(summary):
+    num_cpgs=summary['prop_counts'].sum(axis=1)
+    return pd.DataFrame({
+        'Sample': summary['ont_names']+summary['bisulfite_names'],
+        'Type': ['ONT']*len(summary['ont_names'])+['bisulfite']*len(summary['bisulfite_names']),
+        'CpGs': num_cpgs,
+        'Mean methylation (%)': np.divide(summary['meth_sum'],num_cpgs,out=np.full(len(num_cpgs),np.nan),where=num_cpgs>0)
+    })
+
+# subroutine to make the ONT vs. bisulfite concordance table - one row per pair on CpGs covered in both
+def truth_comparison_table(summary):
+    concordance_df=concordance_table(summary['concordance'])
+    concordance_df.insert(1,'ONT sample',[summary['ont_names'][ont_idx] for ont_idx, _ in summary['pairs']])
+    concordance_df.insert(2,'Bisulfite',[summary['bisulfite_names'][bisulfite_idx-len(summary['ont_names'])] for _, bisulfite_idx in summary['pairs']])
+    return concordance_df.drop(columns='Pair')
+
+# subroutine to get the median of a fixed-bin histogram by linear interpolation within the median bin
+def histogram_median(counts,value_range):
+    cumulative=np.cumsum(counts)
+    if cumulative[-1]==0:
+        return np.nan
+    bin_width=(value_range[1]-value_range[0])/len(counts)
+    median_bin=int(np.searchsorted(cumulative,cumulative[-1]/2))
+    below=cumulative[median_bin-1] if median_bin>0 else 0
+    return value_range[0]+bin_width*(median_bin+(cumulative[-1]/2-below)/counts[median_bin])
+
+def meth_split_violinplot(summary,plot_title,output_prefix):
+    # initialize figure
+    fig, ax = plt.subplots(figsize=(max(6,1.5*len(summary['pairs'])),5))
+    violin = summary['violin']
+    grid=np.linspace(METH_RANGE[0],METH_RANGE[1],violin['kde_gridsize'])
+    colors=hue_colors(2)
+    # data only mode (CARDlongread_meth_figure_output.py) keeps the plotted data without drawing it
+    draw=not figure_data_only()
+    # plotted data - density curve and median per sample and side
+    violin_dfs=[]
+    for pair_idx, (ont_idx, bisulfite_idx) in enumerate(summary['pairs']):
+        # ONT on the left, bisulfite on the right - halves scaled to the widest half
+        densities=[]
+        for level_idx in [2*pair_idx,2*pair_idx+1]:
+            bandwidth=scott_bandwidth(violin['n'][level_idx],violin['sum'][level_idx],violin['sum_squares'][level_idx])
+            densities.append(fft_kde(violin['kde_grid_counts'][level_idx],grid[1]-grid[0],bandwidth))
+        max_density=np.nanmax([np.nanmax(density) if np.isfinite(density).any() else 0 for density in densities])
+        if not max_density>0:
+            continue
+        for side, density, color, level_idx in zip([-1,1],densities,colors,[2*pair_idx,2*pair_idx+1]):
+            median=histogram_median(violin['counts'][level_idx],METH_RANGE)
+            if draw:
+                widths=0.4*np.nan_to_num(density)/max_density
+                ax.fill_betweenx(grid,pair_idx,pair_idx+side*widths,color=color,alpha=0.75,linewidth=0.5,edgecolor='white')
+                # median line
+                ax.plot([pair_idx,pair_idx+side*np.interp(median,grid,widths)],[median,median],color='black',linestyle='--',linewidth=1)
+            violin_dfs.append(pd.DataFrame({'Sample': summary['ont_names'][ont_idx], 'Data': 'ONT' if side<0 else 'bisulfite', 'Methylation per CpG (%)': grid, 'Density': density, 'Median methylation per CpG (%)': median}))
+    if draw:
+        ax.set_xticks(range(len(summary['pairs'])),[summary['ont_names'][ont_idx] for ont_idx, _ in summary['pairs']])
+        ax.legend(handles=[Patch(color=color,alpha=0.75,label=label) for label, color in zip(['ONT','bisulfite'],colors)],loc='upper left',bbox_to_anchor=(1,1))
+        ax.set_ylim(METH_RANGE)
+        ax.set(xlabel="Sample",ylabel="Methylation per CpG (%)")
+        ax.set_title(plot_title)
+    set_figure_data(fig,pd.concat(violin_dfs,ignore_index=True) if len(violin_dfs)>0 else pd.DataFrame(columns=['Sample','Data','Methylation per CpG (%)','Density','Median methylation per CpG (%)']))
+    # save figure - file name is (output_prefix)_ONT_bisulfite_split_violinplot.png
+    save_figure(fig,output_prefix + "_ONT_bisulfite_split_violinplot.png",bbox_inches='tight')
+    # close figure
+    fig.clf()
+
+def meth_lineplot(summary,plot_title,output_prefix):
+    # initialize figure
+    fig, ax = plt.subplots()
+    lineplot_bins=summary['lineplot_bins']
+    bin_width=(METH_RANGE[1]-METH_RANGE[0])/lineplot_bins
+    bin_centers=METH_RANGE[0]+bin_width*(np.arange(lineplot_bins)+0.5)
+    colors=hue_colors(len(summary['pairs']))
+    concordance_df=concordance_table(summary['concordance'])
+    # data only mode keeps the plotted data without drawing it
+    draw=not figure_data_only()
+    # plotted data - mean and standard deviation of ONT methylation per bisulfite bin and sample
+    line_dfs=[]
+    for pair_idx, ((ont_idx, _), color) in enumerate(zip(summary['pairs'],colors)):
+        n=summary['line_n'][pair_idx]
+        present=n>0
+        means=summary['line_sum'][pair_idx][present]/n[present]
+        # standard deviation band
+        variances=np.maximum(summary['line_sum_squares'][pair_idx][present]/n[present]-means*means,0)
+        if draw:
+            ax.plot(bin_centers[present],means,color=color,label=f"{summary['ont_names'][ont_idx]} (r={concordance_df['Pearson r'][pair_idx]:.3f}, RMSE={concordance_df['RMSE (%)'][pair_idx]:.1f}%)")
+            ax.fill_between(bin_centers[present],means-np.sqrt(variances),means+np.sqrt(variances),color=color,alpha=0.2,linewidth=0)
+        line_dfs.append(pd.DataFrame({'Sample': summary['ont_names'][ont_idx], 'Bisulfite methylation bin center (%)': bin_centers[present], 'Mean ONT methylation per CpG (%)': means, 'Standard deviation (%)': np.sqrt(variances), 'CpGs': n[present]}))
+    if draw:
+        # perfect agreement line
+        ax.plot(METH_RANGE,METH_RANGE,color='grey',linestyle='--',linewidth=1)
+        ax.set_xlim(METH_RANGE)
+        ax.set_ylim(METH_RANGE)
+        ax.set(xlabel="Bisulfite methylation per CpG (%)",ylabel="Mean ONT methylation per CpG (%)")
+        ax.legend(title="Sample")
+        ax.set_title(plot_title)
+    set_figure_data(fig,pd.concat(line_dfs,ignore_index=True))
+    # save figure - file name is (output_prefix)_ONT_vs_bisulfite_lineplot.png
+    save_figure(fig,output_prefix + "_ONT_vs_bisulfite_lineplot.png",bbox_inches='tight')
+    # close figure
+    fig.clf()
+
+def meth_prop_grouped_barplot(meth_prop_df,plot_title,output_prefix):
+    # initialize figure
+    fig, ax = plt.subplots(figsize=(max(6,1.2*meth_prop_df['Sample'].nunique()),5))
+    # data only mode keeps the plotted data without drawing it
+    if figure_data_only():
+        set_figure_data(fig,meth_prop_df)
+    else:
+        sb.barplot(data=meth_prop_df,x='Sample',y='Proportion',hue='Methylation category',ax=ax)
+        ax.set(ylabel="Proportion of CpGs")
+        ax.set_ylim(bottom=0,top=1)
+        ax.set_title(plot_title)
+    # save figure - file name is (output_prefix)_methylation_proportion_barplot.png
+    save_figure(fig,output_prefix + "_methylation_proportion_barplot.png",bbox_inches='tight')
+    # close figure
+    fig.clf()
+
+def meth_prop_heatmap(meth_prop_df,plot_title,output_prefix):
+    # data only mode keeps the plotted data without drawing it
+    if figure_data_only():
+        fig=plt.figure()
+        set_figure_data(fig,meth_prop_df)
+    else:
+        # samples by methylation categories in input order
+        heatmap_df=meth_prop_df.pivot(index='Sample',columns='Methylation category',values='Proportion').loc[pd.unique(meth_prop_df['Sample']),pd.unique(meth_prop_df['Methylation category'])]
+        # initialize figure
+        fig, ax = plt.subplots(figsize=(max(6,0.9*heatmap_df.shape[1]+2),max(3,0.5*heatmap_df.shape[0]+1)))
+        sb.heatmap(heatmap_df,annot=True,fmt='.2f',vmin=0,vmax=1,cmap='viridis',cbar_kws={'label': 'Proportion of CpGs'},ax=ax)
+        ax.tick_params(axis='y',rotation=0)
+        ax.set_title(plot_title)
+    # save figure - file name is (output_prefix)_methylation_proportion_heatmap.png
+    save_figure(fig,output_prefix + "_methylation_proportion_heatmap.png",bbox_inches='tight')
+    # close figure
+    fig.clf()
+
+# subroutine to plot the confusion matrix of one ONT sample vs. bisulfite - proportion of each bisulfite methylation category per ONT category
+def meth_confusion_heatmap(confusion_df,ont_name,plot_title,output_prefix):
+    # data only mode keeps the plotted data without drawing it
+    if figure_data_only():
+        fig=plt.figure()
+        set_figure_data(fig,confusion_df)
+    else:
+        categories=pd.unique(confusion_df['ONT category'])
+        heatmap_df=confusion_df.pivot(index='Bisulfite category',columns='ONT category',values='Proportion of bisulfite category').loc[categories,categories]
+        # initialize figure
+        fig, ax = plt.subplots(figsize=(max(6,0.9*len(categories)+2),max(4,0.7*len(categories)+1)))
+        sb.heatmap(heatmap_df,annot=True,fmt='.2f',vmin=0,vmax=1,cmap='viridis',cbar_kws={'label': 'Proportion of bisulfite category'},ax=ax)
+        ax.tick_params(axis='y',rotation=0)
+        ax.set_title(plot_title + " (" + ont_name + ")")
+    # save figure - file name is (output_prefix)_(ONT name)_bisulfite_confusion_heatmap.png
+    save_figure(fig,output_prefix + "_" + ont_name + "_bisulfite_confusion_heatmap.png",bbox_inches='tight')
+    # close figure
+    fig.clf()
+
+# subroutine to write a table to a worksheet row by row - a header row, then one row per table row with NaN as empty cells
+# constant memory worksheets flush each row once the next starts, so rows must be written in order
+def write_table_rows(worksheet,table_df,header_format):
+    worksheet.write_row(0,0,[str(column) for column in table_df.columns],header_format)
+    column_values=[table_df[column].tolist() for column in table_df.columns]
+    for row_idx, row in enumerate(zip(*column_values),start=1):
+        worksheet.write_row(row_idx,0,[None if (isinstance(value,float) and np.isnan(value)) else value for value in row])
+
+# subroutine to write a table too long for a worksheet to a companion file - Parquet, or gzipped TSV without pyarrow
+def write_companion_table(table_df,path_root):
+    if importlib.util.find_spec('pyarrow') is not None:
+        table_df.to_parquet(path_root + ".parquet",index=False)
+        return path_root + ".parquet"
+    table_df.to_csv(path_root + ".tsv.gz",sep='\t',index=False)
+    return path_root + ".tsv.gz"
+
 # combine all previous plots into worksheets of single output excel spreadsheet
-def make_benchmark_spreadsheet():
-def main():
+# tables is a dict of sheet name -> data frame, figures a dict of sheet name -> figure file (png figures saved at dpi are embedded)
+# the workbook is written in constant memory mode; tables over max_sheet_rows rows go to companion files instead of worksheets
+# the first sheet (Index) lists every table, figure, companion file, and per CpG detail file (dicts of chrom, path, and rows)
+def make_benchmark_spreadsheet(tables,figures,output_prefix,dpi=300,max_sheet_rows=MAX_SHEET_ROWS,detail_files=None):
+    import xlsxwriter
+    spreadsheet_path=output_prefix + "_benchmark.xlsx"
+    # links to companion files are relative to the spreadsheet
+    spreadsheet_dir=os.path.dirname(os.path.abspath(spreadsheet_path))
+    companion_files={sheet_name: write_companion_table(table_df,output_prefix + "_" + stage_file_name(sheet_name)) for sheet_name, table_df in tables.items() if len(table_df)>max_sheet_rows}
+    # index rows - item, type, rows, and companion file (None for items on their own worksheet)
+    index_rows=[(sheet_name,'table',len(table_df),companion_files.get(sheet_name)) for sheet_name, table_df in tables.items()]
+    index_rows+=[(sheet_name,'figure',None,None) for sheet_name in figures]
+    index_rows+=[(detail_file['chrom'],'per CpG detail',detail_file['rows'],detail_file['path']) for detail_file in (detail_files if detail_files is not None else [])]
+    workbook=xlsxwriter.Workbook(spreadsheet_path,{'constant_memory': True})
+    header_format=workbook.add_format({'bold': True})
+    index_sheet=workbook.add_worksheet('Index')
+    index_sheet.write_row(0,0,['Item','Type','Rows','Location'],header_format)
+    for row_idx, (item, item_type, num_rows, path) in enumerate(index_rows,start=1):
+        index_sheet.write_row(row_idx,0,[item,item_type,num_rows])
+        if path is None:
+            index_sheet.write_url(row_idx,3,"internal:'" + item.replace("'","''") + "'!A1",string=item)
+        else:
+            relative_path=os.path.relpath(os.path.abspath(path),spreadsheet_dir)
+            index_sheet.write_url(row_idx,3,'external:' + relative_path,string=relative_path)
+    for sheet_name, table_df in tables.items():
+        if sheet_name not in companion_files:
+            write_table_rows(workbook.add_worksheet(sheet_name),table_df,header_format)
+    for sheet_name, figure_path in figures.items():
+        worksheet=workbook.add_worksheet(sheet_name)
+        if figure_path.endswith('.png'):
+            # scale to about screen size (90 dpi)
+            worksheet.insert_image('A1',figure_path,{'x_scale': 90/dpi, 'y_scale': 90/dpi})
+        else:
+            # svg/pdf figures and data only Parquet files cannot be embedded - link them (same directory as the spreadsheet)
+            worksheet.write_url('A1','external:' + os.path.basename(figure_path),string=os.path.basename(figure_path))
+    workbook.close()
+
+# subroutine to get the worksheet name of one pair's confusion heatmap - numbered by pair so ONT names sharing a prefix stay apart,
+# with characters Excel does not allow replaced and cut to Excel's 31 character limit
+def confusion_sheet_name(pair_idx,ont_name):
+    return ("Confusion " + str(pair_idx+1) + " " + re.sub(INVALID_SHEET_NAME_CHARACTERS,'_',ont_name))[:31].rstrip("'")
+
+# subroutine to get the spreadsheet tables, figure files, and plot tasks of a benchmark summary
+# returns tables (dict of sheet name -> data frame), figures (dict of sheet name -> png file), and plot tasks drawing the figures
+def benchmark_report(summary,prop_bins,plot_title,output_prefix):
+    # summary tables
+    meth_prop_df=meth_prop_table(summary)
+    tables={'Input summary': input_summary_table(summary), 'Methylation proportions': meth_prop_df}
+    figures={
+        'Proportion barplot': output_prefix + "_methylation_proportion_barplot.png",
+        'Proportion heatmap': output_prefix + "_methylation_proportion_heatmap.png"
+    }
+    plot_tasks=[
+        plot_task("methylation proportion barplot",meth_prop_grouped_barplot,meth_prop_df,plot_title,output_prefix),
+        plot_task("methylation proportion heatmap",meth_prop_heatmap,meth_prop_df,plot_title,output_prefix)
+    ]
     # only plot split violinplot or lineplot if bisulfite sequencing ground truths present
-    
+    if len(summary['pairs'])>0:
+        tables['ONT vs bisulfite']=truth_comparison_table(summary)
+        tables['Coverage strata']=coverage_stratified_table(summary['concordance'])
+        confusion_df=confusion_table(summary['concordance'],meth_category_labels(prop_bins))
+        tables['Confusion matrices']=confusion_df
+        figures['Split violinplot']=output_prefix + "_ONT_bisulfite_split_violinplot.png"
+        figures['ONT vs bisulfite lineplot']=output_prefix + "_ONT_vs_bisulfite_lineplot.png"
+        plot_tasks.append(plot_task("ONT/bisulfite split violinplot",meth_split_violinplot,summary,plot_title,output_prefix))
+        plot_tasks.append(plot_task("ONT vs. bisulfite lineplot",meth_lineplot,summary,plot_title,output_prefix))
+        for pair_idx, (pair_label, (ont_idx, _)) in enumerate(zip(summary['concordance']['pair_labels'],summary['pairs'])):
+            ont_name=summary['ont_names'][ont_idx]
+            figures[confusion_sheet_name(pair_idx,ont_name)]=output_prefix + "_" + ont_name + "_bisulfite_confusion_heatmap.png"
+            plot_tasks.append(plot_task(ont_name + " confusion heatmap",meth_confusion_heatmap,confusion_df[confusion_df['Pair']==pair_label],ont_name,plot_title,output_prefix))
+    return tables, figures, plot_tasks
+
+# subroutine to get default input names from file names
+# file names shared by several inputs (e.g., Bismark output names in per sample directories) are prefixed by their directory name
+def default_names(paths):
+    names=[os.path.basename(path).split('.')[0] for path in paths]
+    shared_names={name for name in names if names.count(name)>1}
+    return [os.path.basename(os.path.dirname(os.path.abspath(path))) + "_" + name if name in shared_names else name for path, name in zip(paths,names)]
+
+def main():
+    # Parse the arguments
+    args = parse_args()
+    # time and memory per stage and plot are written to (output_prefix)_run_report.json
+    run_report=init_run_report(os.path.basename(__file__),args.output_prefix,args.profile)
+    # spreadsheet needs xlsxwriter
+    if importlib.util.find_spec('xlsxwriter') is None:
+        quit('ERROR: xlsxwriter is required to write the benchmark spreadsheet (pip install xlsxwriter).')
+    figure_options=figure_output_options(args)
+    if (args.max_sheet_rows<=0) or (args.max_sheet_rows>EXCEL_MAX_ROWS):
+        quit('ERROR: --max_sheet_rows must be between 1 and ' + str(EXCEL_MAX_ROWS) + '!')
+    if args.cpg_detail and (importlib.util.find_spec('pyarrow') is None):
+        quit('ERROR: --cpg_detail writes Parquet files and requires pyarrow!')
+    ont_names=args.ont_names if args.ont_names is not None else default_names(args.ont_methylbeds)
+    bisulfite_names=args.bisulfite_names if args.bisulfite_names is not None else default_names(args.bisulfite)
+    if len(ont_names)!=len(args.ont_methylbeds):
+        quit('ERROR: Number of ONT names and ONT methylBeds must be equal!')
+    if len(bisulfite_names)!=len(args.bisulfite):
+        quit('ERROR: Number of bisulfite names and bisulfite inputs must be equal!')
+    if len(set(ont_names+bisulfite_names))!=len(ont_names+bisulfite_names):
+        quit('ERROR: ONT and bisulfite names must be unique (they label tables, figures, and per CpG detail columns) - set them with --ont_names/--bisulfite_names!')
+    # pair ONT samples with bisulfite ground truths - one for all or one per sample
+    num_ont=len(args.ont_methylbeds)
+    if len(args.bisulfite)==0:
+        pairs=[]
+    elif len(args.bisulfite)==1:
+        pairs=[(ont_idx,num_ont) for ont_idx in range(num_ont)]
+    elif len(args.bisulfite)==num_ont:
+        pairs=[(ont_idx,num_ont+ont_idx) for ont_idx in range(num_ont)]
+    else:
+        quit('ERROR: Provide one bisulfite ground truth for all ONT samples or one per ONT sample!')
+    # merge all inputs on CpG position in one pass, reducing each block to summaries
+    inputs=[(path,'modkit_pileup') for path in args.ont_methylbeds]+[(path,'bismark_coverage') for path in args.bisulfite]
+    # ONT coverage strata - the coverage cutoff and every stratum bound above it
+    coverage_bounds=[args.min_coverage]+sorted(bound for bound in set(args.coverage_strata) if bound>args.min_coverage)
+    summary_args=(ont_names,bisulfite_names,pairs,args.prop_bins,args.lineplot_bins,args.hist_bins,coverage_bounds,args.rank_bins)
+    # --regions/--chrom read only overlapping records of each input, one chromosome at a time
+    selection=region_selection(args)
+    if selection is not None:
+        unindexed_inputs=unindexed_region_inputs([path for path, _ in inputs])
+        if len(unindexed_inputs)>0:
+            quit('ERROR: --regions and --chrom need uncompressed inputs or bgzipped inputs with a tabix/CSI index and pysam installed: ' + ', '.join(unindexed_inputs))
+        if len(selection)==0:
+            quit('ERROR: No regions in ' + args.regions + ' are on the chromosomes given with --chrom!')
+        check_selection_chromosomes(selection,[path for path, _ in inputs])
+    # per CpG detail files of an earlier run would otherwise be mixed with this run's
+    detail_dir=cpg_detail_dir(args.output_prefix) if args.cpg_detail else None
+    if detail_dir is not None:
+        os.makedirs(detail_dir,exist_ok=True)
+        for stale_path in glob.glob(os.path.join(detail_dir,"*.parquet")):
+            os.remove(stale_path)
+    # load, merge, and summarize inputs in one streamed pass
+    with measure_stage(run_report,"merge and summarize inputs") as stage:
+        start_time=time.perf_counter()
+        workers=parallel_workers(args)
+        if (workers>1) and (selection is None) and any(detect_compression(path) is not None for path, _ in inputs):
+            print("Compressed inputs cannot be split by chromosome - merging in one process.")
+            workers=1
+        if (workers>1) or (selection is not None):
+            # merge each chromosome (or its selected regions) in its own job and add up the partial summaries
+            if selection is None:
+                chromosomes=list(dict.fromkeys(chrom for path, _ in inputs for chrom in build_chromosome_offsets(path)))
+            else:
+                chromosomes=list(selection)
+            job_args_list=[(inputs,chromosome_selection(chrom,selection),summary_args,args.mod_code,args.chunksize,args.min_coverage,detail_dir) for chrom in chromosomes]
+            summary=None
+            total_positions=0
+            detail_files=[]
+            for _, (chrom_summary, chrom_positions, chrom_detail_files) in iter_chromosome_jobs(benchmark_chromosome_summary,job_args_list,args.processes,args.threads):
+                summary=chrom_summary if summary is None else merge_benchmark_summaries([summary,chrom_summary])
+                total_positions+=chrom_positions
+                detail_files+=chrom_detail_files
+            if summary is None:
+                summary=init_benchmark_summary(*summary_args)
+        else:
+            summary=init_benchmark_summary(*summary_args)
+            detail=init_cpg_detail(detail_dir,ont_names+bisulfite_names) if detail_dir is not None else None
+            total_positions=0
+            for block in iter_merged_methylation_blocks(inputs,args.mod_code,args.chunksize):
+                update_benchmark_summary(summary,block,args.min_coverage)
+                if detail is not None:
+                    update_cpg_detail(detail,block)
+                total_positions+=len(block['position'])
+            detail_files=close_cpg_detail(detail) if detail is not None else []
+        stage['rows']=total_positions
+    report_stream_usage(str(len(inputs)) + " merged methylation inputs",total_positions,start_time)
+    with measure_stage(run_report,"summary tables") as stage:
+        tables, figures, plot_tasks = benchmark_report(summary,args.prop_bins,args.plot_title,args.output_prefix)
+        stage['rows']=sum(len(table_df) for table_df in tables.values())
+    with measure_stage(run_report,"render plots") as stage:
+        report_render_errors(render_plots(plot_tasks,args.jobs,run_report['plots'],render_manifest_path(args.output_prefix),args.rerender,figure_options))
+        stage['rows']=len(plot_tasks)
+    with measure_stage(run_report,"write spreadsheet") as stage:
+        figures={sheet_name: figure_output_path(figure_path,figure_options) for sheet_name, figure_path in figures.items()}
+        make_benchmark_spreadsheet(tables,figures,args.output_prefix,args.dpi,args.max_sheet_rows,detail_files)
+        stage['rows']=sum(len(table_df) for table_df in tables.values())
+    run_report['completed']=True
+
 # run main subroutine
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
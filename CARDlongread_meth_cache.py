@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_cache.py
+# persistent cache of parsed, typed inputs so repeated runs on the same modkit/DSS outputs skip TSV parsing
+# each input is stored once as an uncompressed Arrow IPC (feather v2) file that later runs memory-map (pickle files if pyarrow is missing)
+# cache entries are keyed by input path, size, modification time, loader, and input specs (plus a content hash if requested)
+# and the least recently used entries are evicted once the cache grows past its size limit
+
+import pandas as pd
+import importlib.util
+import hashlib
+import tempfile
+import threading
+import os
+from CARDlongread_meth_io import INPUT_SPECS
+
+# bump when cached table layout changes so older cache entries are no longer used
+CACHE_FORMAT_VERSION=1
+# default cache size limit in gigabytes
+DEFAULT_CACHE_MAX_GB=20.0
+# one eviction at a time per process - inputs may be loaded through the cache from several threads (e.g., --load_threads)
+eviction_lock=threading.Lock()
+
+# subroutine to add cache arguments to a script's argument parser
+def add_cache_arguments(parser):
+    # argument for cache directory
+    parser.add_argument("--cache_dir", required=False, default=None, help="Directory for a persistent cache of parsed inputs (Arrow IPC files memory-mapped by later runs on the same inputs).")
+    # argument for cache size limit
+    parser.add_argument("--cache_max_gb", required=False, type=float, default=DEFAULT_CACHE_MAX_GB, help="Cache size limit in gigabytes; least recently used entries are removed beyond it (default " + str(DEFAULT_CACHE_MAX_GB) + ").")
+    # argument for content hashing
+    parser.add_argument("--cache_content_hash", required=False, action="store_true", help="Also key cache entries by a hash of input contents (reads each input once per run; catches files rewritten with the same size and modification time).")
+    # argument to disable cache
+    parser.add_argument("--no_cache", required=False, action="store_true", help="Parse every input even if --cache_dir is set (cache is neither read nor written).")
+
+# subroutine to get cache settings from parsed arguments - None if caching is off
+def cache_settings(args):
+    if (args.cache_dir is None) or args.no_cache:
+        return None
+    os.makedirs(args.cache_dir,exist_ok=True)
+    return {
+        'cache_dir': args.cache_dir,
+        'max_bytes': int(args.cache_max_gb*1e9),
+        'content_hash': args.cache_content_hash
+    }
+
+# subroutine to hash file contents in 8 MB blocks
+def file_content_hash(path):
+    content_hash=hashlib.blake2b(digest_size=16)
+    with open(path,'rb') as f:
+        for block in iter(lambda: f.read(8*1024*1024),b''):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+# subroutine to build the cache key of one input for one loader
+def cache_key(path,load_function,content_hash=False):
+    stat=os.stat(path)
+    key_fields=[
+        str(CACHE_FORMAT_VERSION),
+        os.path.realpath(path),
+        str(stat.st_size),
+        str(stat.st_mtime_ns),
+        load_function.__module__ + '.' + load_function.__qualname__,
+        # dtype or column changes in the loaders invalidate older entries
+        repr(sorted(INPUT_SPECS.items()))
+    ]
+    if content_hash:
+        key_fields.append(file_content_hash(path))
+    return hashlib.blake2b('\t'.join(key_fields).encode(),digest_size=16).hexdigest()
+
+# subroutine to get the cache file path for a key - Arrow IPC if pyarrow is available, pickle otherwise
+def cache_entry_path(cache_dir,key):
+    if importlib.util.find_spec('pyarrow') is not None:
+        return os.path.join(cache_dir,key + '.arrow')
+    return os.path.join(cache_dir,key + '.pkl')
+
+# subroutine to read a cache entry - Arrow IPC files are memory-mapped rather than read into a buffer first
+def read_cache_entry(entry_path):
+    if entry_path.endswith('.arrow'):
+        import pyarrow.feather
+        return pyarrow.feather.read_table(entry_path,memory_map=True).to_pandas()
+    return pd.read_pickle(entry_path)
+
+# subroutine to write a cache entry atomically (temporary file renamed into place, so concurrent runs never read partial entries)
+def write_cache_entry(table_df,entry_path):
+    cache_dir=os.path.dirname(entry_path)
+    temp_fd, temp_path = tempfile.mkstemp(dir=cache_dir,suffix='.tmp')
+    os.close(temp_fd)
+    try:
+        if entry_path.endswith('.arrow'):
+            # uncompressed so it can be memory-mapped; feather needs a default index
+            table_df.reset_index(drop=True).to_feather(temp_path,compression='uncompressed')
+        else:
+            table_df.to_pickle(temp_path)
+        os.replace(temp_path,entry_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+# subroutine to remove least recently used cache entries (oldest modification time - refreshed on every hit) until under max_bytes
+# entries removed in the meantime (e.g., by another run sharing the cache directory) are skipped
+def evict_cache_entries(cache_dir,max_bytes):
+    with eviction_lock:
+        entries=[]
+        for file_name in os.listdir(cache_dir):
+            if file_name.endswith(('.arrow','.pkl')):
+                entry_path=os.path.join(cache_dir,file_name)
+                try:
+                    stat=os.stat(entry_path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime,stat.st_size,entry_path))
+        total_bytes=sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total_bytes<=max_bytes:
+                break
+            try:
+                os.remove(entry_path)
+                print("Evicted cached input",os.path.basename(entry_path),"from",cache_dir)
+            except FileNotFoundError:
+                pass
+            total_bytes-=size
+
+# subroutine to load an input through the cache - loads with load_function(path, *load_args) on a miss and stores the result
+# with settings None (no --cache_dir or --no_cache) this is just load_function(path, *load_args)
+def cached_load(load_function,path,settings,*load_args):
+    if settings is None:
+        return load_function(path,*load_args)
+    entry_path=cache_entry_path(settings['cache_dir'],cache_key(path,load_function,settings['content_hash']))
+    if os.path.exists(entry_path):
+        try:
+            table_df=read_cache_entry(entry_path)
+            # mark as recently used for eviction - the entry may have been evicted since it was read
+            try:
+                os.utime(entry_path)
+            except FileNotFoundError:
+                pass
+            return table_df
+        except Exception as error:
+            # unreadable entry (e.g., truncated by a full disk) - parse the input again and replace it
+            print("WARNING: ignoring unreadable cached input",entry_path,"-",error)
+    table_df=load_function(path,*load_args)
+    write_cache_entry(table_df,entry_path)
+    evict_cache_entries(settings['cache_dir'],settings['max_bytes'])
+    return table_df
@@ -0,0 +1,156 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_concordance.py
+# ONT vs. bisulfite concordance statistics accumulated over aligned per CpG methylation arrays (CARDlongread_meth_merge.py blocks)
+# every statistic is kept as sums or counts (moments per coverage stratum, binned joint distribution, binned confusion matrix),
+# so accumulators from separate blocks or chromosomes merge by addition and all ONT/bisulfite pairs update in one vectorized pass
+
+import pandas as pd
+import numpy as np
+
+# moment sums kept per pair and coverage stratum - x is ONT, y is bisulfite percent methylated
+CONCORDANCE_MOMENTS=['n','sum_x','sum_y','sum_xx','sum_yy','sum_xy','sum_abs_diff']
+# default ONT coverage stratum lower bounds above the coverage cutoff
+DEFAULT_COVERAGE_STRATA=[10,20,30,50]
+
+# subroutine to start a concordance accumulator for ONT/bisulfite pairs
+# coverage_bounds are the lower bounds of ONT coverage strata (first is the coverage cutoff); rank_bins is the joint distribution
+# resolution for Spearman correlation (ties within a bin); confusion_bins equal-width methylation categories for confusion matrices
+def init_concordance_accumulator(pair_labels,coverage_bounds,value_range=(0.0,100.0),rank_bins=500,confusion_bins=5):
+    num_pairs=len(pair_labels)
+    return {
+        'pair_labels': list(pair_labels),
+        'coverage_bounds': [int(bound) for bound in coverage_bounds],
+        'value_range': (float(value_range[0]),float(value_range[1])),
+        'rank_bins': rank_bins,
+        'confusion_bins': confusion_bins,
+        # moment sums per pair and coverage stratum
+        'moments': np.zeros((num_pairs,len(coverage_bounds),len(CONCORDANCE_MOMENTS))),
+        # joint ONT (rows) by bisulfite (columns) counts per pair on a fine grid for rank correlation
+        'joint_counts': np.zeros((num_pairs,rank_bins,rank_bins),dtype=np.int64),
+        # bisulfite category (rows) by ONT category (columns) counts per pair
+        'confusion_counts': np.zeros((num_pairs,confusion_bins,confusion_bins),dtype=np.int64)
+    }
+
+# subroutine to get equal-width bin positions of values within value_range (upper edge in the last bin)
+def range_bin_positions(values,value_range,bins):
+    positions=((values-value_range[0])*(bins/(value_range[1]-value_range[0]))).astype(np.int64)
+    return np.clip(positions,0,bins-1)
+
+# subroutine to add aligned CpGs of every pair to a concordance accumulator in one pass
+# ont_values/bisulfite_values/ont_coverage are (pairs x CpGs) arrays; shared marks CpGs passing the coverage cutoff in both inputs
+def update_concordance_accumulator(accumulator,ont_values,bisulfite_values,ont_coverage,shared):
+    num_pairs=len(accumulator['pair_labels'])
+    num_strata=len(accumulator['coverage_bounds'])
+    rank_bins=accumulator['rank_bins']
+    confusion_bins=accumulator['confusion_bins']
+    pair_idx, cpg_idx = np.nonzero(shared)
+    x=ont_values[pair_idx,cpg_idx].astype(np.float64)
+    y=bisulfite_values[pair_idx,cpg_idx].astype(np.float64)
+    # coverage stratum per CpG (CpGs below the first bound are left out)
+    strata=np.searchsorted(accumulator['coverage_bounds'],ont_coverage[pair_idx,cpg_idx],side='right')-1
+    keep=strata>=0
+    pair_idx, x, y, strata = pair_idx[keep], x[keep], y[keep], strata[keep]
+    # moment sums per pair and stratum
+    moment_idx=pair_idx*num_strata+strata
+    moment_weights=[None,x,y,x*x,y*y,x*y,np.abs(x-y)]
+    for moment_col, weights in enumerate(moment_weights):
+        accumulator['moments'][:,:,moment_col]+=np.bincount(moment_idx,weights=weights,minlength=num_pairs*num_strata).reshape(num_pairs,num_strata)
+    # binned joint distribution and confusion matrix
+    x_ranks=range_bin_positions(x,accumulator['value_range'],rank_bins)
+    y_ranks=range_bin_positions(y,accumulator['value_range'],rank_bins)
+    accumulator['joint_counts']+=np.bincount((pair_idx*rank_bins+x_ranks)*rank_bins+y_ranks,minlength=num_pairs*rank_bins*rank_bins).reshape(num_pairs,rank_bins,rank_bins)
+    x_categories=range_bin_positions(x,accumulator['value_range'],confusion_bins)
+    y_categories=range_bin_positions(y,accumulator['value_range'],confusion_bins)
+    accumulator['confusion_counts']+=np.bincount((pair_idx*confusion_bins+y_categories)*confusion_bins+x_categories,minlength=num_pairs*confusion_bins*confusion_bins).reshape(num_pairs,confusion_bins,confusion_bins)
+    return accumulator
+
+# subroutine to merge concordance accumulators with the same pairs and bins (e.g., from separate chromosomes)
+def merge_concordance_accumulators(accumulators):
+    merged=dict(accumulators[0])
+    for key in ['moments','joint_counts','confusion_counts']:
+        merged[key]=sum(accumulator[key] for accumulator in accumulators)
+    return merged
+
+# subroutine to get means, Pearson correlation, RMSE, mean difference, and mean absolute difference from moment sums (last axis CONCORDANCE_MOMENTS)
+def moment_metrics(moments):
+    n, sum_x, sum_y, sum_xx, sum_yy, sum_xy, sum_abs_diff = np.moveaxis(moments,-1,0)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        covariance=sum_xy-sum_x*sum_y/n
+        pearson=covariance/np.sqrt((sum_xx-sum_x*sum_x/n)*(sum_yy-sum_y*sum_y/n))
+        rmse=np.sqrt(np.maximum(sum_xx-2*sum_xy+sum_yy,0)/n)
+        mean_difference=(sum_x-sum_y)/n
+        mean_abs_difference=sum_abs_diff/n
+        mean_x=sum_x/n
+        mean_y=sum_y/n
+    return {'n': n, 'mean_x': mean_x, 'mean_y': mean_y, 'pearson': pearson, 'rmse': rmse, 'mean_difference': mean_difference, 'mean_abs_difference': mean_abs_difference}
+
+# subroutine to get Spearman correlation from a binned joint distribution (values in the same bin share their midrank)
+def binned_spearman(joint_counts):
+    joint_counts=joint_counts.astype(np.float64)
+    n=joint_counts.sum()
+    if n<2:
+        return np.nan
+    x_counts=joint_counts.sum(axis=1)
+    y_counts=joint_counts.sum(axis=0)
+    # midranks per bin
+    x_ranks=np.cumsum(x_counts)-(x_counts-1)/2
+    y_ranks=np.cumsum(y_counts)-(y_counts-1)/2
+    mean_rank=(n+1)/2
+    x_centered=x_ranks-mean_rank
+    y_centered=y_ranks-mean_rank
+    covariance=x_centered@joint_counts@y_centered
+    variance_x=(x_counts*x_centered*x_centered).sum()
+    variance_y=(y_counts*y_centered*y_centered).sum()
+    if variance_x<=0 or variance_y<=0:
+        return np.nan
+    return float(covariance/np.sqrt(variance_x*variance_y))
+
+# subroutine to get coverage stratum labels from lower bounds (e.g., 5-9x, 50x+)
+def coverage_stratum_labels(coverage_bounds):
+    labels=[f"{low}-{high-1}x" for low, high in zip(coverage_bounds[:-1],coverage_bounds[1:])]
+    return labels+[f"{coverage_bounds[-1]}x+"]
+
+# subroutine to make the concordance table - one row per pair over all coverage strata
+def concordance_table(accumulator):
+    metrics=moment_metrics(accumulator['moments'].sum(axis=1))
+    return pd.DataFrame({
+        'Pair': accumulator['pair_labels'],
+        'Shared CpGs': metrics['n'].astype(np.int64),
+        'Mean ONT methylation (%)': metrics['mean_x'],
+        'Mean bisulfite methylation (%)': metrics['mean_y'],
+        'Pearson r': metrics['pearson'],
+        'Spearman rho': [binned_spearman(joint_counts) for joint_counts in accumulator['joint_counts']],
+        'RMSE (%)': metrics['rmse'],
+        'Mean difference (%)': metrics['mean_difference'],
+        'Mean absolute difference (%)': metrics['mean_abs_difference']
+    })
+
+# subroutine to make the coverage-stratified concordance table - one row per pair and ONT coverage stratum
+def coverage_stratified_table(accumulator):
+    metrics=moment_metrics(accumulator['moments'])
+    labels=coverage_stratum_labels(accumulator['coverage_bounds'])
+    num_pairs=len(accumulator['pair_labels'])
+    return pd.DataFrame({
+        'Pair': np.repeat(accumulator['pair_labels'],len(labels)),
+        'ONT coverage': np.tile(labels,num_pairs),
+        'Shared CpGs': metrics['n'].ravel().astype(np.int64),
+        'Pearson r': metrics['pearson'].ravel(),
+        'RMSE (%)': metrics['rmse'].ravel(),
+        'Mean difference (%)': metrics['mean_difference'].ravel(),
+        'Mean absolute difference (%)': metrics['mean_abs_difference'].ravel()
+    })
+
+# subroutine to make the long-format confusion matrix table - counts and proportions per bisulfite category (row-normalized)
+def confusion_table(accumulator,category_labels):
+    confusion_counts=accumulator['confusion_counts']
+    num_pairs, num_categories, _ = confusion_counts.shape
+    row_totals=confusion_counts.sum(axis=2,keepdims=True)
+    proportions=np.divide(confusion_counts,row_totals,out=np.zeros(confusion_counts.shape),where=row_totals>0)
+    return pd.DataFrame({
+        'Pair': np.repeat(accumulator['pair_labels'],num_categories*num_categories),
+        'Bisulfite category': np.tile(np.repeat(category_labels,num_categories),num_pairs),
+        'ONT category': np.tile(category_labels,num_pairs*num_categories),
+        'CpGs': confusion_counts.ravel(),
+        'Proportion of bisulfite category': proportions.ravel()
+    })
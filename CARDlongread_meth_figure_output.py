@@ -0,0 +1,99 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_figure_output.py
+# figure output backends: --figure_format (png, svg, pdf, or pdf with dense point layers rasterized) and --dpi for every saved figure,
+# or --data_only to write each figure's plotted summary data (Parquet) instead of rendering it
+# plot functions save "(name).png" through save_figure, which writes the figure in the figure output of the running plot task,
+# so the drawing code stays the same for every backend
+
+import contextlib
+import importlib.util
+import weakref
+import os
+
+# figure formats - rasterized_pdf is a vector PDF with dense collections (scatter points, hexbins, heatmap cells) drawn as images
+FIGURE_FORMATS=['png','svg','pdf','rasterized_pdf']
+# file extension per figure format
+FIGURE_EXTENSIONS={'png': '.png', 'svg': '.svg', 'pdf': '.pdf', 'rasterized_pdf': '.pdf'}
+# collections with at least this many paths or points are rasterized in rasterized_pdf figures
+RASTERIZE_MIN_ELEMENTS=100
+# default figure output - 300 dpi png, as the scripts have always saved
+DEFAULT_FIGURE_OUTPUT={'figure_format': 'png', 'dpi': 300, 'data_only': False}
+
+# figure output of the plot task running in this process
+current_figure_output=dict(DEFAULT_FIGURE_OUTPUT)
+# figure files saved by the plot task running in this process (None outside figure_output)
+current_plot_task={'saved_paths': None}
+# plotted summary data per figure (set by the plot functions, written instead of the figure in data only mode)
+figure_data=weakref.WeakKeyDictionary()
+
+# subroutine to add figure output arguments to a script's argument parser
+def add_figure_output_arguments(parser):
+    # argument for figure format
+    parser.add_argument("--figure_format", required=False, choices=FIGURE_FORMATS, default='png', help="Format of saved figures: png (default), svg, pdf, or rasterized_pdf (pdf with dense point layers embedded as images at --dpi, so axes and text stay vector but files stay small).")
+    # argument for figure resolution
+    parser.add_argument("--dpi", required=False, type=int, default=300, help="Resolution of png figures and rasterized layers in dots per inch (default 300).")
+    # argument for data only mode
+    parser.add_argument("--data_only", required=False, action='store_true', help="Write each figure's plotted summary data to (figure name).parquet instead of rendering figures (requires pyarrow), e.g., for dashboards or rendering later.")
+
+# subroutine to get the figure output from parsed arguments - dict of figure_format, dpi, and data_only
+def figure_output_options(args):
+    if args.dpi<=0:
+        quit('ERROR: --dpi must be positive!')
+    if args.data_only and (importlib.util.find_spec('pyarrow') is None):
+        quit('ERROR: --data_only writes Parquet files and requires pyarrow!')
+    return {'figure_format': args.figure_format, 'dpi': args.dpi, 'data_only': args.data_only}
+
+# subroutine to check whether figures are written as data only (plot functions can skip drawing)
+def figure_data_only():
+    return current_figure_output['data_only']
+
+# subroutine to set the plotted summary data of a figure - a data frame written to Parquet in data only mode
+def set_figure_data(fig,data_df):
+    figure_data[fig]=data_df
+
+# subroutine to get the file a figure saved as "(name).png" is written to with a figure output
+def figure_output_path(path,figure_options):
+    path_root=os.path.splitext(path)[0]
+    if figure_options['data_only']:
+        return path_root + ".parquet"
+    return path_root + FIGURE_EXTENSIONS[figure_options['figure_format']]
+
+# subroutine to rasterize dense collections of a figure (e.g., millions of scatter points) so vector files stay small
+def rasterize_dense_collections(fig):
+    from matplotlib.collections import Collection
+    for collection in fig.findobj(Collection):
+        if max(len(collection.get_paths()),len(collection.get_offsets()))>=RASTERIZE_MIN_ELEMENTS:
+            collection.set_rasterized(True)
+
+# subroutine to save a figure given as "(name).png" with the figure output of the running plot task (300 dpi png outside figure_output)
+# data only mode writes the figure's plotted data to "(name).parquet" instead; further keyword arguments (e.g., bbox_inches) go to savefig
+def save_figure(fig,path,**savefig_kwargs):
+    output_path=figure_output_path(path,current_figure_output)
+    if current_figure_output['data_only']:
+        if fig not in figure_data:
+            raise ValueError("No plot data set for figure " + path + ".")
+        figure_data[fig].to_parquet(output_path,index=False)
+    else:
+        if current_figure_output['figure_format']=='rasterized_pdf':
+            rasterize_dense_collections(fig)
+        fig.savefig(output_path,format=FIGURE_EXTENSIONS[current_figure_output['figure_format']][1:],dpi=current_figure_output['dpi'],**savefig_kwargs)
+    if current_plot_task['saved_paths'] is not None:
+        current_plot_task['saved_paths'].append(output_path)
+    return output_path
+
+# subroutine to save figures in the with block (save_figure) with a figure output (dict from figure_output_options, None for the default)
+# files written are added to saved_paths (e.g., the figures of one plot task for the render manifest)
+@contextlib.contextmanager
+def figure_output(figure_options,saved_paths):
+    if figure_options is None:
+        figure_options=DEFAULT_FIGURE_OUTPUT
+    previous_figure_output=dict(current_figure_output)
+    previous_saved_paths=current_plot_task['saved_paths']
+    current_figure_output.update(figure_options)
+    current_plot_task['saved_paths']=saved_paths
+    try:
+        yield saved_paths
+    finally:
+        current_figure_output.update(previous_figure_output)
+        current_plot_task['saved_paths']=previous_saved_paths
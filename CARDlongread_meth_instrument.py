@@ -0,0 +1,118 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_instrument.py
+# stage-level timing and memory instrumentation written to a machine-readable run report ((output_prefix)_run_report.json)
+# each stage (e.g., loading, joins, rendering) and each plot records wall time, CPU time, RSS at start and end, RSS delta,
+# peak RSS (sampled while the stage runs), and rows; with --profile every stage is also profiled with cProfile
+
+import contextlib
+import cProfile
+import atexit
+import datetime
+import json
+import platform
+import threading
+import time
+import re
+import sys
+import pandas as pd
+import numpy as np
+import psutil
+from CARDlongread_meth_io import peak_rss_bytes
+
+# seconds between RSS samples while a stage runs
+RSS_SAMPLE_INTERVAL=0.01
+
+# subroutine to add instrumentation arguments to a script's argument parser
+def add_instrument_arguments(parser):
+    # argument for cProfile dumps
+    parser.add_argument("--profile", required=False, action='store_true', help="Profile each stage with cProfile and save (output_prefix)_(stage)_profile.prof next to the run report (plots rendered in --jobs worker processes are timed but not profiled).")
+
+# subroutine to measure wall time, CPU time (this process), and RSS of the code in the with block
+# fills record with wall_s, cpu_s, rss_start_mb, rss_end_mb, rss_delta_mb, and peak_rss_mb (sampled every RSS_SAMPLE_INTERVAL s)
+@contextlib.contextmanager
+def measure_usage(record):
+    process=psutil.Process()
+    rss_start=process.memory_info().rss
+    peak_rss=[rss_start]
+    stop=threading.Event()
+    def sample_rss():
+        while not stop.wait(RSS_SAMPLE_INTERVAL):
+            peak_rss[0]=max(peak_rss[0],process.memory_info().rss)
+    sampler=threading.Thread(target=sample_rss,daemon=True)
+    sampler.start()
+    wall_start=time.perf_counter()
+    cpu_start=time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_s']=time.perf_counter()-wall_start
+        record['cpu_s']=time.process_time()-cpu_start
+        stop.set()
+        sampler.join()
+        rss_end=process.memory_info().rss
+        record['rss_start_mb']=rss_start/1e6
+        record['rss_end_mb']=rss_end/1e6
+        record['rss_delta_mb']=(rss_end-rss_start)/1e6
+        record['peak_rss_mb']=max(peak_rss[0],rss_end)/1e6
+
+# subroutine to start a run report for a script run - written to (output_prefix)_run_report.json when the script exits
+def init_run_report(script_name,output_prefix,profile=False):
+    report={
+        'script': script_name,
+        'argv': sys.argv[1:],
+        'output_prefix': output_prefix,
+        'profile': profile,
+        'started': datetime.datetime.now().isoformat(timespec='seconds'),
+        'wall_start': time.perf_counter(),
+        'cpu_start': time.process_time(),
+        'completed': False,
+        'stages': [],
+        'plots': []
+    }
+    # also written when the script stops on an error, with completed false
+    atexit.register(write_run_report,report)
+    return report
+
+# subroutine to get a file name part from a stage name (e.g., "load bulk entropy" -> load_bulk_entropy)
+def stage_file_name(stage_name):
+    return re.sub(r'[^A-Za-z0-9]+','_',stage_name).strip('_')
+
+# subroutine to measure one stage of a run - yields the stage record so the stage can set its row count
+# the finished record is added to the report; with profiling on, the stage is also profiled to (output_prefix)_(stage)_profile.prof
+# report may be None (no instrumentation, e.g., functions called outside a script run)
+@contextlib.contextmanager
+def measure_stage(report,stage_name):
+    record={'stage': stage_name, 'rows': None}
+    if report is None:
+        yield record
+        return
+    profiler=cProfile.Profile() if report['profile'] else None
+    try:
+        with measure_usage(record):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield record
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+    finally:
+        if profiler is not None:
+            record['profile']=report['output_prefix'] + "_" + stage_file_name(stage_name) + "_profile.prof"
+            profiler.dump_stats(record['profile'])
+        report['stages'].append(record)
+
+# subroutine to write the run report - totals for the whole run, per stage records, and per plot records
+def write_run_report(report):
+    run_report={key: value for key, value in report.items() if key not in ['wall_start','cpu_start']}
+    run_report['wall_s']=time.perf_counter()-report['wall_start']
+    run_report['cpu_s']=time.process_time()-report['cpu_start']
+    run_report['max_rss_mb']=peak_rss_bytes()/1e6
+    run_report['environment']={'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__, 'platform': platform.platform()}
+    try:
+        with open(report['output_prefix'] + "_run_report.json",'w') as f:
+            # NumPy scalars (e.g., summed row counts) as plain numbers
+            json.dump(run_report,f,indent=2,default=lambda value: value.item() if isinstance(value,np.generic) else str(value))
+    except OSError as error:
+        print("Could not write run report:",error)
@@ -0,0 +1,170 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_intervals.py
+# integer interval keys for joining entropy tables to DMR tables on (chrom, start, end)
+# replaces "chrom:start-end" region_name strings, which are slow to build and hash per row
+# also a per chromosome sorted interval index to summarize bulk window entropies over DMRs by overlap
+
+import pandas as pd
+import numpy as np
+
+# subroutine to get integer chrom codes for several data frames against one shared set of categories
+# data frames loaded with harmonize_chrom_categories already share categories, so this is just the codes
+def shared_chrom_codes(chrom_series_list):
+    first_dtype=chrom_series_list[0].dtype
+    if isinstance(first_dtype,pd.CategoricalDtype) and all(series.dtype==first_dtype for series in chrom_series_list):
+        return [series.cat.codes.to_numpy() for series in chrom_series_list]
+    # otherwise code every chrom column against the union of chrom names
+    all_chroms=pd.api.types.union_categoricals([pd.Categorical(series) for series in chrom_series_list]).categories
+    return [pd.Categorical(series,categories=all_chroms).codes for series in chrom_series_list]
+
+# subroutine to build one int64 key per interval for several data frames, comparable across data frames
+# packs chrom code, start, and end into 63 bits when coordinates allow it (always the case for human chromosomes)
+# falls back to dense ranks of start and end across all data frames otherwise
+def interval_keys(df_list,chrom_col='chrom',start_col='start',end_col='end'):
+    chrom_codes=[codes.astype(np.int64) for codes in shared_chrom_codes([df[chrom_col] for df in df_list])]
+    starts=[df[start_col].to_numpy().astype(np.int64) for df in df_list]
+    ends=[df[end_col].to_numpy().astype(np.int64) for df in df_list]
+    # bits needed for coordinates and chrom codes
+    max_coordinate=max([int(values.max()) for values in starts+ends if len(values)>0],default=0)
+    max_chrom_code=max([int(codes.max()) for codes in chrom_codes if len(codes)>0],default=0)
+    coordinate_bits=max(max_coordinate,1).bit_length()
+    chrom_bits=max(max_chrom_code,1).bit_length()
+    if (chrom_bits+2*coordinate_bits)>63:
+        # replace coordinates by their dense rank among all coordinates of all data frames
+        all_coordinates=np.unique(np.concatenate(starts+ends))
+        starts=[np.searchsorted(all_coordinates,values).astype(np.int64) for values in starts]
+        ends=[np.searchsorted(all_coordinates,values).astype(np.int64) for values in ends]
+        coordinate_bits=max(len(all_coordinates),1).bit_length()
+        # not expected for real assemblies - would need more than 2^31 distinct coordinates
+        if (chrom_bits+2*coordinate_bits)>63:
+            raise ValueError("Too many chromosomes and coordinates to pack interval keys into 64 bits.")
+    # key is chrom code, then start, then end - also sorts by chrom/start/end
+    return [(codes << (2*coordinate_bits)) | (start_values << coordinate_bits) | end_values for codes, start_values, end_values in zip(chrom_codes,starts,ends)]
+
+# subroutine to inner join two tables on identical (chrom, start, end) intervals with integer keys
+# output matches pd.merge on a "chrom:start-end" region name: left order, overlapping columns suffixed _x/_y
+def interval_key_merge(left_df,right_df,chrom_col='chrom',start_col='start',end_col='end'):
+    left_keys, right_keys = interval_keys([left_df,right_df],chrom_col,start_col,end_col)
+    merged_df=pd.merge(left_df,right_df,left_on=left_keys,right_on=right_keys)
+    # remove key column added by merging on arrays
+    return merged_df.drop(columns=['key_0'])
+
+# subroutine to pair rows with equal integer keys (e.g., interval_keys) by sorting and binary search instead of a hash join
+# returns (left row indices, right row indices) in pd.merge inner join order: left order, then right order within equal keys
+def key_match_pairs(left_keys,right_keys):
+    right_order=np.argsort(right_keys,kind='stable')
+    sorted_right_keys=right_keys[right_order]
+    first_match=np.searchsorted(sorted_right_keys,left_keys,side='left')
+    match_counts=np.searchsorted(sorted_right_keys,left_keys,side='right')-first_match
+    # expand match ranges into pairs without a python loop
+    left_idx=np.repeat(np.arange(len(left_keys)),match_counts)
+    offsets=np.arange(match_counts.sum())-np.repeat(np.cumsum(match_counts)-match_counts,match_counts)
+    return left_idx, right_order[np.repeat(first_match,match_counts)+offsets]
+
+# subroutine to group row indices by integer chrom code - returns dict of chrom code -> row indices (original order kept)
+def rows_by_chrom(chrom_codes):
+    order=np.argsort(chrom_codes,kind='stable')
+    unique_codes, first_idx = np.unique(chrom_codes[order],return_index=True)
+    bounds=np.append(first_idx,len(order))
+    return {code: order[bounds[i]:bounds[i+1]] for i, code in enumerate(unique_codes)}
+
+# subroutine to build a per chromosome sorted interval index over e.g. bulk entropy windows
+# each chrom code maps to interval starts (sorted), ends, running maximum of ends, and the requested value columns in the same order
+def build_sorted_interval_index(intervals_df,value_cols,chrom_codes,start_col='start',end_col='end'):
+    starts=intervals_df[start_col].to_numpy()
+    ends=intervals_df[end_col].to_numpy()
+    values={col: intervals_df[col].to_numpy() for col in value_cols}
+    interval_index={}
+    for code, rows in rows_by_chrom(chrom_codes).items():
+        # modkit entropy output is already coordinate sorted, in which case the stable sort keeps it as is
+        rows=rows[np.argsort(starts[rows],kind='stable')]
+        chrom_ends=ends[rows]
+        interval_index[code]={
+            'start': starts[rows],
+            'end': chrom_ends,
+            # running maximum of ends is sorted even if intervals are nested
+            'max_end': np.maximum.accumulate(chrom_ends),
+            'values': {col: col_values[rows] for col, col_values in values.items()}
+        }
+    return interval_index
+
+# subroutine to find all (query, indexed interval) overlapping pairs on one chromosome with searchsorted
+# intervals are half-open (BED) - overlap if interval start < query end and interval end > query start
+# returns query positions (ascending) and positions into the chromosome's index entry
+def overlap_pairs(index_entry,query_starts,query_ends):
+    # first candidate is the first interval whose running maximum end passes the query start
+    first_candidate=np.searchsorted(index_entry['max_end'],query_starts,side='right')
+    # candidates end at the first interval starting at or after the query end
+    last_candidate=np.searchsorted(index_entry['start'],query_ends,side='left')
+    candidate_counts=np.maximum(last_candidate-first_candidate,0)
+    # expand candidate ranges into pairs without a python loop
+    query_idx=np.repeat(np.arange(len(query_starts)),candidate_counts)
+    offsets=np.arange(candidate_counts.sum())-np.repeat(np.cumsum(candidate_counts)-candidate_counts,candidate_counts)
+    interval_idx=np.repeat(first_candidate,candidate_counts)+offsets
+    # drop nested candidates that end before the query starts (none for fixed-width windows)
+    overlapping=index_entry['end'][interval_idx]>query_starts[query_idx]
+    return query_idx[overlapping], interval_idx[overlapping]
+
+# subroutine to compute count, mean, median, min, and max of values per group with vectorized reductions
+# group_idx must be sorted ascending; groups without values get a count of 0 and NaN statistics
+def grouped_reductions(group_idx,values,num_groups):
+    values=values.astype(np.float64)
+    counts=np.bincount(group_idx,minlength=num_groups)
+    sums=np.bincount(group_idx,weights=values,minlength=num_groups)
+    nonempty=counts>0
+    segment_starts=(np.cumsum(counts)-counts)[nonempty]
+    nonempty_counts=counts[nonempty]
+    stats={name: np.full(num_groups,np.nan) for name in ['mean','median','min','max']}
+    stats['mean'][nonempty]=sums[nonempty]/nonempty_counts
+    if len(values)>0:
+        stats['min'][nonempty]=np.minimum.reduceat(values,segment_starts)
+        stats['max'][nonempty]=np.maximum.reduceat(values,segment_starts)
+        # sort values within each group, then average the two middle values (one if count is odd)
+        sorted_values=values[np.lexsort((values,group_idx))]
+        stats['median'][nonempty]=(sorted_values[segment_starts+(nonempty_counts-1)//2]+sorted_values[segment_starts+nonempty_counts//2])/2
+    stats['count']=counts
+    return stats
+
+# subroutine to summarize window entropies (e.g., modkit entropy 50 bp windows) over arbitrary regions such as DMRs
+# gives the modkit entropy --regions statistics per region without rerunning modkit: mean/median/min/max entropy and mean/min/max read counts
+# returns one row per region with at least one overlapping window, in region order
+def summarize_windows_over_regions(windows_df,regions_df,entropy_col='entropy',num_reads_col='num_reads'):
+    window_codes, region_codes = shared_chrom_codes([windows_df['chrom'],regions_df['chrom']])
+    window_index=build_sorted_interval_index(windows_df,[entropy_col,num_reads_col],window_codes)
+    region_starts=regions_df['start'].to_numpy()
+    region_ends=regions_df['end'].to_numpy()
+    # overlapping (region, window) pairs across all chromosomes, grouped by region
+    pair_region_idx=[]
+    pair_entropies=[]
+    pair_num_reads=[]
+    for code, rows in rows_by_chrom(region_codes).items():
+        if code not in window_index:
+            continue
+        query_idx, window_idx = overlap_pairs(window_index[code],region_starts[rows],region_ends[rows])
+        pair_region_idx.append(rows[query_idx])
+        pair_entropies.append(window_index[code]['values'][entropy_col][window_idx])
+        pair_num_reads.append(window_index[code]['values'][num_reads_col][window_idx])
+    pair_region_idx=np.concatenate(pair_region_idx) if pair_region_idx else np.array([],dtype=np.int64)
+    pair_entropies=np.concatenate(pair_entropies) if pair_entropies else np.array([])
+    pair_num_reads=np.concatenate(pair_num_reads) if pair_num_reads else np.array([])
+    # regions on different chromosomes are interleaved - stable sort pairs by region
+    pair_order=np.argsort(pair_region_idx,kind='stable')
+    pair_region_idx=pair_region_idx[pair_order]
+    entropy_stats=grouped_reductions(pair_region_idx,pair_entropies[pair_order],len(regions_df))
+    num_reads_stats=grouped_reductions(pair_region_idx,pair_num_reads[pair_order],len(regions_df))
+    summary_df=pd.DataFrame({
+        'chrom': regions_df['chrom'].array,
+        'start': region_starts,
+        'end': region_ends,
+        'mean_entropy': entropy_stats['mean'].astype(np.float32),
+        'median_entropy': entropy_stats['median'].astype(np.float32),
+        'min_entropy': entropy_stats['min'].astype(np.float32),
+        'max_entropy': entropy_stats['max'].astype(np.float32),
+        'mean_num_reads': num_reads_stats['mean'].astype(np.float32),
+        'min_num_reads': num_reads_stats['min'].astype(np.float32),
+        'max_num_reads': num_reads_stats['max'].astype(np.float32),
+        'successful_window_count': entropy_stats['count'].astype(np.int32)
+    })
+    # keep regions covered by at least one window
+    return summary_df[summary_df['successful_window_count']>0].reset_index(drop=True)
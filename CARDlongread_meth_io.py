@@ -0,0 +1,370 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_io.py
+# typed, column-pruned loaders for the tab-delimited inputs of the CARDlongread methylation scripts
+# covers modkit entropy (bulk windows and per region), modkit dmr pair segments, DSS/bsseq callDMR outputs, modkit sample-probs probabilities,
+# and per CpG methylation from modkit pileup bedMethyls and Bismark bisulfite coverage files
+# declares compact dtypes up front so genome-wide inputs never pass through pandas dtype inference
+
+import pandas as pd
+import numpy as np
+import io
+import os
+import time
+import psutil
+import resource
+import sys
+
+# full column names of headerless modkit entropy output (default windows, e.g., 50 bp)
+BULK_ENTROPY_COLUMNS=['chrom','start','end','entropy','strand','num_reads']
+# full column names of headerless modkit entropy --regions output (entropy per region/DMR)
+REGION_ENTROPY_COLUMNS=['chrom','start','end','region_name','mean_entropy','strand','median_entropy','min_entropy','max_entropy','mean_num_reads','min_num_reads','max_num_reads','successful_window_count','failed_window_count']
+# full column names of headerless modkit dmr pair segmentation output
+MODKIT_DMR_SEGMENT_COLUMNS=['chrom','start','end','state-name','score','N-sites','sample_a_counts','sample_b_counts','sample_a_percents','sample_b_percents','sample_a_fraction_modified','sample_b_fraction_modified','effect_size','cohen_h','cohen_h_low','cohen_h_high']
+# DSS/bsseq callDMR output has a header - columns used for plotting
+DSS_DMR_COLUMNS=['chr','start','end','length','diff.Methy']
+# modkit sample-probs probabilities.tsv has a header - columns used for plotting
+SAMPLE_PROBS_COLUMNS=['primary_base','code','range_start','range_end','count','frac']
+# full column names of headerless modkit pileup bedMethyl output (tab-delimited, modkit 0.2 or later)
+MODKIT_PILEUP_COLUMNS=['chrom','start','end','code','score','strand','thick_start','thick_end','color','valid_coverage','percent_modified','count_modified','count_canonical','count_other_mod','count_delete','count_fail','count_diff','count_nocall']
+# full column names of headerless Bismark coverage output (bismark2bedGraph/coverage2cytosine .cov, 1-based start)
+BISMARK_COVERAGE_COLUMNS=['chrom','start','end','methylation_percentage','count_methylated','count_unmethylated']
+# leading column names of a headerless BED of regions of interest (further columns ignored)
+REGIONS_BED_COLUMNS=['chrom','start','end']
+
+# compact dtypes shared by all inputs
+# coordinates fit in int32 for all human chromosomes
+COORDINATE_DTYPE='int32'
+# entropies and methylation changes do not need double precision
+VALUE_DTYPE='float32'
+# read counts per window - uint32, since deep or pooled samples can pass 65535 reads (uint16 would wrap around silently)
+READ_COUNT_DTYPE='uint32'
+
+# per input type specification - names to assign (None if header present), columns to keep, and dtype per kept column
+INPUT_SPECS={
+    'bulk_entropy': {
+        'names': BULK_ENTROPY_COLUMNS,
+        'usecols': ['chrom','start','end','entropy','num_reads'],
+        'dtype': {'chrom': 'category', 'start': COORDINATE_DTYPE, 'end': COORDINATE_DTYPE, 'entropy': VALUE_DTYPE, 'num_reads': READ_COUNT_DTYPE}
+    },
+    'region_entropy': {
+        'names': REGION_ENTROPY_COLUMNS,
+        'usecols': ['chrom','start','end','mean_entropy','mean_num_reads'],
+        'dtype': {'chrom': 'category', 'start': COORDINATE_DTYPE, 'end': COORDINATE_DTYPE, 'mean_entropy': VALUE_DTYPE, 'mean_num_reads': VALUE_DTYPE}
+    },
+    'modkit_dmr_segments': {
+        'names': MODKIT_DMR_SEGMENT_COLUMNS,
+        'usecols': ['chrom','start','end','state-name','N-sites','effect_size'],
+        'dtype': {'chrom': 'category', 'start': COORDINATE_DTYPE, 'end': COORDINATE_DTYPE, 'state-name': 'category', 'N-sites': 'int32', 'effect_size': VALUE_DTYPE}
+    },
+    # DSS writes coordinates from R numerics (e.g., 1e+05 or 100.0) so read them as float64 and cast afterwards
+    'dss_dmrs': {
+        'names': None,
+        'usecols': DSS_DMR_COLUMNS,
+        'dtype': {'chr': 'category', 'start': 'float64', 'end': 'float64', 'length': 'float64', 'diff.Methy': VALUE_DTYPE}
+    },
+    # one row per base/modification code and methylation likelihood bin
+    'sample_probs': {
+        'names': None,
+        'usecols': SAMPLE_PROBS_COLUMNS,
+        'dtype': {'primary_base': 'category', 'code': 'category', 'range_start': 'float64', 'range_end': 'float64', 'count': 'int64', 'frac': 'float64'}
+    },
+    # one row per modified base code and reference position (strand-combined CpGs for benchmarking)
+    'modkit_pileup': {
+        'names': MODKIT_PILEUP_COLUMNS,
+        'usecols': ['chrom','start','code','strand','valid_coverage','percent_modified'],
+        'dtype': {'chrom': 'category', 'start': COORDINATE_DTYPE, 'code': 'category', 'strand': 'category', 'valid_coverage': 'int32', 'percent_modified': VALUE_DTYPE}
+    },
+    # one row per CpG (merged strands, e.g., coverage2cytosine --merge_CpG)
+    'bismark_coverage': {
+        'names': BISMARK_COVERAGE_COLUMNS,
+        'usecols': ['chrom','start','methylation_percentage','count_methylated','count_unmethylated'],
+        'dtype': {'chrom': 'category', 'start': COORDINATE_DTYPE, 'methylation_percentage': VALUE_DTYPE, 'count_methylated': 'int32', 'count_unmethylated': 'int32'}
+    },
+    # regions of interest for --regions (e.g., a promoter panel)
+    'regions_bed': {
+        'names': REGIONS_BED_COLUMNS,
+        'usecols': REGIONS_BED_COLUMNS,
+        'dtype': {'chrom': 'category', 'start': 'int64', 'end': 'int64'}
+    }
+}
+
+# subroutine to detect gzip/bgzip compressed input from magic bytes (bgzip files often end in .bgz, which pandas does not infer)
+def detect_compression(path):
+    with open(path,'rb') as f:
+        magic=f.read(2)
+    if magic==b'\x1f\x8b':
+        return 'gzip'
+    return None
+
+# subroutine to concatenate chunks read separately while keeping categorical columns categorical
+def concat_typed_chunks(chunks):
+    if len(chunks)==1:
+        return chunks[0]
+    # unify categories per categorical column across chunks before concatenation
+    categorical_columns=[col for col in chunks[0].columns if isinstance(chunks[0][col].dtype,pd.CategoricalDtype)]
+    for col in categorical_columns:
+        union_categories=pd.api.types.union_categoricals([chunk[col] for chunk in chunks]).categories
+        # assign copies rather than setting in place - chunks may be slices of a larger chunk
+        chunks=[chunk.assign(**{col: chunk[col].cat.set_categories(union_categories)}) for chunk in chunks]
+    return pd.concat(chunks,ignore_index=True)
+
+# subroutine to get pd.read_csv arguments for one input type with explicit dtypes and only the needed columns
+def typed_read_kwargs(path,input_type,engine='c'):
+    spec=INPUT_SPECS[input_type]
+    read_kwargs={
+        'sep': '\t',
+        'dtype': spec['dtype'],
+        'compression': detect_compression(path),
+        'engine': engine
+    }
+    if spec['names'] is None:
+        # header present - select columns by name
+        read_kwargs['usecols']=spec['usecols']
+    else:
+        # headerless - select columns by position and name only the kept columns (works with both engines)
+        read_kwargs['header']=None
+        read_kwargs['usecols']=[spec['names'].index(col) for col in spec['usecols']]
+        read_kwargs['names']=spec['usecols']
+    return read_kwargs
+
+# subroutine to read one input type with explicit dtypes and only the needed columns
+# engine is 'c' (default) or 'pyarrow'; chunksize bounds parser memory for the c engine
+def read_typed_table(path,input_type,engine='c',chunksize=None):
+    spec=INPUT_SPECS[input_type]
+    read_kwargs=typed_read_kwargs(path,input_type,engine)
+    # pyarrow engine parses in parallel and does not support chunked reading
+    if engine=='pyarrow' or chunksize is None:
+        table_df=pd.read_csv(path,**read_kwargs)
+    else:
+        with pd.read_csv(path,chunksize=chunksize,**read_kwargs) as reader:
+            table_df=concat_typed_chunks([chunk for chunk in reader])
+    # keep columns in usecols order regardless of engine
+    return table_df[spec['usecols']]
+
+# subroutine to load bulk (genomic window) modkit entropy
+def load_bulk_entropy(path,engine='c',chunksize=None):
+    return read_typed_table(path,'bulk_entropy',engine,chunksize)
+
+# subroutine to load per region modkit entropy (modkit entropy --regions output)
+def load_region_entropy(path,engine='c',chunksize=None):
+    return read_typed_table(path,'region_entropy',engine,chunksize)
+
+# subroutine to load modkit dmr pair segments
+def load_modkit_dmr_segments(path,engine='c',chunksize=None):
+    return read_typed_table(path,'modkit_dmr_segments',engine,chunksize)
+
+# subroutine to load DSS/bsseq callDMR output
+def load_dss_dmrs(path,engine='c',chunksize=None):
+    dss_dmr_df=read_typed_table(path,'dss_dmrs',engine,chunksize)
+    # rename columns
+    dss_dmr_df=dss_dmr_df.rename(columns={'chr': 'chrom'})
+    # cast float coordinates and lengths to integers
+    dss_dmr_df['start']=dss_dmr_df['start'].astype(COORDINATE_DTYPE)
+    dss_dmr_df['end']=dss_dmr_df['end'].astype(COORDINATE_DTYPE)
+    dss_dmr_df['length']=dss_dmr_df['length'].astype(COORDINATE_DTYPE)
+    return dss_dmr_df
+
+# subroutine to make an empty data frame with the columns and dtypes of one input type (e.g., a chromosome missing from one input)
+def empty_typed_table(input_type):
+    spec=INPUT_SPECS[input_type]
+    return pd.DataFrame({col: pd.Series(dtype=spec['dtype'][col]) for col in spec['usecols']})
+
+# subroutine to get the set of chromosomes in an input by reading only the chrom column chunksize rows at a time
+def read_chromosome_set(path,input_type,chunksize):
+    read_kwargs=typed_read_kwargs(path,input_type)
+    chrom_col=INPUT_SPECS[input_type]['usecols'][0]
+    read_kwargs['usecols']=read_kwargs['usecols'][:1]
+    if 'names' in read_kwargs:
+        read_kwargs['names']=read_kwargs['names'][:1]
+    read_kwargs['dtype']={chrom_col: 'category'}
+    chromosomes=set()
+    with pd.read_csv(path,chunksize=chunksize,**read_kwargs) as reader:
+        for chunk in reader:
+            chromosomes.update(chunk[chrom_col].cat.categories)
+    return chromosomes
+
+# subroutine to read a coordinate-sorted input one chromosome at a time, parsing chunksize rows at a time
+# yields (chromosome, data frame of its rows); memory is bounded by the largest chromosome rather than the genome
+def iter_chromosome_tables(path,input_type,chunksize):
+    spec=INPUT_SPECS[input_type]
+    chrom_col=spec['usecols'][0]
+    finished_chromosomes=set()
+    current_chrom=None
+    current_pieces=[]
+    def chromosome_table(chrom,pieces):
+        chrom_df=concat_typed_chunks(pieces)[spec['usecols']].reset_index(drop=True)
+        chrom_df[chrom_col]=chrom_df[chrom_col].cat.set_categories([chrom])
+        return chrom_df
+    with pd.read_csv(path,chunksize=chunksize,**typed_read_kwargs(path,input_type)) as reader:
+        for chunk in reader:
+            chrom_codes=chunk[chrom_col].cat.codes.to_numpy()
+            chrom_names=chunk[chrom_col].cat.categories
+            # split chunk into runs of the same chromosome
+            run_bounds=[0]+list(np.flatnonzero(chrom_codes[1:]!=chrom_codes[:-1])+1)+[len(chunk)]
+            for run_start, run_end in zip(run_bounds[:-1],run_bounds[1:]):
+                chrom=chrom_names[chrom_codes[run_start]]
+                piece=chunk.iloc[run_start:run_end]
+                if chrom!=current_chrom:
+                    if current_chrom is not None:
+                        finished_chromosomes.add(current_chrom)
+                        yield current_chrom, chromosome_table(current_chrom,current_pieces)
+                    if chrom in finished_chromosomes:
+                        raise ValueError(path + " is not sorted by chromosome (" + str(chrom) + " appears in more than one block).")
+                    current_chrom=chrom
+                    current_pieces=[]
+                current_pieces.append(piece)
+    if current_chrom is not None:
+        yield current_chrom, chromosome_table(current_chrom,current_pieces)
+
+# subroutine to pick the next chromosome of inputs read in lockstep from each input's current chromosome (None once an input is finished)
+# the first current chromosome that no other input still has ahead of it, i.e., shared chromosomes come together
+def next_matched_chromosome(current_chromosomes,chromosome_sets):
+    for chrom in current_chromosomes:
+        if (chrom is not None) and all((current_chrom==chrom) or (chrom not in chromosome_set) for current_chrom, chromosome_set in zip(current_chromosomes,chromosome_sets)):
+            return chrom
+    raise ValueError("Inputs are not sorted in the same chromosome order.")
+
+# subroutine to read several coordinate-sorted inputs in lockstep one chromosome at a time
+# yields (chromosome, list of one data frame per input, None where the input lacks the chromosome); chromosomes shared by inputs come together
+# chromosomes shared by inputs must be in the same order in each (true for files sorted by the same tool)
+def iter_matched_chromosome_tables(paths,input_type,chunksize):
+    chromosome_sets=[read_chromosome_set(path,input_type,chunksize) for path in paths]
+    table_iterators=[iter_chromosome_tables(path,input_type,chunksize) for path in paths]
+    current_tables=[next(tables,(None,None)) for tables in table_iterators]
+    while any(chrom is not None for chrom, _ in current_tables):
+        try:
+            chrom=next_matched_chromosome([current_chrom for current_chrom, _ in current_tables],chromosome_sets)
+        except ValueError:
+            raise ValueError(", ".join(paths) + " are not sorted in the same chromosome order.")
+        yield chrom, [chrom_df if current_chrom==chrom else None for current_chrom, chrom_df in current_tables]
+        current_tables=[next(tables,(None,None)) if current_chrom==chrom else (current_chrom,chrom_df) for tables, (current_chrom, chrom_df) in zip(table_iterators,current_tables)]
+
+# subroutine to get the start of the first line at or after offset in an open binary file
+def line_start_at_or_after(f,offset):
+    if offset<=0:
+        return 0
+    f.seek(offset-1)
+    f.readline()
+    return f.tell()
+
+# subroutine to get the tab-separated fields of the line starting at line_start in an open binary file
+def line_fields_at(f,line_start):
+    f.seek(line_start)
+    return f.readline().rstrip(b'\r\n').split(b'\t')
+
+# subroutine to binary search a sorted, uncompressed input for the first line starting in [low, high) whose fields satisfy predicate
+# predicate must be false and then true over the lines in the range (e.g., another chromosome, or a position past a cutoff); returns high if no line does
+def first_line_where(f,low,high,predicate):
+    search_low=low
+    search_high=high
+    while search_low<search_high:
+        mid=(search_low+search_high)//2
+        line_start=line_start_at_or_after(f,mid)
+        if (line_start>=high) or predicate(line_fields_at(f,line_start)):
+            search_high=mid
+        else:
+            search_low=mid+1
+    return min(line_start_at_or_after(f,search_low),high)
+
+# subroutine to index an uncompressed, coordinate-sorted, headerless input by chromosome without reading it through
+# returns dict of chromosome -> (start byte, end byte) in file order; each chromosome's end is found by binary search over byte offsets
+# (a few reads per chromosome), so rows of each chromosome must be contiguous - rows within a chromosome are checked by the readers
+def build_chromosome_offsets(path):
+    if detect_compression(path) is not None:
+        raise ValueError(path + " is compressed - byte offsets can only be built for uncompressed inputs.")
+    offsets={}
+    file_size=os.path.getsize(path)
+    with open(path,'rb') as f:
+        run_start=0
+        while run_start<file_size:
+            run_chrom=line_fields_at(f,run_start)[0]
+            # trailing blank lines
+            if len(run_chrom)==0:
+                break
+            run_end=first_line_where(f,run_start,file_size,lambda fields: fields[0]!=run_chrom)
+            chrom=run_chrom.decode()
+            if chrom in offsets:
+                raise ValueError(path + " is not sorted by chromosome (" + chrom + " appears in more than one block).")
+            offsets[chrom]=(run_start,run_end)
+            run_start=run_end
+    return offsets
+
+# file object reading only the given (start byte, end byte) ranges of an input, in order (e.g., one chromosome or a set of regions)
+class ByteRangeFile(io.RawIOBase):
+    def __init__(self,path,byte_ranges):
+        self.file=open(path,'rb')
+        self.byte_ranges=list(byte_ranges)
+        self.remaining=0
+    def readable(self):
+        return True
+    def readinto(self,buffer):
+        # move on to the next range once the current one is used up
+        while (self.remaining<=0) and (len(self.byte_ranges)>0):
+            range_start, range_end = self.byte_ranges.pop(0)
+            self.file.seek(range_start)
+            self.remaining=range_end-range_start
+        size=min(len(buffer),self.remaining)
+        if size<=0:
+            return 0
+        data=self.file.read(size)
+        buffer[:len(data)]=data
+        self.remaining-=len(data)
+        return len(data)
+    def close(self):
+        self.file.close()
+        super().close()
+
+# subroutine to open byte ranges of an input for pd.read_csv
+def open_byte_ranges(path,byte_ranges):
+    return io.BufferedReader(ByteRangeFile(path,byte_ranges))
+
+# subroutine to order chromosomes of several inputs as iter_matched_chromosome_tables yields them (shared chromosomes together)
+def matched_chromosome_order(chromosome_lists):
+    chromosome_lists=[list(chromosomes) for chromosomes in chromosome_lists]
+    chromosome_sets=[set(chromosomes) for chromosomes in chromosome_lists]
+    positions=[0]*len(chromosome_lists)
+    order=[]
+    while any(position<len(chromosomes) for position, chromosomes in zip(positions,chromosome_lists)):
+        current_chromosomes=[chromosomes[position] if position<len(chromosomes) else None for position, chromosomes in zip(positions,chromosome_lists)]
+        chrom=next_matched_chromosome(current_chromosomes,chromosome_sets)
+        order.append(chrom)
+        positions=[position+1 if current_chrom==chrom else position for position, current_chrom in zip(positions,current_chromosomes)]
+    return order
+
+# subroutine to load modkit sample-probs probabilities.tsv
+def load_sample_probs(path,engine='c',chunksize=None):
+    return read_typed_table(path,'sample_probs',engine,chunksize)
+
+# subroutine to give the chrom column of every data frame the same categories
+# keeps chrom categorical (instead of object) through later concatenation and joins
+def harmonize_chrom_categories(df_list):
+    all_chroms=pd.api.types.union_categoricals([df['chrom'] for df in df_list]).categories
+    chrom_dtype=pd.CategoricalDtype(sorted(all_chroms))
+    for df in df_list:
+        df['chrom']=df['chrom'].cat.set_categories(chrom_dtype.categories)
+    return chrom_dtype
+
+# subroutine to get peak resident set size of this process in bytes
+def peak_rss_bytes():
+    peak_rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    if sys.platform=='darwin':
+        return peak_rss
+    return peak_rss*1024
+
+# subroutine to report load time, table size, current RSS, and peak RSS for one or more loaded inputs
+def report_load_usage(label,table_dfs,start_time):
+    elapsed=time.perf_counter()-start_time
+    if isinstance(table_dfs,pd.DataFrame):
+        table_dfs=[table_dfs]
+    total_rows=sum(len(df) for df in table_dfs)
+    total_bytes=sum(df.memory_usage(deep=True).sum() for df in table_dfs)
+    current_rss=psutil.Process().memory_info().rss
+    print("Loaded",label,"-",total_rows,"rows,",round(total_bytes/1e6,1),"MB in memory,",round(elapsed,2),"s; RSS",round(current_rss/1e6,1),"MB, peak RSS",round(peak_rss_bytes()/1e6,1),"MB")
+
+# subroutine to report time, rows, current RSS, and peak RSS for an input read in streaming mode
+def report_stream_usage(label,total_rows,start_time):
+    elapsed=time.perf_counter()-start_time
+    current_rss=psutil.Process().memory_info().rss
+    print("Streamed",label,"-",total_rows,"rows,",round(elapsed,2),"s; RSS",round(current_rss/1e6,1),"MB, peak RSS",round(peak_rss_bytes()/1e6,1),"MB")
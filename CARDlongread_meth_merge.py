@@ -0,0 +1,141 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_merge.py
+# chunked k-way merge of coordinate-sorted per CpG methylation inputs (modkit pileup bedMethyls and Bismark bisulfite coverage files)
+# all inputs are read side by side chunksize rows at a time and aligned on CpG position in one pass,
+# so memory is bounded by chunksize times the number of inputs rather than by genome-wide tables
+
+import pandas as pd
+import numpy as np
+from CARDlongread_meth_io import INPUT_SPECS, typed_read_kwargs, read_chromosome_set
+from CARDlongread_meth_regions import ONE_BASED_INPUT_TYPES, open_region_source, table_region_mask
+
+# per CpG methylation input types - modkit pileup bedMethyl (ONT) or Bismark coverage (bisulfite)
+METHYLATION_INPUT_TYPES=['modkit_pileup','bismark_coverage']
+
+# subroutine to get 0-based CpG positions, percent methylated, and coverage arrays from one chunk of a methylation input
+def methylation_arrays(chunk,input_type):
+    if input_type=='modkit_pileup':
+        positions=chunk['start'].to_numpy(np.int64)
+        percent_modified=chunk['percent_modified'].to_numpy(np.float32)
+        coverage=chunk['valid_coverage'].to_numpy(np.int32)
+    else:
+        # Bismark coverage files are 1-based
+        positions=chunk['start'].to_numpy(np.int64)-1
+        percent_modified=chunk['methylation_percentage'].to_numpy(np.float32)
+        coverage=(chunk['count_methylated'].to_numpy(np.int32)+chunk['count_unmethylated'].to_numpy(np.int32))
+    return positions, percent_modified, coverage
+
+# subroutine to read a coordinate-sorted methylation input chunksize rows at a time
+# yields (chromosome, (positions, percent methylated, coverage)) pieces - one per run of rows on the same chromosome in a chunk
+# modkit pileup rows are restricted to mod_code (e.g., m for 5mC); raises ValueError unless positions strictly increase per chromosome
+# and, for modkit pileups, strands are combined (stranded CpG rows at p and p+1 would otherwise pass as separate CpGs)
+# selection (CARDlongread_meth_regions.region_selection) reads only rows overlapping its regions (e.g., one chromosome per parallel job)
+def iter_methylation_pieces(path,input_type,mod_code='m',chunksize=1000000,selection=None):
+    chrom_col=INPUT_SPECS[input_type]['usecols'][0]
+    finished_chromosomes=set()
+    current_chrom=None
+    last_position=-1
+    if selection is not None:
+        source, read_kwargs = open_region_source(path,input_type,selection)
+        if source is None:
+            return
+    else:
+        source, read_kwargs = path, typed_read_kwargs(path,input_type)
+    with pd.read_csv(source,chunksize=chunksize,**read_kwargs) as reader:
+        for chunk in reader:
+            if selection is not None:
+                chunk=chunk[table_region_mask(chunk,selection,input_type in ONE_BASED_INPUT_TYPES)]
+            if input_type=='modkit_pileup':
+                chunk=chunk[(chunk['code']==mod_code).to_numpy()]
+                if (chunk['strand']!='.').any():
+                    raise ValueError(path + " has stranded rows (strand other than '.') - use strand-combined inputs, e.g., modkit pileup --cpg --combine-strands.")
+            if len(chunk)==0:
+                continue
+            chrom_codes=chunk[chrom_col].cat.codes.to_numpy()
+            chrom_names=chunk[chrom_col].cat.categories
+            positions, percent_modified, coverage = methylation_arrays(chunk,input_type)
+            # split chunk into runs of the same chromosome
+            run_bounds=[0]+list(np.flatnonzero(chrom_codes[1:]!=chrom_codes[:-1])+1)+[len(chunk)]
+            for run_start, run_end in zip(run_bounds[:-1],run_bounds[1:]):
+                chrom=str(chrom_names[chrom_codes[run_start]])
+                if chrom!=current_chrom:
+                    if chrom in finished_chromosomes:
+                        raise ValueError(path + " is not sorted by chromosome (" + str(chrom) + " appears in more than one block).")
+                    if current_chrom is not None:
+                        finished_chromosomes.add(current_chrom)
+                    current_chrom=chrom
+                    last_position=-1
+                run_positions=positions[run_start:run_end]
+                if (run_positions[0]<=last_position) or (np.diff(run_positions)<=0).any():
+                    raise ValueError(path + " is not coordinate sorted on " + str(chrom) + " or has more than one row per CpG (use strand-combined inputs, e.g., modkit pileup --combine-strands).")
+                last_position=run_positions[-1]
+                yield chrom, (run_positions,percent_modified[run_start:run_end],coverage[run_start:run_end])
+
+# subroutine to align pieces taken from several inputs on the union of their CpG positions
+# returns a block dict - chromosome, sorted positions, percent methylated (inputs x positions, NaN where an input has no call),
+# and coverage (inputs x positions, 0 where an input has no call)
+def aligned_block(chrom,taken_pieces,num_inputs):
+    positions=np.unique(np.concatenate([piece[0] for piece in taken_pieces.values()]))
+    percent_modified=np.full((num_inputs,len(positions)),np.nan,dtype=np.float32)
+    coverage=np.zeros((num_inputs,len(positions)),dtype=np.int32)
+    for input_idx, (piece_positions, piece_percent_modified, piece_coverage) in taken_pieces.items():
+        columns=np.searchsorted(positions,piece_positions)
+        percent_modified[input_idx,columns]=piece_percent_modified
+        coverage[input_idx,columns]=piece_coverage
+    return {'chrom': chrom, 'position': positions, 'percent_modified': percent_modified, 'coverage': coverage}
+
+# subroutine to merge coordinate-sorted methylation inputs on CpG position in one pass
+# inputs is a list of (path, input type) pairs; yields aligned blocks (see aligned_block) of at most about chunksize positions per input
+# chromosomes shared by several inputs must be in the same order in each (true for files sorted by the same tool)
+# selection restricts the merge to rows overlapping its regions; it must hold a single chromosome (e.g., one chromosome per parallel job)
+# since chromosomes without rows in a selection are not known in advance
+def iter_merged_methylation_blocks(inputs,mod_code='m',chunksize=1000000,selection=None):
+    num_inputs=len(inputs)
+    if selection is not None:
+        if len(selection)>1:
+            raise ValueError("Methylation inputs can only be merged over regions of one chromosome at a time.")
+        # every input may hold the selected chromosome - inputs without rows there finish right away
+        chromosome_sets=[set(selection)]*num_inputs
+    else:
+        # chromosome pre-pass (chrom column only) so chromosomes missing from some inputs do not stall the merge
+        chromosome_sets=[read_chromosome_set(path,input_type,chunksize) for path, input_type in inputs]
+    piece_iters=[iter_methylation_pieces(path,input_type,mod_code,chunksize,selection) for path, input_type in inputs]
+    heads=[next(pieces,None) for pieces in piece_iters]
+    while any(head is not None for head in heads):
+        # next chromosome - the first input head whose chromosome is at the head of every input containing it
+        chrom=None
+        for head in heads:
+            # finished inputs hold no further chromosomes
+            if (head is not None) and all((heads[idx] is None) or (heads[idx][0]==head[0]) for idx in range(num_inputs) if head[0] in chromosome_sets[idx]):
+                chrom=head[0]
+                break
+        if chrom is None:
+            raise ValueError("Methylation inputs " + ", ".join(path for path, _ in inputs) + " are not sorted in the same chromosome order.")
+        members=[idx for idx in range(num_inputs) if (heads[idx] is not None) and (heads[idx][0]==chrom)]
+        buffers={idx: heads[idx][1] for idx in members}
+        finished=set()
+        while True:
+            # refill emptied buffers from the next piece of the same chromosome
+            for idx in members:
+                while (idx not in finished) and (len(buffers[idx][0])==0):
+                    piece=next(piece_iters[idx],None)
+                    if (piece is None) or (piece[0]!=chrom):
+                        heads[idx]=piece
+                        finished.add(idx)
+                    else:
+                        buffers[idx]=piece[1]
+            active=[idx for idx in members if idx not in finished]
+            # positions up to the smallest last buffered position of unfinished inputs are complete in every input
+            frontier=min(buffers[idx][0][-1] for idx in active) if len(active)>0 else None
+            taken_pieces={}
+            for idx in members:
+                buffer_positions=buffers[idx][0]
+                cut=len(buffer_positions) if frontier is None else np.searchsorted(buffer_positions,frontier,side='right')
+                if cut>0:
+                    taken_pieces[idx]=tuple(array[:cut] for array in buffers[idx])
+                    buffers[idx]=tuple(array[cut:] for array in buffers[idx])
+            if len(taken_pieces)>0:
+                yield aligned_block(chrom,taken_pieces,num_inputs)
+            if len(active)==0:
+                break
@@ -0,0 +1,36 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_parallel.py
+# run per chromosome load-join-aggregate jobs in a process or thread pool
+# inputs are split by chromosome through byte offset indexes (CARDlongread_meth_io.build_chromosome_offsets), so each job reads
+# only its chromosome; jobs return mergeable partial summaries (counts, histograms, moment sums) that callers add up as jobs finish
+
+import concurrent.futures
+
+# subroutine to add chromosome-parallel arguments to a script's argument parser
+def add_parallel_arguments(parser):
+    parallel_group=parser.add_mutually_exclusive_group()
+    # argument for number of worker processes
+    parallel_group.add_argument("--processes", required=False, type=int, default=1, help="Number of worker processes running per chromosome jobs in parallel (default 1; inputs must be uncompressed to be split by chromosome).")
+    # argument for number of worker threads
+    parallel_group.add_argument("--threads", required=False, type=int, default=1, help="Number of worker threads running per chromosome jobs in parallel instead of processes (default 1; lower memory, but only parsing and NumPy work run concurrently).")
+
+# subroutine to get the number of parallel chromosome workers from parsed arguments
+def parallel_workers(args):
+    return max(args.processes,args.threads,1)
+
+# subroutine to run per chromosome jobs - job_function(*job_args) for each entry of job_args_list
+# yields (job index, result) as jobs finish (in order when run serially), so callers can merge partial summaries without holding them all
+def iter_chromosome_jobs(job_function,job_args_list,processes=1,threads=1):
+    if processes<=1 and threads<=1:
+        for job_idx, job_args in enumerate(job_args_list):
+            yield job_idx, job_function(*job_args)
+        return
+    if processes>1:
+        executor=concurrent.futures.ProcessPoolExecutor(max_workers=processes)
+    else:
+        executor=concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+    with executor:
+        future_jobs={executor.submit(job_function,*job_args): job_idx for job_idx, job_args in enumerate(job_args_list)}
+        for future in concurrent.futures.as_completed(future_jobs):
+            yield future_jobs[future], future.result()
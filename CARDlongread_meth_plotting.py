@@ -0,0 +1,174 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_plotting.py
+# shared drawing helpers for the CARDlongread methylation plots
+# density scatter modes pre-bin points per hue so render time depends on the number of bins, not the number of points
+# histograms are drawn from precomputed histogram/KDE summary tables (see CARDlongread_meth_stats.py) rather than raw rows
+# in data only mode (CARDlongread_meth_figure_output.py) the drawing helpers set each figure's plotted data instead of drawing it
+
+import pandas as pd
+import numpy as np
+import seaborn as sb
+import matplotlib.pyplot as plt
+from matplotlib.patches import Patch
+from matplotlib.colors import to_rgb, LinearSegmentedColormap
+from CARDlongread_meth_stats import hue_levels, hue_codes_for_levels, finite_range, bin_points_by_hue
+from CARDlongread_meth_figure_output import figure_data_only, set_figure_data, save_figure
+
+# scatterplot rendering modes - points draws every point with seaborn, the others draw binned densities
+SCATTER_MODES=['points','hexbin','hist2d','datashade']
+# modes drawn from precomputed bin counts alone (so also from streamed density accumulators)
+BINNED_SCATTER_MODES=['hist2d','datashade']
+
+# subroutine to get hue colors matching seaborn's default categorical palette
+def hue_colors(num_hues):
+    return [to_rgb(color) for color in sb.color_palette(n_colors=num_hues)]
+
+# subroutine to make a colormap from a light tint of a hue color (single points stay visible) to the full color
+def hue_colormap(color,min_strength=0.35):
+    light_color=tuple(1-min_strength*(1-channel) for channel in color)
+    return LinearSegmentedColormap.from_list('hue',[light_color,color])
+
+# subroutine to scale nonzero counts to opacities between min_alpha and 1 on a log scale
+def log_count_alpha(counts,min_alpha=0.25):
+    alpha=np.zeros(counts.shape)
+    nonzero=counts>0
+    if nonzero.any():
+        alpha[nonzero]=min_alpha+(1-min_alpha)*np.log1p(counts[nonzero])/np.log1p(counts.max())
+    return alpha
+
+# subroutine to draw binned counts per hue as overlaid single-color image layers (later hues on top, as in a scatterplot)
+def draw_hist2d_layers(ax,binned_counts,colors,extent):
+    for hue_idx, color in enumerate(colors):
+        rgba=np.zeros(binned_counts.shape[1:]+(4,))
+        rgba[...,:3]=color
+        rgba[...,3]=log_count_alpha(binned_counts[hue_idx])
+        # counts are (x bins, y bins) - transpose to image rows (y) by columns (x)
+        ax.imshow(rgba.transpose(1,0,2),extent=extent,origin='lower',aspect='auto',interpolation='nearest')
+
+# subroutine to draw binned counts per hue as one image with hue colors mixed by count per bin (datashader-style shading)
+def draw_datashade_image(ax,binned_counts,colors,extent):
+    total_counts=binned_counts.sum(axis=0)
+    rgba=np.zeros(total_counts.shape+(4,))
+    # count weighted average of hue colors per bin
+    mixed_colors=np.tensordot(binned_counts,np.array(colors),axes=([0],[0]))
+    nonzero=total_counts>0
+    rgba[nonzero,:3]=mixed_colors[nonzero]/total_counts[nonzero,None]
+    rgba[...,3]=log_count_alpha(total_counts)
+    ax.imshow(rgba.transpose(1,0,2),extent=extent,origin='lower',aspect='auto',interpolation='nearest')
+
+# subroutine to draw precomputed binned counts per hue (hist2d layers or datashade image)
+def draw_binned_density(ax,binned_counts,colors,extent,scatter_mode):
+    if scatter_mode=='datashade':
+        draw_datashade_image(ax,binned_counts,colors,extent)
+    else:
+        draw_hist2d_layers(ax,binned_counts,colors,extent)
+
+# subroutine to draw a scatterplot of x vs. y colored by hue in the requested mode
+# x_range/y_range restrict binned modes to axis limits (e.g., read count cutoff); default is the data range
+# data may also be a filled 2D density accumulator (streaming mode), drawn as is in the hist2d or datashade modes
+def draw_scatter(ax,data,x,y,hue,scatter_mode='points',bins=300,x_range=None,y_range=None):
+    if isinstance(data,dict):
+        if scatter_mode not in BINNED_SCATTER_MODES:
+            raise ValueError("Precomputed densities can only be drawn in " + " or ".join(BINNED_SCATTER_MODES) + " scatter modes.")
+        # leave out levels without points like seaborn leaves out absent hues
+        present=data['counts'].reshape(len(data['levels']),-1).sum(axis=1)>0
+        levels=[level for level, keep in zip(data['levels'],present) if keep]
+        colors=hue_colors(len(levels))
+        x_range=data['x_range']
+        y_range=data['y_range']
+        if figure_data_only():
+            set_figure_data(ax.figure,binned_density_table(data['counts'][present],levels,x,y,hue,x_range,y_range))
+        else:
+            draw_binned_density(ax,data['counts'][present],colors,(x_range[0],x_range[1],y_range[0],y_range[1]),scatter_mode)
+        return finish_binned_scatter(ax,x,y,levels,colors,x_range,y_range)
+    if (scatter_mode=='points') and (not figure_data_only()):
+        sb.scatterplot(data=data,x=x,y=y,hue=hue,ax=ax)
+        return ax
+    levels=hue_levels(data[hue])
+    colors=hue_colors(len(levels))
+    hue_codes=hue_codes_for_levels(data[hue],levels)
+    if x_range is None:
+        x_range=finite_range(data[x])
+    if y_range is None:
+        y_range=finite_range(data[y])
+    extent=(x_range[0],x_range[1],y_range[0],y_range[1])
+    if scatter_mode in ['points','hexbin']:
+        in_range=(data[x]>=x_range[0]) & (data[x]<=x_range[1]) & (data[y]>=y_range[0]) & (data[y]<=y_range[1])
+        if figure_data_only():
+            # points within the axis limits
+            set_figure_data(ax.figure,data.loc[in_range.to_numpy(),[x,y,hue]].reset_index(drop=True))
+            return finish_binned_scatter(ax,x,y,levels,colors,x_range,y_range)
+        # one hexbin layer per hue in a light-to-hue colormap (log counts)
+        for hue_idx, color in enumerate(colors):
+            hue_mask=(hue_codes==hue_idx) & in_range.to_numpy()
+            if hue_mask.any():
+                ax.hexbin(data[x].to_numpy()[hue_mask],data[y].to_numpy()[hue_mask],gridsize=max(bins//3,10),extent=extent,mincnt=1,bins='log',cmap=hue_colormap(color),alpha=0.8,linewidths=0)
+    else:
+        binned_counts=bin_points_by_hue(data[x],data[y],hue_codes,len(levels),x_range,y_range,bins)
+        if figure_data_only():
+            set_figure_data(ax.figure,binned_density_table(binned_counts,levels,x,y,hue,x_range,y_range))
+        else:
+            draw_binned_density(ax,binned_counts,colors,extent,scatter_mode)
+    return finish_binned_scatter(ax,x,y,levels,colors,x_range,y_range)
+
+# subroutine to get the nonzero bins of binned counts per hue as a table (plotted data of binned density scatterplots)
+# one row per hue and bin with bin edges on both axes and the count of points
+def binned_density_table(binned_counts,levels,x,y,hue,x_range,y_range):
+    hue_idx, x_idx, y_idx = np.nonzero(binned_counts)
+    x_edges=np.linspace(x_range[0],x_range[1],binned_counts.shape[1]+1)
+    y_edges=np.linspace(y_range[0],y_range[1],binned_counts.shape[2]+1)
+    return pd.DataFrame({
+        hue: pd.Categorical.from_codes(hue_idx,categories=levels),
+        x + ' bin start': x_edges[x_idx],
+        x + ' bin end': x_edges[x_idx+1],
+        y + ' bin start': y_edges[y_idx],
+        y + ' bin end': y_edges[y_idx+1],
+        'count': binned_counts[hue_idx,x_idx,y_idx]
+    })
+
+# subroutine to set limits, legend, and axis labels of a binned density scatterplot
+def finish_binned_scatter(ax,x,y,levels,colors,x_range,y_range):
+    ax.set_xlim(x_range)
+    ax.set_ylim(y_range)
+    # images carry no legend entries - add one patch per hue
+    ax.legend(handles=[Patch(color=color,label=level) for level, color in zip(levels,colors)])
+    ax.set(xlabel=x,ylabel=y)
+    return ax
+
+# subroutine to draw a histogram/KDE summary table (histogram_summary output) as side by side bars per region type with KDE lines
+# matches sb.histplot(multiple="dodge",stat="proportion",common_norm=False,kde=True) without passing raw rows to seaborn
+def draw_histogram_summary(ax,summary_df,hue='Region type'):
+    levels=list(pd.unique(summary_df[hue]))
+    colors=hue_colors(len(levels))
+    for hue_idx, (level, color) in enumerate(zip(levels,colors)):
+        level_df=summary_df[summary_df[hue]==level]
+        histogram_df=level_df[level_df['statistic']=='histogram']
+        kde_df=level_df[level_df['statistic']=='kde']
+        # dodge - split each bin into one bar per region type
+        bar_widths=(histogram_df['x_end'].to_numpy()-histogram_df['x'].to_numpy())/len(levels)
+        ax.bar(histogram_df['x'].to_numpy()+hue_idx*bar_widths,histogram_df['proportion'].to_numpy(),width=bar_widths,align='edge',color=color,alpha=0.75,linewidth=0.5,edgecolor='white')
+        ax.plot(kde_df['x'].to_numpy(),kde_df['proportion'].to_numpy(),color=color)
+    ax.legend(handles=[Patch(color=color,alpha=0.75,label=level) for level, color in zip(levels,colors)],title=hue)
+    return ax
+
+# subroutine to plot a histogram/KDE summary table to a png file - used by the plotting scripts and to redraw saved summaries
+def plot_histogram_summary(summary_df,xlabel,ylabel,plot_title,output_png):
+    # initialize figure
+    fig, ax = plt.subplots()
+    if figure_data_only():
+        set_figure_data(fig,summary_df)
+    else:
+        ax = draw_histogram_summary(ax,summary_df)
+    # label x-axis
+    ax.set(xlabel=xlabel)
+    # label y-axis
+    ax.set(ylabel=ylabel)
+    # set high y-limit to 1
+    ax.set_ylim(bottom=0,top=1.1)
+    # add title
+    ax.set_title(plot_title)
+    # save figure
+    save_figure(fig,output_png,bbox_inches='tight')
+    # close figure
+    fig.clf()
@@ -0,0 +1,225 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_regions.py
+# region-restricted reading of coordinate-sorted inputs (--regions BED and --chrom) so targeted reruns parse only overlapping records
+# plain sorted TSVs are searched by byte offset (CARDlongread_meth_io.build_chromosome_offsets, then binary search on start positions),
+# bgzipped inputs are queried through their tabix/CSI index with pysam; parsed rows are then filtered to exact region overlaps
+
+import pandas as pd
+import numpy as np
+import importlib.util
+import io
+import os
+from CARDlongread_meth_io import INPUT_SPECS, typed_read_kwargs, read_typed_table, detect_compression, build_chromosome_offsets, first_line_where, open_byte_ranges, concat_typed_chunks, empty_typed_table
+
+# bases before each region start searched for records starting earlier that still overlap it (e.g., entropy windows)
+REGION_LOOKBACK=10000
+# region end standing for the rest of a chromosome (--chrom without --regions)
+WHOLE_CHROMOSOME_END=np.iinfo(np.int64).max
+# input types with 1-based start coordinates
+ONE_BASED_INPUT_TYPES=['bismark_coverage']
+
+# subroutine to add region selection arguments to a script's argument parser
+def add_region_arguments(parser):
+    # argument for chromosomes to analyze
+    parser.add_argument("--chrom", required=False, nargs='+', default=None, help="Only analyze these chromosomes (read through byte offset or tabix/CSI indexes instead of parsing whole inputs).")
+    # argument for regions to analyze
+    parser.add_argument("--regions", required=False, default=None, help="BED file of regions to analyze (chrom, start, end; e.g., a promoter panel) - only records overlapping them are read. Inputs must be coordinate sorted; bgzipped inputs need a tabix/CSI index and pysam.")
+
+# subroutine to merge overlapping or adjacent intervals - returns sorted starts and ends
+def merge_intervals(starts,ends):
+    order=np.argsort(starts,kind='stable')
+    starts=starts[order]
+    ends=ends[order]
+    running_ends=np.maximum.accumulate(ends)
+    run_firsts=np.flatnonzero(np.concatenate([[True],starts[1:]>running_ends[:-1]]))
+    return starts[run_firsts], np.maximum.reduceat(ends,run_firsts)
+
+# subroutine to get the region selection from parsed arguments - None if neither --regions nor --chrom was given
+# returns dict of chromosome -> (sorted region starts, region ends) with overlapping regions merged, in first appearance order
+def region_selection(args):
+    if (args.regions is None) and (args.chrom is None):
+        return None
+    if args.regions is None:
+        return {chrom: (np.array([0]),np.array([WHOLE_CHROMOSOME_END])) for chrom in dict.fromkeys(args.chrom)}
+    regions_df=read_typed_table(args.regions,'regions_bed')
+    if args.chrom is not None:
+        regions_df=regions_df[regions_df['chrom'].isin(args.chrom)]
+    selection={}
+    for chrom, chrom_df in regions_df.groupby('chrom',observed=True,sort=False):
+        selection[str(chrom)]=merge_intervals(chrom_df['start'].to_numpy(np.int64),chrom_df['end'].to_numpy(np.int64))
+    return selection
+
+# subroutine to get the selection of one whole chromosome (e.g., one chromosome-parallel job)
+def chromosome_selection(chrom,selection=None):
+    if selection is None:
+        return {chrom: (np.array([0]),np.array([WHOLE_CHROMOSOME_END]))}
+    return {chrom: selection[chrom]} if chrom in selection else {}
+
+# subroutine to get the inputs that cannot be read by region - compressed inputs without a tabix/CSI index or without pysam
+def unindexed_region_inputs(paths):
+    pysam_available=importlib.util.find_spec('pysam') is not None
+    return [path for path in paths if (detect_compression(path) is not None) and ((not pysam_available) or (tabix_index_path(path) is None))]
+
+# subroutine to get the chromosomes of a region-readable input - from its byte offsets, or from its tabix/CSI index if bgzipped
+def input_chromosomes(path):
+    if detect_compression(path) is None:
+        return set(build_chromosome_offsets(path))
+    import pysam
+    with pysam.TabixFile(path,index=tabix_index_path(path)) as tabix_file:
+        return set(tabix_file.contigs)
+
+# subroutine to get the selected chromosomes found in none of the inputs (e.g., --chrom 1 against inputs naming it chr1)
+def missing_selection_chromosomes(selection,paths):
+    found_chromosomes=set().union(*[input_chromosomes(path) for path in paths])
+    return [chrom for chrom in selection if chrom not in found_chromosomes]
+
+# subroutine to check a region selection against the inputs - quits if no selected chromosome is in any input, warns about the ones missing
+def check_selection_chromosomes(selection,paths):
+    missing_chromosomes=missing_selection_chromosomes(selection,paths)
+    if len(missing_chromosomes)==len(selection):
+        quit('ERROR: None of the selected chromosomes (' + ', '.join(missing_chromosomes) + ') are in the inputs - check chromosome names (e.g., chr1 vs. 1)!')
+    if len(missing_chromosomes)>0:
+        print("WARNING: selected chromosomes not in any input:",", ".join(missing_chromosomes))
+
+# subroutine to get the tabix (.tbi) or CSI (.csi) index of a bgzipped input - None if missing
+def tabix_index_path(path):
+    for suffix in ['.tbi','.csi']:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return None
+
+# subroutine to mark rows of a typed table overlapping the selection (start/end columns, 0-based half-open unless one_based)
+# tables without an end column (single-base records) span one base from start
+def table_region_mask(table_df,selection,one_based=False):
+    chrom_col='chrom' if 'chrom' in table_df.columns else 'chr'
+    starts=table_df['start'].to_numpy(np.int64)-(1 if one_based else 0)
+    ends=table_df['end'].to_numpy(np.int64)-(1 if one_based else 0) if 'end' in table_df.columns else starts+1
+    chrom_codes=table_df[chrom_col].cat.codes.to_numpy()
+    mask=np.zeros(len(table_df),dtype=bool)
+    for chrom_code, chrom in enumerate(table_df[chrom_col].cat.categories):
+        if chrom not in selection:
+            continue
+        rows=np.flatnonzero(chrom_codes==chrom_code)
+        region_starts, region_ends = selection[chrom]
+        # first region ending after each row start overlaps the row if it starts before the row ends
+        region_idx=np.searchsorted(region_ends,starts[rows],side='right')
+        overlaps=region_idx<len(region_ends)
+        overlaps[overlaps]=region_starts[region_idx[overlaps]]<ends[rows[overlaps]]
+        mask[rows]=overlaps
+    return mask
+
+# subroutine to keep the rows of a small, already loaded table (e.g., DMRs) overlapping the selection - unchanged if either is None
+def select_region_rows(table_df,selection,one_based=False):
+    if (table_df is None) or (selection is None):
+        return table_df
+    return table_df[table_region_mask(table_df,selection,one_based)].reset_index(drop=True)
+
+# subroutine to find the byte ranges of an uncompressed, coordinate-sorted input holding records that may overlap the selection
+# returns merged (start byte, end byte) ranges in file order (records starting up to REGION_LOOKBACK bases before a region are included)
+def region_byte_ranges(path,input_type,selection):
+    start_col=INPUT_SPECS[input_type]['names'].index('start')
+    offsets=build_chromosome_offsets(path)
+    byte_ranges=[]
+    with open(path,'rb') as f:
+        for chrom in sorted((chrom for chrom in selection if chrom in offsets),key=lambda chrom: offsets[chrom][0]):
+            chrom_start, chrom_end = offsets[chrom]
+            range_start=chrom_start
+            for region_start, region_end in zip(*selection[chrom]):
+                # region starts are sorted, so each search starts from the previous range
+                range_start=first_line_where(f,range_start,chrom_end,lambda fields: int(fields[start_col])>=region_start-REGION_LOOKBACK)
+                # records starting at the region end still overlap it in 1-based inputs
+                range_end=first_line_where(f,range_start,chrom_end,lambda fields: int(fields[start_col])>region_end)
+                if range_end<=range_start:
+                    continue
+                if (len(byte_ranges)>0) and (range_start<=byte_ranges[-1][1]):
+                    byte_ranges[-1]=(byte_ranges[-1][0],max(byte_ranges[-1][1],range_end))
+                else:
+                    byte_ranges.append((range_start,range_end))
+    return byte_ranges
+
+# subroutine to get the lines (without newlines) of a bgzipped, tabix/CSI indexed input overlapping the selection (pysam)
+# a record overlapping several regions is only returned once
+def iter_tabix_lines(path,selection):
+    import pysam
+    with pysam.TabixFile(path,index=tabix_index_path(path)) as tabix_file:
+        contigs=set(tabix_file.contigs)
+        for chrom, (region_starts, region_ends) in selection.items():
+            if chrom not in contigs:
+                continue
+            last_start=-1
+            for region_start, region_end in zip(region_starts,region_ends):
+                # records starting by the last start returned for earlier (sorted, merged) regions were already returned
+                returned_through=last_start
+                last_line=None
+                # one base either side for 1-based inputs - exact overlaps are filtered after parsing
+                fetch_end=None if region_end==WHOLE_CHROMOSOME_END else int(region_end)+1
+                for line in tabix_file.fetch(chrom,max(int(region_start)-1,0),fetch_end):
+                    if (returned_through>=0) and (int(line.split('\t',2)[1])<=returned_through):
+                        continue
+                    last_line=line
+                    yield line
+                if last_line is not None:
+                    last_start=int(last_line.split('\t',2)[1])
+
+# file object reading bytes from an iterator of text lines without newlines (e.g., tabix query results) for pd.read_csv
+class LineIteratorFile(io.RawIOBase):
+    def __init__(self,lines):
+        self.lines=lines
+        self.pending=b''
+    def readable(self):
+        return True
+    def readinto(self,buffer):
+        if len(self.pending)<len(buffer):
+            # encode lines in batches rather than one at a time
+            batch=[]
+            batch_size=len(self.pending)
+            for line in self.lines:
+                batch.append(line)
+                batch_size+=len(line)+1
+                if batch_size>=len(buffer):
+                    break
+            if len(batch)>0:
+                self.pending+=('\n'.join(batch)+'\n').encode()
+        size=min(len(buffer),len(self.pending))
+        buffer[:size]=self.pending[:size]
+        self.pending=self.pending[size:]
+        return size
+
+# subroutine to put a line back in front of the rest of a line iterator
+def chain_lines(first_line,lines):
+    yield first_line
+    yield from lines
+
+# subroutine to open the parts of an input that may overlap the selection for pd.read_csv
+# returns (file object, read arguments) - file object None if no records can overlap; rows still need table_region_mask
+def open_region_source(path,input_type,selection):
+    read_kwargs=typed_read_kwargs(path,input_type)
+    if detect_compression(path) is None:
+        byte_ranges=region_byte_ranges(path,input_type,selection)
+        if len(byte_ranges)==0:
+            return None, read_kwargs
+        return open_byte_ranges(path,byte_ranges), read_kwargs
+    lines=iter_tabix_lines(path,selection)
+    first_line=next(lines,None)
+    if first_line is None:
+        return None, read_kwargs
+    # tabix query results are already decompressed
+    read_kwargs['compression']=None
+    return io.BufferedReader(LineIteratorFile(chain_lines(first_line,lines)),buffer_size=1024*1024), read_kwargs
+
+# subroutine to read the rows of an input overlapping the selection with explicit dtypes, chunksize rows at a time if given
+def read_region_table(path,input_type,selection,chunksize=None):
+    spec=INPUT_SPECS[input_type]
+    source, read_kwargs = open_region_source(path,input_type,selection)
+    if source is None:
+        return empty_typed_table(input_type)
+    one_based=input_type in ONE_BASED_INPUT_TYPES
+    with source:
+        if chunksize is None:
+            table_df=pd.read_csv(source,**read_kwargs)
+            table_df=table_df[table_region_mask(table_df,selection,one_based)]
+        else:
+            with pd.read_csv(source,chunksize=chunksize,**read_kwargs) as reader:
+                table_df=concat_typed_chunks([chunk[table_region_mask(chunk,selection,one_based)] for chunk in reader])
+    return table_df[spec['usecols']].reset_index(drop=True)
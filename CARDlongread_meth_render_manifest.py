@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_render_manifest.py
+# memoized re-rendering: (output_prefix)_render_manifest.json records, per plot, a fingerprint of its input data slice,
+# plotting parameters, and plotting code together with the figure files it saved
+# plots whose fingerprint is unchanged and whose figures still exist are skipped, so rerunning after tweaking one cutoff
+# only redraws the figures that depend on it
+
+import pandas as pd
+import numpy as np
+import matplotlib
+import seaborn as sb
+import hashlib
+import json
+import pickle
+import tempfile
+import sys
+import os
+
+# bump when fingerprints change meaning so older manifests no longer match
+RENDER_MANIFEST_VERSION=2
+# directory of this repository's modules - edits to any loaded module here invalidate every fingerprint
+REPO_DIR=os.path.dirname(os.path.abspath(__file__))
+
+# subroutine to add render manifest arguments to a script's argument parser
+def add_render_manifest_arguments(parser):
+    # argument to render every plot
+    parser.add_argument("--rerender", required=False, action='store_true', help="Render every figure even if its inputs, parameters, and plotting code are unchanged since the last run with this --output_prefix (see (output_prefix)_render_manifest.json).")
+
+# subroutine to get the render manifest path for an output prefix
+def render_manifest_path(output_prefix):
+    return output_prefix + "_render_manifest.json"
+
+# subroutine to hash the source files of this repository's loaded modules (plot functions and the helpers they call)
+def code_fingerprint():
+    code_hash=hashlib.blake2b(digest_size=16)
+    module_paths=sorted({os.path.abspath(module.__file__) for module in list(sys.modules.values()) if getattr(module,'__file__',None) is not None})
+    for path in module_paths:
+        if (os.path.dirname(path)==REPO_DIR) and path.endswith('.py'):
+            code_hash.update(os.path.basename(path).encode())
+            with open(path,'rb') as f:
+                code_hash.update(f.read())
+    return code_hash.hexdigest()
+
+# subroutine to add a plot argument to a fingerprint - data frames and arrays by content, containers element by element, scalars by repr
+# frame_hashes caches data frame hashes by id, since several plots usually share one frame
+def update_fingerprint(fingerprint,value,frame_hashes):
+    if isinstance(value,(pd.DataFrame,pd.Series)):
+        if id(value) not in frame_hashes:
+            frame_hash=hashlib.blake2b(digest_size=16)
+            frame_df=value.to_frame() if isinstance(value,pd.Series) else value
+            # column order, dtypes, and category order all change how a frame is drawn
+            frame_hash.update(repr([(column,str(dtype),list(dtype.categories) if isinstance(dtype,pd.CategoricalDtype) else None) for column, dtype in frame_df.dtypes.items()]).encode())
+            try:
+                frame_hash.update(pd.util.hash_pandas_object(frame_df,index=False).to_numpy().tobytes())
+            except TypeError:
+                # unhashable cells (e.g., lists)
+                frame_hash.update(pickle.dumps(frame_df.reset_index(drop=True)))
+            frame_hashes[id(value)]=frame_hash.digest()
+        fingerprint.update(b'frame')
+        fingerprint.update(frame_hashes[id(value)])
+    elif isinstance(value,np.ndarray):
+        fingerprint.update(repr((value.dtype.str,value.shape)).encode())
+        fingerprint.update(np.ascontiguousarray(value).tobytes() if value.dtype!=object else pickle.dumps(value))
+    elif isinstance(value,dict):
+        fingerprint.update(b'dict' + str(len(value)).encode())
+        for key, item in value.items():
+            fingerprint.update(repr(key).encode())
+            update_fingerprint(fingerprint,item,frame_hashes)
+    elif isinstance(value,(list,tuple)):
+        fingerprint.update(type(value).__name__.encode() + str(len(value)).encode())
+        for item in value:
+            update_fingerprint(fingerprint,item,frame_hashes)
+    else:
+        fingerprint.update(repr(value).encode())
+    fingerprint.update(b'\t')
+
+# subroutine to fingerprint one plot task - plot function, arguments, figure output, plotting code, and plotting library versions
+def plot_fingerprint(plot_function,plot_args,plot_kwargs,code_hash,frame_hashes,figure_options=None):
+    fingerprint=hashlib.blake2b(digest_size=16)
+    fingerprint.update('\t'.join([str(RENDER_MANIFEST_VERSION),code_hash,matplotlib.__version__,sb.__version__,plot_function.__module__ + '.' + plot_function.__qualname__]).encode())
+    update_fingerprint(fingerprint,list(plot_args),frame_hashes)
+    update_fingerprint(fingerprint,dict(sorted(plot_kwargs.items())),frame_hashes)
+    update_fingerprint(fingerprint,figure_options,frame_hashes)
+    return fingerprint.hexdigest()
+
+# subroutine to read a render manifest - dict of plot label -> {'fingerprint', 'outputs'}; empty if missing or unreadable
+def read_render_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path) as f:
+            manifest=json.load(f)
+    except (OSError,ValueError) as error:
+        print("WARNING: ignoring unreadable render manifest",manifest_path,"-",error)
+        return {}
+    if manifest.get('version')!=RENDER_MANIFEST_VERSION:
+        return {}
+    return manifest['plots']
+
+# subroutine to write a render manifest atomically (temporary file renamed into place)
+def write_render_manifest(manifest_path,plots):
+    temp_fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(manifest_path)),suffix='.tmp')
+    try:
+        with os.fdopen(temp_fd,'w') as f:
+            json.dump({'version': RENDER_MANIFEST_VERSION, 'plots': plots},f,indent=2)
+        os.replace(temp_path,manifest_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+# subroutine to check whether a plot is up to date - same fingerprint as its manifest entry and every recorded figure still on disk
+def plot_up_to_date(manifest_entry,fingerprint):
+    if (manifest_entry is None) or (manifest_entry['fingerprint']!=fingerprint):
+        return False
+    return all(os.path.exists(path) for path in manifest_entry['outputs'])
@@ -0,0 +1,154 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_render_pool.py
+# render independent figures in parallel worker processes
+# data frames are written once to memory-mapped Arrow IPC files (pickle files if pyarrow is missing) and workers open them by path,
+# so each worker task only sends a file path instead of re-pickling full frames
+# with a render manifest (CARDlongread_meth_render_manifest.py), plots whose inputs and parameters are unchanged since the last run are skipped
+# figures are written in the requested format, or as plotted data only (CARDlongread_meth_figure_output.py)
+
+import pandas as pd
+import importlib.util
+import concurrent.futures
+import tempfile
+import traceback
+import shutil
+import os
+from CARDlongread_meth_instrument import measure_usage
+from CARDlongread_meth_render_manifest import code_fingerprint, plot_fingerprint, read_render_manifest, write_render_manifest, plot_up_to_date
+from CARDlongread_meth_figure_output import figure_output
+
+# placeholder passed to workers in place of a data frame
+class SharedFrame:
+    def __init__(self,path,file_format):
+        self.path=path
+        self.file_format=file_format
+
+# subroutine to write a data frame once for workers - Arrow IPC (feather v2, uncompressed so it can be memory-mapped) if available
+def export_frame(frame_df,path_prefix):
+    if importlib.util.find_spec('pyarrow') is not None:
+        path=path_prefix + ".arrow"
+        # feather needs a default index - frames filtered before plotting keep their original index
+        frame_df.reset_index(drop=True).to_feather(path,compression='uncompressed')
+        return SharedFrame(path,'arrow')
+    path=path_prefix + ".pkl"
+    frame_df.to_pickle(path)
+    return SharedFrame(path,'pickle')
+
+# subroutine to open a shared data frame in a worker
+def import_frame(shared_frame):
+    if shared_frame.file_format=='arrow':
+        import pyarrow.feather
+        return pyarrow.feather.read_table(shared_frame.path,memory_map=True).to_pandas()
+    return pd.read_pickle(shared_frame.path)
+
+# subroutine to set up each worker process - render without a display
+def init_render_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+# subroutine to run one plot task - returns (label, error traceback or None, usage record of the plot with the figure files it saved)
+# figure_options is a figure output dict (figure_output_options) or None for 300 dpi png figures
+def run_plot_task(label,plot_function,plot_args,plot_kwargs,figure_options=None):
+    import matplotlib.pyplot as plt
+    usage={'plot': label, 'pid': os.getpid(), 'outputs': []}
+    with measure_usage(usage):
+        try:
+            plot_args=[import_frame(arg) if isinstance(arg,SharedFrame) else arg for arg in plot_args]
+            plot_kwargs={key: import_frame(value) if isinstance(value,SharedFrame) else value for key, value in plot_kwargs.items()}
+            with figure_output(figure_options,usage['outputs']):
+                plot_function(*plot_args,**plot_kwargs)
+            error=None
+        except Exception:
+            error=traceback.format_exc()
+        finally:
+            # plot functions clear but do not close their figures
+            plt.close('all')
+    return label, error, usage
+
+# subroutine to make a plot task - label for error reports, plot function, and its arguments
+def plot_task(label,plot_function,*plot_args,**plot_kwargs):
+    return (label,plot_function,plot_args,plot_kwargs)
+
+# subroutine to run plot tasks with up to jobs worker processes (in this process if jobs is 1)
+# returns dict of failed plot label -> error traceback; each plot's usage record is added to plot_usage
+def run_plot_tasks(plot_tasks,jobs,plot_usage,figure_options=None):
+    errors={}
+    if jobs<=1 or len(plot_tasks)<=1:
+        for label, plot_function, plot_args, plot_kwargs in plot_tasks:
+            label, error, usage = run_plot_task(label,plot_function,plot_args,plot_kwargs,figure_options)
+            plot_usage.append(usage)
+            if error is not None:
+                errors[label]=error
+        return errors
+    shared_dir=tempfile.mkdtemp(prefix='CARDlongread_render_')
+    try:
+        # write every distinct data frame once, however many plots use it
+        shared_frames={}
+        def share(value):
+            if not isinstance(value,pd.DataFrame):
+                return value
+            if id(value) not in shared_frames:
+                shared_frames[id(value)]=export_frame(value,os.path.join(shared_dir,'frame_' + str(len(shared_frames))))
+            return shared_frames[id(value)]
+        shared_tasks=[]
+        for label, plot_function, plot_args, plot_kwargs in plot_tasks:
+            shared_tasks.append((label,plot_function,[share(arg) for arg in plot_args],{key: share(value) for key, value in plot_kwargs.items()}))
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs,len(shared_tasks)),initializer=init_render_worker) as executor:
+            futures=[executor.submit(run_plot_task,*task,figure_options) for task in shared_tasks]
+            for future, task in zip(futures,shared_tasks):
+                try:
+                    label, error, usage = future.result()
+                    plot_usage.append(usage)
+                except Exception:
+                    # worker died or the task could not be sent
+                    label, error = task[0], traceback.format_exc()
+                if error is not None:
+                    errors[label]=error
+    finally:
+        shutil.rmtree(shared_dir,ignore_errors=True)
+    return errors
+
+# subroutine to render plot tasks with up to jobs worker processes (in this process if jobs is 1)
+# returns dict of failed plot label -> error traceback; a failing plot does not stop the others
+# plot_usage (e.g., a run report's plots list, CARDlongread_meth_instrument.py) gets each plot's time and memory record
+# with manifest_path, plots with the same fingerprint as in the manifest and all their figures on disk are skipped (unless rerender)
+# and the manifest is updated with the fingerprints and figure files of the plots rendered
+# figure_options (figure_output_options) sets the figure format and resolution or data only output; None saves 300 dpi png figures
+def render_plots(plot_tasks,jobs=1,plot_usage=None,manifest_path=None,rerender=False,figure_options=None):
+    if plot_usage is None:
+        plot_usage=[]
+    if manifest_path is None:
+        return run_plot_tasks(plot_tasks,jobs,plot_usage,figure_options)
+    manifest=read_render_manifest(manifest_path)
+    code_hash=code_fingerprint()
+    frame_hashes={}
+    fingerprints={label: plot_fingerprint(plot_function,plot_args,plot_kwargs,code_hash,frame_hashes,figure_options) for label, plot_function, plot_args, plot_kwargs in plot_tasks}
+    stale_tasks=[task for task in plot_tasks if rerender or (not plot_up_to_date(manifest.get(task[0]),fingerprints[task[0]]))]
+    stale_labels={task[0] for task in stale_tasks}
+    skipped_labels=[label for label, _, _, _ in plot_tasks if label not in stale_labels]
+    if len(skipped_labels)>0:
+        print("Skipping",len(skipped_labels),"of",len(plot_tasks),"plots with unchanged inputs and parameters (--rerender to draw them again).")
+    for label in skipped_labels:
+        plot_usage.append({'plot': label, 'skipped': True, 'outputs': manifest[label]['outputs']})
+    rendered_usage=[]
+    errors=run_plot_tasks(stale_tasks,jobs,rendered_usage,figure_options)
+    plot_usage.extend(rendered_usage)
+    for usage in rendered_usage:
+        if usage['plot'] not in errors:
+            manifest[usage['plot']]={'fingerprint': fingerprints[usage['plot']], 'outputs': usage['outputs']}
+    # failed plots are drawn again next run
+    for label in errors:
+        manifest.pop(label,None)
+    try:
+        write_render_manifest(manifest_path,manifest)
+    except OSError as error:
+        print("Could not write render manifest:",error)
+    return errors
+
+# subroutine to print errors from render_plots and stop if any plot failed
+def report_render_errors(errors):
+    for label, error in errors.items():
+        print("ERROR: plot",label,"failed:\n" + error)
+    if len(errors)>0:
+        quit('ERROR: ' + str(len(errors)) + ' plot(s) failed!')
@@ -0,0 +1,215 @@
+#!/usr/bin/python
+
+# CARDlongread_meth_stats.py
+# precomputed summaries (binned counts) of large entropy/DMR tables so plots draw a fixed number of bins instead of every row
+# fixed-bin histograms and FFT binned KDEs are accumulated per region type and can be merged across chunks/chromosomes
+
+import pandas as pd
+import numpy as np
+
+# subroutine to get hue levels in the order seaborn uses - categories if categorical, otherwise order of appearance
+def hue_levels(hue_values):
+    if isinstance(hue_values.dtype,pd.CategoricalDtype):
+        return list(hue_values.cat.categories)
+    return list(pd.unique(hue_values.dropna()))
+
+# subroutine to get a finite (low, high) range of values, padded if all values are equal
+def finite_range(values):
+    values=np.asarray(values,dtype=np.float64)
+    values=values[np.isfinite(values)]
+    if len(values)==0:
+        return (0.0,1.0)
+    low=float(values.min())
+    high=float(values.max())
+    if low==high:
+        return (low-0.5,high+0.5)
+    return (low,high)
+
+# subroutine to count points per hue on a regular 2D grid in one pass (np.bincount over combined hue/x/y bin index)
+# returns counts with shape (number of hues, x bins, y bins); points outside x_range/y_range or with missing values are dropped
+def bin_points_by_hue(x_values,y_values,hue_codes,num_hues,x_range,y_range,bins):
+    x_values=np.asarray(x_values,dtype=np.float64)
+    y_values=np.asarray(y_values,dtype=np.float64)
+    hue_codes=np.asarray(hue_codes)
+    # scale to bin positions - the upper range edge falls into the last bin like np.histogram2d
+    x_bins=np.floor((x_values-x_range[0])*(bins/(x_range[1]-x_range[0])))
+    y_bins=np.floor((y_values-y_range[0])*(bins/(y_range[1]-y_range[0])))
+    x_bins[x_values==x_range[1]]=bins-1
+    y_bins[y_values==y_range[1]]=bins-1
+    keep=(x_bins>=0) & (x_bins<bins) & (y_bins>=0) & (y_bins<bins) & (hue_codes>=0)
+    combined_bins=(hue_codes[keep].astype(np.int64)*bins+x_bins[keep].astype(np.int64))*bins+y_bins[keep].astype(np.int64)
+    return np.bincount(combined_bins,minlength=num_hues*bins*bins).reshape(num_hues,bins,bins)
+
+# subroutine to get 1D bin positions of values on a regular grid (upper range edge in the last bin, like np.histogram)
+# values outside the range or not finite get -1
+def regular_bin_positions(values,value_range,bins):
+    values=np.asarray(values,dtype=np.float64)
+    positions=np.floor((values-value_range[0])*(bins/(value_range[1]-value_range[0])))
+    positions[values==value_range[1]]=bins-1
+    positions[~((positions>=0) & (positions<bins))]=-1
+    return positions.astype(np.int64)
+
+# subroutine to start a histogram/KDE accumulator for values split by hue (e.g., entropy per region type)
+# fixed bins and a fixed KDE grid over value_range make accumulators from separate chunks/chromosomes mergeable by addition
+def init_histogram_accumulator(levels,value_range,bins=50,kde_gridsize=256):
+    num_hues=len(levels)
+    return {
+        'levels': list(levels),
+        'value_range': (float(value_range[0]),float(value_range[1])),
+        'bins': bins,
+        'kde_gridsize': kde_gridsize,
+        # fixed-bin histogram counts per hue
+        'counts': np.zeros((num_hues,bins),dtype=np.int64),
+        # linearly binned counts on the KDE grid per hue
+        'kde_grid_counts': np.zeros((num_hues,kde_gridsize)),
+        # moments per hue for the KDE bandwidth (Scott's rule)
+        'n': np.zeros(num_hues),
+        'sum': np.zeros(num_hues),
+        'sum_squares': np.zeros(num_hues)
+    }
+
+# subroutine to add values with integer hue codes to a histogram accumulator (np.bincount over combined hue/bin positions)
+def update_histogram_accumulator(accumulator,values,hue_codes):
+    values=np.asarray(values,dtype=np.float64)
+    hue_codes=np.asarray(hue_codes).astype(np.int64)
+    low, high = accumulator['value_range']
+    num_hues=len(accumulator['levels'])
+    bins=accumulator['bins']
+    gridsize=accumulator['kde_gridsize']
+    keep=np.isfinite(values) & (values>=low) & (values<=high) & (hue_codes>=0)
+    values=values[keep]
+    hue_codes=hue_codes[keep]
+    # fixed-bin histogram
+    positions=regular_bin_positions(values,(low,high),bins)
+    accumulator['counts']+=np.bincount(hue_codes*bins+positions,minlength=num_hues*bins).reshape(num_hues,bins)
+    # linear binning onto the KDE grid - each value split between its two neighbouring grid points
+    grid_positions=(values-low)*((gridsize-1)/(high-low))
+    left_points=np.minimum(np.floor(grid_positions).astype(np.int64),gridsize-2)
+    right_weights=grid_positions-left_points
+    accumulator['kde_grid_counts']+=np.bincount(hue_codes*gridsize+left_points,weights=1-right_weights,minlength=num_hues*gridsize).reshape(num_hues,gridsize)
+    accumulator['kde_grid_counts']+=np.bincount(hue_codes*gridsize+left_points+1,weights=right_weights,minlength=num_hues*gridsize).reshape(num_hues,gridsize)
+    # moments
+    accumulator['n']+=np.bincount(hue_codes,minlength=num_hues)
+    accumulator['sum']+=np.bincount(hue_codes,weights=values,minlength=num_hues)
+    accumulator['sum_squares']+=np.bincount(hue_codes,weights=values*values,minlength=num_hues)
+    return accumulator
+
+# subroutine to merge histogram accumulators with the same levels, range, and bins (e.g., from separate chromosomes)
+def merge_histogram_accumulators(accumulators):
+    merged=dict(accumulators[0])
+    for key in ['counts','kde_grid_counts','n','sum','sum_squares']:
+        merged[key]=sum(accumulator[key] for accumulator in accumulators)
+    return merged
+
+# subroutine to get the Gaussian KDE bandwidth by Scott's rule (as scipy/seaborn) from count, sum, and sum of squares
+def scott_bandwidth(n,total,sum_squares):
+    if n<2:
+        return 0.0
+    variance=(sum_squares-total*total/n)/(n-1)
+    return float(np.sqrt(max(variance,0.0))*n**(-1/5))
+
+# subroutine for a binned Gaussian KDE - convolve linearly binned grid counts with the kernel by FFT
+# returns density per grid point (integrates to ~1 over the grid)
+def fft_kde(grid_counts,grid_spacing,bandwidth):
+    n=grid_counts.sum()
+    gridsize=len(grid_counts)
+    if n==0 or bandwidth<=0:
+        return np.full(gridsize,np.nan)
+    # kernel sampled at grid offsets, truncated at 4 bandwidths or the grid width
+    half_width=int(min(np.ceil(4*bandwidth/grid_spacing),gridsize-1))
+    offsets=np.arange(-half_width,half_width+1)*grid_spacing
+    kernel=np.exp(-0.5*(offsets/bandwidth)**2)/(bandwidth*np.sqrt(2*np.pi))
+    # zero pad to avoid circular wrap-around
+    fft_size=int(2**np.ceil(np.log2(gridsize+len(kernel))))
+    convolved=np.fft.irfft(np.fft.rfft(grid_counts,fft_size)*np.fft.rfft(kernel,fft_size),fft_size)
+    return np.maximum(convolved[half_width:half_width+gridsize],0)/n
+
+# subroutine to turn a histogram accumulator into a long-format summary table for plotting
+# histogram rows: bin edges, counts, and proportions per hue; kde rows: grid point, density, and density scaled to proportion per bin
+HISTOGRAM_SUMMARY_COLUMNS=['Region type','statistic','x','x_end','count','proportion','density']
+def histogram_accumulator_summary(accumulator):
+    low, high = accumulator['value_range']
+    bins=accumulator['bins']
+    gridsize=accumulator['kde_gridsize']
+    bin_edges=np.linspace(low,high,bins+1)
+    bin_width=(high-low)/bins
+    grid=np.linspace(low,high,gridsize)
+    summary_df_list=[]
+    for hue_idx, level in enumerate(accumulator['levels']):
+        counts=accumulator['counts'][hue_idx]
+        n=counts.sum()
+        # levels without values (e.g., a region type with no rows) are left out like seaborn leaves out absent hues
+        if n==0:
+            continue
+        summary_df_list.append(pd.DataFrame({
+            'Region type': level,
+            'statistic': 'histogram',
+            'x': bin_edges[:-1],
+            'x_end': bin_edges[1:],
+            'count': counts,
+            'proportion': counts/n,
+            'density': counts/(n*bin_width)
+        }))
+        bandwidth=scott_bandwidth(accumulator['n'][hue_idx],accumulator['sum'][hue_idx],accumulator['sum_squares'][hue_idx])
+        density=fft_kde(accumulator['kde_grid_counts'][hue_idx],grid[1]-grid[0],bandwidth)
+        summary_df_list.append(pd.DataFrame({
+            'Region type': level,
+            'statistic': 'kde',
+            'x': grid,
+            'x_end': np.nan,
+            'count': np.nan,
+            # proportion per histogram bin implied by the density, as seaborn scales KDEs for stat="proportion"
+            'proportion': density*bin_width,
+            'density': density
+        }))
+    if len(summary_df_list)==0:
+        return pd.DataFrame(columns=HISTOGRAM_SUMMARY_COLUMNS)
+    return pd.concat(summary_df_list,ignore_index=True)[HISTOGRAM_SUMMARY_COLUMNS]
+
+# subroutine to summarize values per hue into fixed-bin histograms and binned KDEs in one call
+def histogram_summary(values,hue_values,bins=50,value_range=None,kde_gridsize=256):
+    levels=hue_levels(hue_values)
+    if value_range is None:
+        value_range=finite_range(values)
+    accumulator=init_histogram_accumulator(levels,value_range,bins,kde_gridsize)
+    update_histogram_accumulator(accumulator,values,hue_codes_for_levels(hue_values,levels))
+    return histogram_accumulator_summary(accumulator)
+
+# subroutine to get a histogram/KDE summary table from either a data frame (value and hue columns) or a filled histogram accumulator
+def summarize_histogram(data,value_col,hue_col,bins=50,value_range=None):
+    if isinstance(data,dict):
+        return histogram_accumulator_summary(data)
+    return histogram_summary(data[value_col],data[hue_col],bins,value_range)
+
+# subroutine to start a 2D density accumulator of binned x/y counts per hue with fixed ranges (mergeable by addition like histograms)
+def init_density_accumulator(levels,x_range,y_range,bins=300):
+    return {
+        'levels': list(levels),
+        'x_range': (float(x_range[0]),float(x_range[1])),
+        'y_range': (float(y_range[0]),float(y_range[1])),
+        'bins': bins,
+        'counts': np.zeros((len(levels),bins,bins),dtype=np.int64)
+    }
+
+# subroutine to add x/y values with integer hue codes to a 2D density accumulator
+def update_density_accumulator(accumulator,x_values,y_values,hue_codes):
+    accumulator['counts']+=bin_points_by_hue(x_values,y_values,hue_codes,len(accumulator['levels']),accumulator['x_range'],accumulator['y_range'],accumulator['bins'])
+    return accumulator
+
+# subroutine to merge 2D density accumulators with the same levels, ranges, and bins (e.g., from separate chromosomes)
+def merge_density_accumulators(accumulators):
+    merged=dict(accumulators[0])
+    merged['counts']=sum(accumulator['counts'] for accumulator in accumulators)
+    return merged
+
+# subroutine to get integer codes of hue values against fixed accumulator levels (-1 for values not in levels)
+def hue_codes_for_levels(hue_values,levels):
+    return pd.Categorical(hue_values,categories=levels).codes
+
+# subroutine to write a histogram/KDE summary table to a small TSV so figures can be redrawn without the raw inputs
+def write_histogram_summary(summary_df,path):
+    summary_df.to_csv(path,sep='\t',index=False)
+
+# subroutine to read a histogram/KDE summary TSV written by write_histogram_summary
+def read_histogram_summary(path):
+    return pd.read_csv(path,sep='\t',dtype={'Region type': 'string', 'statistic': 'string'})
@@ -1,39 +1,70 @@
 #!/usr/bin/python 
 
 # CARDlongread_methylation_entropy_pairwise_comparison.py
-# script to compare methylation entropies between two samples and further analyze relationships with respect to methylation differences and supporting coverage
+# script to compare methylation entropies between two or more samples and further analyze relationships with respect to methylation differences and supporting coverage
 # uses modkit entropy, modkit dmr, and DSS/bsseq DMR tab-delimited outputs as input for analysis and visualization
 
 import argparse
 import pandas as pd
 # import polars as pl
 import numpy as np
-import seaborn as sb
 import matplotlib.pyplot as plt
 import time
-import psutil
 import os
-import re
+import importlib.util
+import itertools
+from CARDlongread_meth_intervals import interval_key_merge, interval_keys, key_match_pairs, summarize_windows_over_regions
+from CARDlongread_meth_plotting import SCATTER_MODES, BINNED_SCATTER_MODES, draw_scatter, plot_histogram_summary
+from CARDlongread_meth_stats import summarize_histogram, write_histogram_summary, init_histogram_accumulator, update_histogram_accumulator, merge_histogram_accumulators, init_density_accumulator, update_density_accumulator, merge_density_accumulators
+from CARDlongread_meth_cache import add_cache_arguments, cache_settings, cached_load
+from CARDlongread_meth_render_pool import plot_task, render_plots, report_render_errors
+from CARDlongread_meth_render_manifest import add_render_manifest_arguments, render_manifest_path
+from CARDlongread_meth_figure_output import add_figure_output_arguments, figure_output_options, save_figure
+from CARDlongread_meth_io import load_bulk_entropy, load_region_entropy, load_modkit_dmr_segments, load_dss_dmrs, harmonize_chrom_categories, report_load_usage, iter_matched_chromosome_tables, empty_typed_table, concat_typed_chunks, report_stream_usage, detect_compression, build_chromosome_offsets, matched_chromosome_order
+from CARDlongread_meth_regions import add_region_arguments, region_selection, chromosome_selection, unindexed_region_inputs, check_selection_chromosomes, read_region_table, select_region_rows
+from CARDlongread_meth_parallel import add_parallel_arguments, parallel_workers, iter_chromosome_jobs
+from CARDlongread_meth_instrument import add_instrument_arguments, init_run_report, measure_stage
+
+# region types compared in every plot (labeled "(sample name) (region type)" per sample)
+REGION_TYPES=['genomic windows','modkit DMR segments','DSS unsmoothed DMRs','DSS smoothed DMRs']
+# region types of pairwise scatterplots (labeled without sample names)
+PAIRWISE_REGION_TYPES=['Genomic windows']+REGION_TYPES[1:]
+# DMR sets in REGION_TYPES order (argument name parts) with their DMR length and methylation change columns
+DMR_SETS=['modkit','dss_unsmoothed','dss_smoothed']
+DMR_SET_COLUMNS=[('N-sites','effect_size'),('length','diff.Methy'),('length','diff.Methy')]
+# columns of the long entropy table (bulk windows and per DMR entropies) and the long DMR table (per DMR entropies with DMR lengths and methylation changes)
+ENTROPY_TABLE_COLUMNS=['chrom','start','end','mean_entropy','mean_num_reads']
+DMR_TABLE_COLUMNS=['chrom','start','end','mean_entropy','DMR length','effect_size']
+# modkit entropy is normalized to [0, 1] - fixed entropy axes keep binned plots identical between in-memory and streaming modes
+ENTROPY_RANGE=(0.0,1.0)
+# default rows per parsed chunk in streaming mode
+STREAMING_CHUNKSIZE=1000000
 
 # subroutine to parse command line arguments
 def parse_args():
-    parser = argparse.ArgumentParser(description="Compare methylation entropies between two ONT sequenced samples and further analyze relationships with respect to methylation differences and supporting coverage.")
-    # arguments for sample names
-    parser.add_argument("--sample_name_1", required=True, help="Name of first sample.")
-    parser.add_argument("--sample_name_2", required=True, help="Name of second sample.")
-    # argument for entropy inputs
+    parser = argparse.ArgumentParser(description="Compare methylation entropies between two or more ONT sequenced samples and further analyze relationships with respect to methylation differences and supporting coverage.")
+    # arguments for sample names and entropy inputs of any number of samples
+    parser.add_argument("--sample_names", required=False, nargs="+", help="Names of two or more samples (instead of --sample_name_1 and --sample_name_2).")
+    parser.add_argument("--bulk_entropy", required=False, nargs="+", help="Default ONT entropy input per sample (e.g., 50 bp windows), in --sample_names order.")
+    parser.add_argument("--modkit_dmr_entropy", required=False, nargs="+", help="Modkit DMR ONT entropy input per sample (entropy per DMR), in --sample_names order ('none' for a sample without one). If omitted (or 'none'), summarized from bulk entropy windows overlapping each DMR.")
+    parser.add_argument("--dss_unsmoothed_dmr_entropy", required=False, nargs="+", help="Unsmoothed DSS/bsseq DMR ONT entropy input per sample (entropy per DMR), in --sample_names order ('none' for a sample without one). If omitted (or 'none'), summarized from bulk entropy windows overlapping each DMR.")
+    parser.add_argument("--dss_smoothed_dmr_entropy", required=False, nargs="+", help="Smoothed DSS/bsseq DMR ONT entropy input per sample (entropy per DMR), in --sample_names order ('none' for a sample without one). If omitted (or 'none'), summarized from bulk entropy windows overlapping each DMR.")
+    # arguments for sample names (two samples)
+    parser.add_argument("--sample_name_1", required=False, help="Name of first sample.")
+    parser.add_argument("--sample_name_2", required=False, help="Name of second sample.")
+    # argument for entropy inputs (two samples)
     # overall entropy
-    parser.add_argument("--sample_1_bulk_entropy", required=True, help="Default ONT entropy input for sample 1 (e.g., 50 bp windows).")
-    parser.add_argument("--sample_2_bulk_entropy", required=True, help="Default ONT entropy input for sample 2 (e.g., 50 bp windows).")
+    parser.add_argument("--sample_1_bulk_entropy", required=False, help="Default ONT entropy input for sample 1 (e.g., 50 bp windows).")
+    parser.add_argument("--sample_2_bulk_entropy", required=False, help="Default ONT entropy input for sample 2 (e.g., 50 bp windows).")
     # modkit dmr entropy 
-    parser.add_argument("--sample_1_modkit_dmr_entropy", required=True, help="Modkit DMR ONT entropy input for sample 1 (entropy per DMR).")
-    parser.add_argument("--sample_2_modkit_dmr_entropy", required=True, help="Modkit DMR ONT entropy input for sample 2 (entropy per DMR).")
+    parser.add_argument("--sample_1_modkit_dmr_entropy", required=False, help="Modkit DMR ONT entropy input for sample 1 (entropy per DMR). If omitted, summarized from bulk entropy windows overlapping each DMR.")
+    parser.add_argument("--sample_2_modkit_dmr_entropy", required=False, help="Modkit DMR ONT entropy input for sample 2 (entropy per DMR). If omitted, summarized from bulk entropy windows overlapping each DMR.")
     # DSS/bsseq unsmoothed dmr entropy
-    parser.add_argument("--sample_1_dss_unsmoothed_dmr_entropy", required=True, help="Unsmoothed DSS/bsseq DMR ONT entropy input for sample 1 (entropy per DMR).")
-    parser.add_argument("--sample_2_dss_unsmoothed_dmr_entropy", required=True, help="Unsmoothed DSS/bsseq DMR ONT entropy input for sample 2 (entropy per DMR).")
+    parser.add_argument("--sample_1_dss_unsmoothed_dmr_entropy", required=False, help="Unsmoothed DSS/bsseq DMR ONT entropy input for sample 1 (entropy per DMR). If omitted, summarized from bulk entropy windows overlapping each DMR.")
+    parser.add_argument("--sample_2_dss_unsmoothed_dmr_entropy", required=False, help="Unsmoothed DSS/bsseq DMR ONT entropy input for sample 2 (entropy per DMR). If omitted, summarized from bulk entropy windows overlapping each DMR.")
     # DSS/bsseq smoothed dmr entropy
-    parser.add_argument("--sample_1_dss_smoothed_dmr_entropy", required=True, help="Smoothed DSS/bsseq DMR ONT entropy input for sample 1 (entropy per DMR).")
-    parser.add_argument("--sample_2_dss_smoothed_dmr_entropy", required=True, help="Smoothed DSS/bsseq DMR ONT entropy input for sample 2 (entropy per DMR).")
+    parser.add_argument("--sample_1_dss_smoothed_dmr_entropy", required=False, help="Smoothed DSS/bsseq DMR ONT entropy input for sample 1 (entropy per DMR). If omitted, summarized from bulk entropy windows overlapping each DMR.")
+    parser.add_argument("--sample_2_dss_smoothed_dmr_entropy", required=False, help="Smoothed DSS/bsseq DMR ONT entropy input for sample 2 (entropy per DMR). If omitted, summarized from bulk entropy windows overlapping each DMR.")
     # modkit dmrs
     parser.add_argument("--modkit_dmr_segments", required=True, help="Modkit DMR segments for sample 1 vs. sample 2 (modkit dmr pair output).")
     # DSS/bsseq unsmoothed dmrs
@@ -45,303 +76,572 @@ def parse_args():
     # argument for plot title
     parser.add_argument("--plot_title", required=False, default="ONT pairwise entropy comparison", help="Title for each output plot.")
     # argument for read count cutoff
-    parser.add_argument("--read_count_cutoff", required=False, default=500, help="Read count cutoff for read count vs. methylation entropy plot (default 500 reads or less)")
+    parser.add_argument("--read_count_cutoff", required=False, type=int, default=500, help="Read count cutoff for read count vs. methylation entropy plot (default 500 reads or less)")
     # argument for DMR length cutoff
     parser.add_argument("--dmr_length_cutoff", required=False, type=int, default=None, help="DMR length cutoff in base pairs (bp) for all plots showing DMRs (recommended 2000 bp or shorter).")
-    # return parsed arguments
-    return parser.parse_args()
+    # argument for scatterplot rendering mode
+    parser.add_argument("--scatter_mode", choices=SCATTER_MODES, default="points", required=False, help="Scatterplot rendering mode: every point (points, default) or densities binned per region type (hexbin, hist2d, datashade) for millions of points.")
+    # argument for number of bins per axis in density scatterplot modes
+    parser.add_argument("--scatter_bins", required=False, type=int, default=300, help="Number of bins per axis for hexbin/hist2d/datashade scatterplot modes (default 300).")
+    # argument for number of histogram bins
+    parser.add_argument("--hist_bins", required=False, type=int, default=50, help="Number of fixed-width bins for entropy, DMR length, and DMR change histograms (default 50).")
+    # argument for number of parallel plot rendering processes
+    parser.add_argument("--jobs", required=False, type=int, default=1, help="Number of worker processes rendering figures in parallel (default 1).")
+    # argument to redraw figures with unchanged inputs and parameters
+    add_render_manifest_arguments(parser)
+    # arguments for figure format, resolution, and data only output
+    add_figure_output_arguments(parser)
+    # argument for csv parsing engine
+    parser.add_argument("--csv_engine", choices=["c", "pyarrow"], default="c", required=False, help="Parser engine for entropy and DMR inputs (pyarrow is faster on multiple cores if installed; default c).")
+    # argument for chunked parsing
+    parser.add_argument("--chunksize", required=False, type=int, default=None, help="Number of rows per chunk when parsing inputs with the c engine (bounds parser memory on genome-wide inputs).")
+    # arguments for persistent cache of parsed inputs
+    add_cache_arguments(parser)
+    # argument for streaming mode
+    parser.add_argument("--streaming", required=False, action="store_true", help="Read both coordinate-sorted bulk entropy inputs in lockstep one chromosome at a time, accumulating histograms and binned scatterplot densities instead of holding genome-wide tables (requires --scatter_mode hist2d or datashade; uses the c parser with --chunksize rows per chunk, default 1000000).")
+    # arguments for chromosome-parallel streaming
+    add_parallel_arguments(parser)
+    # arguments for restricting the comparison to chromosomes or regions
+    add_region_arguments(parser)
+    # argument for per stage cProfile dumps (timing and memory are always written to the run report)
+    add_instrument_arguments(parser)
+    # return parsed arguments with per sample inputs collected into lists
+    return resolve_sample_arguments(parser.parse_args())
+
+# subroutine to collect sample names and inputs into per sample lists from --sample_names, --bulk_entropy, etc. or the two sample arguments
+# sets args.sample_names, args.bulk_entropy, and args.(DMR set)_dmr_entropy (None for samples whose per DMR entropies are summarized from bulk windows)
+def resolve_sample_arguments(args):
+    two_sample_arguments=[args.sample_name_1,args.sample_name_2,args.sample_1_bulk_entropy,args.sample_2_bulk_entropy]+[getattr(args,'sample_' + str(idx) + '_' + dmr_set + '_dmr_entropy') for dmr_set in DMR_SETS for idx in [1,2]]
+    if args.sample_names is None:
+        if (args.bulk_entropy is not None) or any(getattr(args,dmr_set + '_dmr_entropy') is not None for dmr_set in DMR_SETS):
+            quit('ERROR: --bulk_entropy and per DMR entropy lists need --sample_names!')
+        if any(value is None for value in two_sample_arguments[:4]):
+            quit('ERROR: Give --sample_names and --bulk_entropy, or --sample_name_1, --sample_name_2, --sample_1_bulk_entropy, and --sample_2_bulk_entropy!')
+        args.sample_names=[args.sample_name_1,args.sample_name_2]
+        args.bulk_entropy=[args.sample_1_bulk_entropy,args.sample_2_bulk_entropy]
+        for dmr_set in DMR_SETS:
+            setattr(args,dmr_set + '_dmr_entropy',[getattr(args,'sample_' + str(idx) + '_' + dmr_set + '_dmr_entropy') for idx in [1,2]])
+        return args
+    if any(value is not None for value in two_sample_arguments):
+        quit('ERROR: --sample_names cannot be combined with --sample_name_1/--sample_name_2 or --sample_1_*/--sample_2_* inputs!')
+    if len(args.sample_names)<2:
+        quit('ERROR: --sample_names needs at least two samples!')
+    if len(set(args.sample_names))<len(args.sample_names):
+        quit('ERROR: --sample_names must be unique (they name output files)!')
+    if (args.bulk_entropy is None) or (len(args.bulk_entropy)!=len(args.sample_names)):
+        quit('ERROR: --bulk_entropy needs one input per sample in --sample_names!')
+    for dmr_set in DMR_SETS:
+        dmr_entropy_paths=getattr(args,dmr_set + '_dmr_entropy')
+        if dmr_entropy_paths is None:
+            setattr(args,dmr_set + '_dmr_entropy',[None]*len(args.sample_names))
+        elif len(dmr_entropy_paths)!=len(args.sample_names):
+            quit('ERROR: --' + dmr_set + '_dmr_entropy needs one input per sample in --sample_names!')
+        else:
+            # "none" leaves a sample's per DMR entropies to be summarized from its bulk windows
+            setattr(args,dmr_set + '_dmr_entropy',[None if path.lower()=='none' else path for path in dmr_entropy_paths])
+    return args
+
+# subroutine to get every sample pair compared in pairwise scatterplots (all pairs, in --sample_names order)
+def sample_pairs(sample_names):
+    return list(itertools.combinations(sample_names,2))
+
+# subroutine to get one sample's rows of a long entropy or DMR table for plotting, region types labeled "(sample name) (region type)" in a name column
+# streaming mode accumulators already hold one sample and are returned as they are
+def sample_plot_rows(table_data,sample_name):
+    if not isinstance(table_data,pd.DataFrame):
+        return table_data
+    keep=(table_data['sample']==sample_name).to_numpy()
+    sample_columns={column: piece_values(table_data[column],keep) for column in table_data.columns if column not in ['sample','region_type']}
+    # region types without rows stay out of legends
+    region_types=piece_values(table_data['region_type'],keep).remove_unused_categories()
+    sample_columns['name']=region_types.rename_categories([sample_name + " " + region_type for region_type in region_types.categories])
+    return pd.DataFrame(sample_columns,copy=False)
 
 # subroutine to make per sample entropy distribution comparison histograms
 # include bulk, modkit dmr pair, unsmoothed DSS DMR, and smoothed DSS DMR on one plot
-def per_sample_entropy_distribution_histogram(per_sample_entropy_df,sample_name,plot_title,output_prefix):
-    # rename "name" column to "Region type"
-    per_sample_entropy_df=per_sample_entropy_df.rename(columns={'name': 'Region type'})
-    # initialize figure
-    fig, ax = plt.subplots()
-    # plot per sample entropy distribution histogram with dodge set to true (side by side bars per data type)
-    ax = sb.histplot(data=per_sample_entropy_df,x="mean_entropy",hue="Region type",multiple="dodge",stat="proportion",common_norm=False,kde=True)
-    # label x-axis
-    ax.set(xlabel="Methylation entropy per region")
-    # label y-axis
-    ax.set(ylabel="Proportion of regions")
-    # set high y-limit to 1
-    ax.set_ylim(bottom=0,top=1.1)
-    # label legend
-    # plt.legend(title="Region type")
-    # add title
-    ax.set_title(plot_title)
-    # save figure - file name is (output_prefix)_(sample_name)_per_sample_entropy_distribution_histogram.png
-    fig.savefig(output_prefix + "_" + sample_name + "_per_sample_entropy_distribution_histogram.png", format='png', dpi=300, bbox_inches='tight')
-    # close figure
-    fig.clf()
+# entropy_data is the long entropy table (narrowed to this sample) or this sample's histogram accumulator filled in streaming mode
+def per_sample_entropy_distribution_histogram(entropy_data,sample_name,plot_title,output_prefix,hist_bins=50):
+    per_sample_entropy_df=sample_plot_rows(entropy_data,sample_name)
+    # summarize mean_entropy per region type ("name" column, labeled "Region type") into fixed-bin histograms and binned KDEs - the plot is drawn from this summary only
+    mean_entropy_summary_df=summarize_histogram(per_sample_entropy_df,'mean_entropy','name',hist_bins,ENTROPY_RANGE)
+    # save summary next to the figure - file name is (output_prefix)_(sample_name)_per_sample_entropy_distribution_histogram.tsv
+    write_histogram_summary(mean_entropy_summary_df,output_prefix + "_" + sample_name + "_per_sample_entropy_distribution_histogram.tsv")
+    # plot side by side bars per region type with KDE lines - file name is (output_prefix)_(sample_name)_per_sample_entropy_distribution_histogram.png
+    plot_histogram_summary(mean_entropy_summary_df,"Methylation entropy per region","Proportion of regions",plot_title,output_prefix + "_" + sample_name + "_per_sample_entropy_distribution_histogram.png")
     
 # subroutine to plot sample 1 vs. sample 2 pairwise entropy on scatterplot
 # include bulk, modkit dmr pair, unsmoothed DSS DMR, and smoothed DSS DMR on one plot
-def pairwise_entropy_scatterplot(both_samples_entropy_df,sample_name_1,sample_name_2,plot_title,output_prefix):
+# entropy_data is the long entropy table (joined on regions common to both samples) or this pair's density accumulator filled in streaming mode
+def pairwise_entropy_scatterplot(entropy_data,sample_name_1,sample_name_2,plot_title,output_prefix,scatter_mode='points',scatter_bins=300):
+    both_samples_entropy_df=pair_entropies(entropy_data,sample_name_1,sample_name_2) if isinstance(entropy_data,pd.DataFrame) else entropy_data
     # initialize figure
     fig, ax = plt.subplots()
     # plot scatterplot of sample 1 entropies against sample 2 entropies for common regions in each sample
-    ax = sb.scatterplot(data=both_samples_entropy_df,x="mean_entropy_x",y="mean_entropy_y",hue="common_name")
+    ax = draw_scatter(ax,both_samples_entropy_df,"mean_entropy_x","mean_entropy_y","common_name",scatter_mode,scatter_bins,x_range=ENTROPY_RANGE,y_range=ENTROPY_RANGE)
     # label axes
     ax.set(xlabel=sample_name_1 + " methylation entropy per region")
     ax.set(ylabel=sample_name_2 + " methylation entropy per region")
     # label legend
-    legend = ax.legend()
-    legend.set_title("Region type")
+    # no legend without rows to plot (e.g., every DMR filtered out by --dmr_length_cutoff)
+    legend = ax.get_legend()
+    if legend is not None:
+        legend.set_title("Region type")
     # add title
     ax.set_title(plot_title)
     # save figure - file name is (output_prefix)_(sample_name_1)_v_(sample_name_2)_pairwise_entropy_scatterplot.png
-    fig.savefig(output_prefix + "_" + sample_name_1 + "_v_" + sample_name_2 + "_pairwise_entropy_scatterplot.png", format='png', dpi=300, bbox_inches='tight')
+    save_figure(fig,output_prefix + "_" + sample_name_1 + "_v_" + sample_name_2 + "_pairwise_entropy_scatterplot.png",bbox_inches='tight')
     # close figure
     fig.clf()
     
 # subroutine to make per sample entropy vs. supporting read count/read proportion scatterplots
 # include bulk, modkit dmr pair, unsmoothed DSS DMR, and smoothed DSS DMR on one plot
-def per_sample_entropy_read_count_scatterplot(per_sample_entropy_df,sample_name,plot_title,output_prefix,read_count_cutoff):
+# entropy_data is the long entropy table (narrowed to this sample) or this sample's density accumulator filled in streaming mode
+def per_sample_entropy_read_count_scatterplot(entropy_data,sample_name,plot_title,output_prefix,read_count_cutoff,scatter_mode='points',scatter_bins=300):
+    per_sample_entropy_df=sample_plot_rows(entropy_data,sample_name)
     # initialize figure
     fig, ax = plt.subplots()
     # plot scatterplot of entropies vs. supporting read counts for all entropy types per sample
-    ax = sb.scatterplot(data=per_sample_entropy_df,x="mean_num_reads",y="mean_entropy",hue="name")
+    ax = draw_scatter(ax,per_sample_entropy_df,"mean_num_reads","mean_entropy","name",scatter_mode,scatter_bins,x_range=(0,read_count_cutoff),y_range=ENTROPY_RANGE)
     # label axes
     ax.set(xlabel="Number of reads supporting entropy call")
     ax.set(ylabel="Methylation entropy per region")
     # set x-limit
     ax.set_xlim(left=0,right=read_count_cutoff)
     # label legend
-    legend = ax.legend()
-    legend.set_title("Region type")
+    # no legend without rows to plot (e.g., every DMR filtered out by --dmr_length_cutoff)
+    legend = ax.get_legend()
+    if legend is not None:
+        legend.set_title("Region type")
     # add title
     ax.set_title(plot_title)
     # save figure - file name is (output_prefix)_(sample_name)_per_sample_entropy_read_proportion_scatterplot.png
-    fig.savefig(output_prefix + "_" + sample_name + "_per_sample_entropy_read_count_scatterplot.png", format='png', dpi=300, bbox_inches='tight')
+    save_figure(fig,output_prefix + "_" + sample_name + "_per_sample_entropy_read_count_scatterplot.png",bbox_inches='tight')
     # close figure
     fig.clf()
 
 # subroutine to make per sample entropy vs. meth changes plots
 # include modkit dmr pair, unsmoothed DSS DMR, and smoothed DSS DMR on one plot
-def per_sample_entropy_methylation_changes_scatterplot(per_sample_entropy_methylation_df,sample_name,plot_title,output_prefix):
+def per_sample_entropy_methylation_changes_scatterplot(dmr_entropy_table,sample_name,plot_title,output_prefix,scatter_mode='points',scatter_bins=300):
+    per_sample_entropy_methylation_df=sample_plot_rows(dmr_entropy_table,sample_name)
     # initialize figure
     fig, ax = plt.subplots()
     # plot entropy vs. respective methylation changes per DMR per sample
-    ax = sb.scatterplot(data=per_sample_entropy_methylation_df,x="mean_entropy",y="effect_size",hue="name")
+    ax = draw_scatter(ax,per_sample_entropy_methylation_df,"mean_entropy","effect_size","name",scatter_mode,scatter_bins)
     # label axes
     ax.set(xlabel="Methylation entropy per DMR")
     ax.set(ylabel="Methylation change per DMR")
     # label legend
-    legend = ax.legend()
-    legend.set_title("Region type")
+    # no legend without rows to plot (e.g., every DMR filtered out by --dmr_length_cutoff)
+    legend = ax.get_legend()
+    if legend is not None:
+        legend.set_title("Region type")
     # add title
     ax.set_title(plot_title)
     # save figure - file name is (output_prefix)_(sample_name)_per_sample_entropy_methylation_changes_scatterplot.png
-    fig.savefig(output_prefix + "_" + sample_name + "_per_sample_entropy_methylation_changes_scatterplot.png", format='png', dpi=300, bbox_inches='tight')
+    save_figure(fig,output_prefix + "_" + sample_name + "_per_sample_entropy_methylation_changes_scatterplot.png",bbox_inches='tight')
     # close figure
     fig.clf()
 
 # subroutine to make per sample entropy vs. DMR length plots
 # include modkit dmr pair, unsmoothed DSS DMR, and smoothed DSS DMR on one plot
-def per_sample_entropy_DMR_length_scatterplot(per_sample_entropy_methylation_df,sample_name,plot_title,output_prefix):
+def per_sample_entropy_DMR_length_scatterplot(dmr_entropy_table,sample_name,plot_title,output_prefix,scatter_mode='points',scatter_bins=300):
+    per_sample_entropy_methylation_df=sample_plot_rows(dmr_entropy_table,sample_name)
     # initialize figure
     fig, ax = plt.subplots()
     # plot entropy vs. respective methylation changes per DMR per sample
-    ax = sb.scatterplot(data=per_sample_entropy_methylation_df,x="DMR length",y="mean_entropy",hue="name")
+    ax = draw_scatter(ax,per_sample_entropy_methylation_df,"DMR length","mean_entropy","name",scatter_mode,scatter_bins)
     # label axes
     ax.set(xlabel="DMR length (bp)")
     ax.set(ylabel="Methylation entropy per DMR")
     # label legend
-    legend = ax.legend()
-    legend.set_title("Region type")
+    # no legend without rows to plot (e.g., every DMR filtered out by --dmr_length_cutoff)
+    legend = ax.get_legend()
+    if legend is not None:
+        legend.set_title("Region type")
     # save figure - file name is (output_prefix)_(sample_name)_per_sample_entropy_DMR_length_scatterplot.png
-    fig.savefig(output_prefix + "_" + sample_name + "_per_sample_entropy_DMR_length_scatterplot.png", format='png', dpi=300, bbox_inches='tight')
+    save_figure(fig,output_prefix + "_" + sample_name + "_per_sample_entropy_DMR_length_scatterplot.png",bbox_inches='tight')
     # close figure
     fig.clf()
 
 # subroutine to make DMR change vs. DMR length plots
 # include modkit dmr pair, unsmoothed DSS DMR, and smoothed DSS DMR on one plot
-def per_sample_DMR_change_DMR_length_scatterplot(per_sample_entropy_methylation_df,sample_name,plot_title,output_prefix):
+def per_sample_DMR_change_DMR_length_scatterplot(dmr_entropy_table,sample_name,plot_title,output_prefix,scatter_mode='points',scatter_bins=300):
+    per_sample_entropy_methylation_df=sample_plot_rows(dmr_entropy_table,sample_name)
     # initialize figure
     fig, ax = plt.subplots()
     # plot entropy vs. respective methylation changes per DMR per sample
-    ax = sb.scatterplot(data=per_sample_entropy_methylation_df,x="DMR length",y="effect_size",hue="name")
+    ax = draw_scatter(ax,per_sample_entropy_methylation_df,"DMR length","effect_size","name",scatter_mode,scatter_bins)
     # label axes
     ax.set(xlabel="DMR length (bp)")
     ax.set(ylabel="Methylation change per DMR")
     # label legend
-    legend = ax.legend()
-    legend.set_title("Region type")
+    # no legend without rows to plot (e.g., every DMR filtered out by --dmr_length_cutoff)
+    legend = ax.get_legend()
+    if legend is not None:
+        legend.set_title("Region type")
     # save figure - file name is (output_prefix)_(sample_name)_per_sample_DMR_change_DMR_length_scatterplot.png
-    fig.savefig(output_prefix + "_" + sample_name + "_per_sample_DMR_change_DMR_length_scatterplot.png", format='png', dpi=300, bbox_inches='tight')
+    save_figure(fig,output_prefix + "_" + sample_name + "_per_sample_DMR_change_DMR_length_scatterplot.png",bbox_inches='tight')
     # close figure
     fig.clf()
 
 # subroutine to make DMR length histogram
 # include modkit dmr pair, unsmoothed DSS DMR, and smoothed DSS DMR on one plot
-def per_sample_DMR_length_distribution_histogram(per_sample_entropy_methylation_df,sample_name,plot_title,output_prefix):
-    # rename "name" column to "Region type"
-    per_sample_entropy_methylation_df=per_sample_entropy_methylation_df.rename(columns={'name': 'Region type'})
-    # initialize figure
-    fig, ax = plt.subplots()
-    # plot per sample entropy distribution histogram with dodge set to true (side by side bars per data type)
-    ax = sb.histplot(data=per_sample_entropy_methylation_df,x="DMR length",hue="Region type",multiple="dodge",stat="proportion",common_norm=False,kde=True)
-    # label x-axis
-    ax.set(xlabel="DMR length (bp)")
-    # label y-axis
-    ax.set(ylabel="Proportion of DMRs")
-    # set high y-limit to 1
-    ax.set_ylim(bottom=0,top=1.1)
-    # label legend
-    # plt.legend(title="Region type")
-    # add title
-    ax.set_title(plot_title)
-    # save figure - file name is (output_prefix)_(sample_name)_per_sample_DMR_length_distribution_histogram.png
-    fig.savefig(output_prefix + "_" + sample_name + "_per_sample_DMR_length_distribution_histogram.png", format='png', dpi=300, bbox_inches='tight')
-    # close figure
-    fig.clf()
+def per_sample_DMR_length_distribution_histogram(dmr_entropy_table,sample_name,plot_title,output_prefix,hist_bins=50):
+    per_sample_entropy_methylation_df=sample_plot_rows(dmr_entropy_table,sample_name)
+    # summarize DMR length per region type ("name" column, labeled "Region type") into fixed-bin histograms and binned KDEs - the plot is drawn from this summary only
+    dmr_length_summary_df=summarize_histogram(per_sample_entropy_methylation_df,'DMR length','name',hist_bins)
+    # save summary next to the figure - file name is (output_prefix)_(sample_name)_per_sample_DMR_length_distribution_histogram.tsv
+    write_histogram_summary(dmr_length_summary_df,output_prefix + "_" + sample_name + "_per_sample_DMR_length_distribution_histogram.tsv")
+    # plot side by side bars per region type with KDE lines - file name is (output_prefix)_(sample_name)_per_sample_DMR_length_distribution_histogram.png
+    plot_histogram_summary(dmr_length_summary_df,"DMR length (bp)","Proportion of DMRs",plot_title,output_prefix + "_" + sample_name + "_per_sample_DMR_length_distribution_histogram.png")
 
 # subroutine to make DMR change histogram
 # include modkit dmr pair, unsmoothed DSS DMR, and smoothed DSS DMR on one plot
-def per_sample_DMR_change_distribution_histogram(per_sample_entropy_methylation_df,sample_name,plot_title,output_prefix):
-    # rename "name" column to "Region type"
-    per_sample_entropy_methylation_df=per_sample_entropy_methylation_df.rename(columns={'name': 'Region type'})
-    # initialize figure
-    fig, ax = plt.subplots()
-    # plot per sample entropy distribution histogram with dodge set to true (side by side bars per data type)
-    ax = sb.histplot(data=per_sample_entropy_methylation_df,x="effect_size",hue="Region type",multiple="dodge",stat="proportion",common_norm=False,kde=True)
-    # label x-axis
-    ax.set(xlabel="Methylation change per DMR")
-    # label y-axis
-    ax.set(ylabel="Proportion of DMRs")
-    # set high y-limit to 1
-    ax.set_ylim(bottom=0,top=1.1)
-    # label legend
-    # plt.legend(title="Region type")
-    # add title
-    ax.set_title(plot_title)
-    # save figure - file name is (output_prefix)_(sample_name)_per_sample_DMR_change_distribution_histogram.png
-    fig.savefig(output_prefix + "_" + sample_name + "_per_sample_DMR_change_distribution_histogram.png", format='png', dpi=300, bbox_inches='tight')
-    # close figure
-    fig.clf()
+def per_sample_DMR_change_distribution_histogram(dmr_entropy_table,sample_name,plot_title,output_prefix,hist_bins=50):
+    per_sample_entropy_methylation_df=sample_plot_rows(dmr_entropy_table,sample_name)
+    # summarize effect_size per region type ("name" column, labeled "Region type") into fixed-bin histograms and binned KDEs - the plot is drawn from this summary only
+    effect_size_summary_df=summarize_histogram(per_sample_entropy_methylation_df,'effect_size','name',hist_bins)
+    # save summary next to the figure - file name is (output_prefix)_(sample_name)_per_sample_DMR_change_distribution_histogram.tsv
+    write_histogram_summary(effect_size_summary_df,output_prefix + "_" + sample_name + "_per_sample_DMR_change_distribution_histogram.tsv")
+    # plot side by side bars per region type with KDE lines - file name is (output_prefix)_(sample_name)_per_sample_DMR_change_distribution_histogram.png
+    plot_histogram_summary(effect_size_summary_df,"Methylation change per DMR","Proportion of DMRs",plot_title,output_prefix + "_" + sample_name + "_per_sample_DMR_change_distribution_histogram.png")
     
+# subroutine to get a column's values for a long table piece - pandas Categoricals for categorical columns, NumPy arrays otherwise
+# keep is an optional row mask (rows are selected from the values rather than copying the whole table first)
+def piece_values(column,keep=None):
+    values=column.array if isinstance(column.dtype,pd.CategoricalDtype) else column.to_numpy()
+    return values if keep is None else values[keep]
+
+# subroutine to build a long-format table from pieces - (sample code, region type code, dict of column -> piece_values) per piece
+# sample and region_type are categorical columns made from codes (sample_names, REGION_TYPES), so no per row strings are built
+def long_table(pieces,columns,sample_names):
+    lengths=[len(piece_columns[columns[0]]) for _, _, piece_columns in pieces]
+    table_columns={
+        'sample': pd.Categorical.from_codes(np.repeat(np.array([sample_code for sample_code, _, _ in pieces],dtype=np.int32),lengths),categories=sample_names),
+        'region_type': pd.Categorical.from_codes(np.repeat(np.array([region_type_code for _, region_type_code, _ in pieces],dtype=np.int32),lengths),categories=REGION_TYPES)
+    }
+    for column in columns:
+        values=[piece_columns[column] for _, _, piece_columns in pieces]
+        # chrom categories are shared (harmonize_chrom_categories), so this concatenates codes
+        table_columns[column]=pd.api.types.union_categoricals(values) if isinstance(values[0],pd.Categorical) else np.concatenate(values)
+    # columns are used as built rather than copied into consolidated blocks
+    return pd.DataFrame(table_columns,copy=False)
+
+# subroutine to build long-format tables of all samples from bulk and per DMR entropies and the DMR sets (one pass, no per sample copies)
+# sample_dmr_entropy_dfs holds one list of per DMR entropies per sample, in DMR_SETS (dmr_dfs) order
+# returns DMR table (per DMR entropies with DMR lengths and methylation changes) and entropy table (bulk windows and per DMR entropies)
+# with categorical sample and region_type columns - samples in sample_names order, region types in REGION_TYPES order within each sample
+def build_sample_tables(sample_names,bulk_entropy_dfs,sample_dmr_entropy_dfs,dmr_dfs):
+    entropy_pieces=[]
+    dmr_pieces=[]
+    for sample_code, (bulk_entropy_df, dmr_entropy_dfs) in enumerate(zip(bulk_entropy_dfs,sample_dmr_entropy_dfs)):
+        entropy_pieces.append((sample_code,0,{
+            'chrom': piece_values(bulk_entropy_df['chrom']),
+            'start': piece_values(bulk_entropy_df['start']),
+            'end': piece_values(bulk_entropy_df['end']),
+            'mean_entropy': piece_values(bulk_entropy_df['entropy']),
+            'mean_num_reads': piece_values(bulk_entropy_df['num_reads'])
+        }))
+        for set_idx, (dmr_entropy_df, dmr_df) in enumerate(zip(dmr_entropy_dfs,dmr_dfs)):
+            # join per DMR entropies to their DMRs on integer (chrom, start, end) keys
+            dmr_entropy_dmrs_df=interval_key_merge(dmr_entropy_df,dmr_df)
+            # keep only modkit dmr segments that are truly different in methylation
+            keep=(dmr_entropy_dmrs_df['state-name']=='different').to_numpy() if 'state-name' in dmr_entropy_dmrs_df.columns else None
+            length_col, change_col = DMR_SET_COLUMNS[set_idx]
+            region_columns={
+                'chrom': piece_values(dmr_entropy_dmrs_df['chrom_x'],keep),
+                'start': piece_values(dmr_entropy_dmrs_df['start_x'],keep),
+                'end': piece_values(dmr_entropy_dmrs_df['end_x'],keep),
+                'mean_entropy': piece_values(dmr_entropy_dmrs_df['mean_entropy'],keep)
+            }
+            entropy_pieces.append((sample_code,set_idx+1,dict(region_columns,mean_num_reads=piece_values(dmr_entropy_dmrs_df['mean_num_reads'],keep))))
+            dmr_pieces.append((sample_code,set_idx+1,dict(region_columns,**{'DMR length': piece_values(dmr_entropy_dmrs_df[length_col],keep), 'effect_size': piece_values(dmr_entropy_dmrs_df[change_col],keep)})))
+    # entropy pieces are ordered by sample, then region type
+    return long_table(dmr_pieces,DMR_TABLE_COLUMNS,sample_names), long_table(entropy_pieces,ENTROPY_TABLE_COLUMNS,sample_names)
+
+# subroutine to join two samples' rows of a long entropy table on common regions of the same region type
+# returns mean_entropy_x (first sample), mean_entropy_y (second sample), and common_name (PAIRWISE_REGION_TYPES) in first sample row order
+def pair_entropies(entropy_table,sample_name_1,sample_name_2):
+    sample_codes=entropy_table['sample'].cat.codes.to_numpy()
+    region_type_codes=entropy_table['region_type'].cat.codes.to_numpy()
+    # keys of the whole table at once, so both samples share chromosome codes
+    keys=interval_keys([entropy_table])[0]
+    sample_rows=[np.flatnonzero(sample_codes==entropy_table['sample'].cat.categories.get_loc(sample_name)) for sample_name in [sample_name_1,sample_name_2]]
+    pair_rows=[[],[]]
+    # match windows and DMRs only within the same region type
+    for region_type_code in range(len(PAIRWISE_REGION_TYPES)):
+        rows_1, rows_2 = [rows[region_type_codes[rows]==region_type_code] for rows in sample_rows]
+        idx_1, idx_2 = key_match_pairs(keys[rows_1],keys[rows_2])
+        pair_rows[0].append(rows_1[idx_1])
+        pair_rows[1].append(rows_2[idx_2])
+    rows_1, rows_2 = [np.concatenate(rows) for rows in pair_rows]
+    # first sample's row order, as an inner join would give
+    pair_order=np.argsort(rows_1,kind='stable')
+    rows_1, rows_2 = rows_1[pair_order], rows_2[pair_order]
+    mean_entropy=entropy_table['mean_entropy'].to_numpy()
+    return pd.DataFrame({
+        'mean_entropy_x': mean_entropy[rows_1],
+        'mean_entropy_y': mean_entropy[rows_2],
+        'common_name': pd.Categorical.from_codes(region_type_codes[rows_1],categories=PAIRWISE_REGION_TYPES)
+    },copy=False)
+
+# subroutine to get rows of a table on one chromosome with that chromosome as the only chrom category
+def chromosome_rows(chrom_tables,chrom,input_type):
+    if chrom in chrom_tables:
+        return chrom_tables[chrom]
+    empty_df=empty_typed_table(input_type)
+    if input_type=='dss_dmrs':
+        empty_df=empty_df.rename(columns={'chr': 'chrom'})
+    empty_df['chrom']=empty_df['chrom'].cat.set_categories([chrom])
+    return empty_df
+
+# subroutine to split a table by chromosome once - returns dict of chromosome -> rows with that chromosome as the only chrom category
+def split_by_chromosome(table_df):
+    chrom_tables={}
+    for chrom, chrom_df in table_df.groupby('chrom',observed=True,sort=False):
+        chrom_df=chrom_df.reset_index(drop=True)
+        chrom_df['chrom']=chrom_df['chrom'].cat.set_categories([chrom])
+        chrom_tables[chrom]=chrom_df
+    return chrom_tables
+
+# subroutine to start the streaming mode accumulators with fixed levels and ranges
+# per sample entropy histograms and read count densities, and a pairwise density per sample pair (all mergeable by addition)
+def init_stream_accumulators(args):
+    accumulators={'entropy_histograms': [], 'read_count_densities': []}
+    for sample_name in args.sample_names:
+        sample_levels=[sample_name + " " + region_type for region_type in REGION_TYPES]
+        accumulators['entropy_histograms'].append(init_histogram_accumulator(sample_levels,ENTROPY_RANGE,args.hist_bins))
+        accumulators['read_count_densities'].append(init_density_accumulator(sample_levels,(0,args.read_count_cutoff),ENTROPY_RANGE,args.scatter_bins))
+    accumulators['pairwise_densities']=[init_density_accumulator(PAIRWISE_REGION_TYPES,ENTROPY_RANGE,ENTROPY_RANGE,args.scatter_bins) for _ in sample_pairs(args.sample_names)]
+    return accumulators
+
+# subroutine to merge streaming mode accumulators (e.g., from separate chromosomes)
+def merge_stream_accumulators(accumulators_list):
+    return {
+        'entropy_histograms': [merge_histogram_accumulators(histograms) for histograms in zip(*[accumulators['entropy_histograms'] for accumulators in accumulators_list])],
+        'read_count_densities': [merge_density_accumulators(densities) for densities in zip(*[accumulators['read_count_densities'] for accumulators in accumulators_list])],
+        'pairwise_densities': [merge_density_accumulators(densities) for densities in zip(*[accumulators['pairwise_densities'] for accumulators in accumulators_list])]
+    }
+
+# subroutine to get one chromosome's DMRs and per sample DMR entropies (None where summarized from bulk windows) from tables split by chromosome
+def chromosome_dmr_inputs(chrom,dmr_chrom_tables,sample_dmr_entropy_chrom_tables):
+    dmr_input_types=['modkit_dmr_segments','dss_dmrs','dss_dmrs']
+    chrom_dmr_dfs=[chromosome_rows(chrom_tables,chrom,input_type) for chrom_tables, input_type in zip(dmr_chrom_tables,dmr_input_types)]
+    sample_chrom_dmr_entropy_dfs=[[chromosome_rows(chrom_tables,chrom,'region_entropy') if chrom_tables is not None else None for chrom_tables in dmr_entropy_chrom_tables] for dmr_entropy_chrom_tables in sample_dmr_entropy_chrom_tables]
+    return chrom_dmr_dfs, sample_chrom_dmr_entropy_dfs
+
+# subroutine to build one chromosome's long tables for all samples as in the in-memory mode and add them to streaming accumulators
+# bulk_dfs are each sample's bulk entropy rows on the chromosome (None if absent); returns the long DMR table and per sample bulk row counts
+def add_chromosome_summaries(args,accumulators,chrom,bulk_dfs,chrom_dmr_dfs,sample_chrom_dmr_entropy_dfs):
+    bulk_dfs=[chromosome_rows({},chrom,'bulk_entropy') if bulk_df is None else bulk_df for bulk_df in bulk_dfs]
+    # per DMR entropies from input where provided, otherwise summarized from this chromosome's bulk windows
+    sample_dmr_entropy_dfs=[[summarize_windows_over_regions(bulk_df,chrom_dmr_df) if chrom_dmr_entropy_df is None else chrom_dmr_entropy_df for chrom_dmr_entropy_df, chrom_dmr_df in zip(chrom_dmr_entropy_dfs,chrom_dmr_dfs)] for bulk_df, chrom_dmr_entropy_dfs in zip(bulk_dfs,sample_chrom_dmr_entropy_dfs)]
+    dmr_entropy_table, entropy_table = build_sample_tables(args.sample_names,bulk_dfs,sample_dmr_entropy_dfs,chrom_dmr_dfs)
+    update_stream_accumulators(args,accumulators,entropy_table)
+    return dmr_entropy_table, [len(bulk_df) for bulk_df in bulk_dfs]
+
+# subroutine to add a long entropy table (build_sample_tables) to streaming accumulators
+# per sample entropy histograms and read count densities (levels are region types in REGION_TYPES order), then each pair's density over common regions
+def update_stream_accumulators(args,accumulators,entropy_table):
+    sample_codes=entropy_table['sample'].cat.codes.to_numpy()
+    region_type_codes=entropy_table['region_type'].cat.codes.to_numpy()
+    mean_entropy=entropy_table['mean_entropy'].to_numpy()
+    mean_num_reads=entropy_table['mean_num_reads'].to_numpy()
+    for sample_code in range(len(args.sample_names)):
+        sample_rows=sample_codes==sample_code
+        update_histogram_accumulator(accumulators['entropy_histograms'][sample_code],mean_entropy[sample_rows],region_type_codes[sample_rows])
+        update_density_accumulator(accumulators['read_count_densities'][sample_code],mean_num_reads[sample_rows],mean_entropy[sample_rows],region_type_codes[sample_rows])
+    for pairwise_density, (sample_name_1, sample_name_2) in zip(accumulators['pairwise_densities'],sample_pairs(args.sample_names)):
+        pair_df=pair_entropies(entropy_table,sample_name_1,sample_name_2)
+        update_density_accumulator(pairwise_density,pair_df['mean_entropy_x'],pair_df['mean_entropy_y'],pair_df['common_name'].cat.codes.to_numpy())
+    return accumulators
+
+# subroutine to summarize one chromosome (or its selected regions) of every bulk entropy input - one chromosome-parallel job
+# returns (accumulators, long DMR table, bulk row counts) for the caller to merge
+def chromosome_summary_job(args,chrom,chrom_selection,chrom_dmr_dfs,sample_chrom_dmr_entropy_dfs):
+    bulk_dfs=[]
+    for path in args.bulk_entropy:
+        bulk_df=read_region_table(path,'bulk_entropy',chrom_selection,args.chunksize)
+        bulk_df['chrom']=bulk_df['chrom'].cat.set_categories([chrom])
+        bulk_dfs.append(bulk_df)
+    accumulators=init_stream_accumulators(args)
+    dmr_entropy_table, bulk_rows = add_chromosome_summaries(args,accumulators,chrom,bulk_dfs,chrom_dmr_dfs,sample_chrom_dmr_entropy_dfs)
+    return accumulators, dmr_entropy_table, bulk_rows
+
+# subroutine to stream every bulk entropy input one chromosome at a time (coordinate-sorted inputs read in lockstep)
+# per chromosome, builds the same long tables as the in-memory mode, then adds them to histogram and binned scatterplot accumulators
+# with --processes/--threads or a region selection, chromosomes are read through byte offset or tabix indexes and summarized in jobs whose accumulators are added up
+# only the DMR table is kept; returns the long DMR table, per sample entropy histogram and read count density accumulators, and per pair density accumulators
+def stream_sample_tables(args,dmr_dfs,sample_dmr_entropy_dfs,selection=None):
+    bulk_paths=args.bulk_entropy
+    chunksize=args.chunksize if args.chunksize is not None else STREAMING_CHUNKSIZE
+    # DMRs and per DMR entropies are small - split them by chromosome once
+    dmr_chrom_tables=[split_by_chromosome(dmr_df) for dmr_df in dmr_dfs]
+    sample_dmr_entropy_chrom_tables=[[split_by_chromosome(df) if df is not None else None for df in dmr_entropy_dfs] for dmr_entropy_dfs in sample_dmr_entropy_dfs]
+    dmr_chromosomes=set().union(*[chrom_tables.keys() for chrom_tables in dmr_chrom_tables])
+    stream_start_time=time.perf_counter()
+    workers=parallel_workers(args)
+    if (workers>1) and (selection is None) and any(detect_compression(path) is not None for path in bulk_paths):
+        print("Compressed bulk entropy inputs cannot be split by chromosome - streaming in one process.")
+        workers=1
+    if (workers>1) or (selection is not None):
+        # summarize each chromosome (or its selected regions, DMRs included) in its own job
+        if selection is None:
+            # chromosomes of all bulk inputs, then DMRs on chromosomes without bulk windows
+            chromosomes=matched_chromosome_order([build_chromosome_offsets(path).keys() for path in bulk_paths])
+            chromosomes+=sorted(dmr_chromosomes-set(chromosomes))
+        else:
+            chromosomes=list(selection)
+        job_args_list=[(args,chrom,chromosome_selection(chrom,selection),*chromosome_dmr_inputs(chrom,dmr_chrom_tables,sample_dmr_entropy_chrom_tables)) for chrom in chromosomes]
+        accumulators=init_stream_accumulators(args)
+        dmr_entropy_table_pieces=[None]*len(chromosomes)
+        streamed_rows=0
+        for job_idx, (chrom_accumulators, dmr_entropy_table, bulk_rows) in iter_chromosome_jobs(chromosome_summary_job,job_args_list,args.processes,args.threads):
+            accumulators=merge_stream_accumulators([accumulators,chrom_accumulators])
+            # DMR tables in chromosome order as in one process
+            dmr_entropy_table_pieces[job_idx]=dmr_entropy_table
+            streamed_rows+=sum(bulk_rows)
+    else:
+        accumulators=init_stream_accumulators(args)
+        dmr_entropy_table_pieces=[]
+        streamed_rows=0
+        def add_chromosome(chrom,bulk_dfs):
+            dmr_entropy_table, bulk_rows = add_chromosome_summaries(args,accumulators,chrom,bulk_dfs,*chromosome_dmr_inputs(chrom,dmr_chrom_tables,sample_dmr_entropy_chrom_tables))
+            dmr_entropy_table_pieces.append(dmr_entropy_table)
+            return sum(bulk_rows)
+        streamed_chromosomes=set()
+        for chrom, bulk_dfs in iter_matched_chromosome_tables(bulk_paths,'bulk_entropy',chunksize):
+            streamed_rows+=add_chromosome(chrom,bulk_dfs)
+            streamed_chromosomes.add(chrom)
+        # DMRs on chromosomes without bulk windows in any sample
+        for chrom in sorted(dmr_chromosomes-streamed_chromosomes):
+            streamed_rows+=add_chromosome(chrom,[None]*len(bulk_paths))
+    report_stream_usage(str(len(bulk_paths)) + " samples' bulk entropy",streamed_rows,stream_start_time)
+    # DMR tables are small - concatenate them and order samples and region types as in the in-memory mode
+    dmr_entropy_table=concat_typed_chunks(dmr_entropy_table_pieces)
+    table_order=np.lexsort((dmr_entropy_table['region_type'].cat.codes.to_numpy(),dmr_entropy_table['sample'].cat.codes.to_numpy()))
+    dmr_entropy_table=dmr_entropy_table.iloc[table_order].reset_index(drop=True)
+    return dmr_entropy_table, accumulators['entropy_histograms'], accumulators['read_count_densities'], accumulators['pairwise_densities']
+
+# subroutine to load bulk entropy - through the cache, or only windows overlapping the region selection (--regions/--chrom)
+def load_bulk_entropy_selection(input_cache,path,csv_engine,chunksize,selection):
+    if selection is None:
+        return cached_load(load_bulk_entropy,path,input_cache,csv_engine,chunksize)
+    return read_region_table(path,'bulk_entropy',selection,chunksize)
+
+# subroutine to load per DMR entropy (modkit entropy --regions output) if a path was provided, keeping DMRs overlapping the region selection
+def load_optional_region_entropy(input_cache,path,csv_engine,chunksize,selection=None):
+    if path is None:
+        return None
+    return select_region_rows(cached_load(load_region_entropy,path,input_cache,csv_engine,chunksize),selection)
+
+# subroutine to get the output plot tasks from every sample's plot data
+# entropy histogram and read count scatter data are the long entropy table in memory or accumulators when streaming (one per sample),
+# as is the pairwise scatter data (one per sample pair); per DMR plots narrow the long DMR table to each sample
+def entropy_plot_tasks(args,entropy_histogram_data,read_count_scatter_data,pairwise_scatter_data,dmr_entropy_table):
+    plot_tasks=[]
+    for sample_name, entropy_histogram in zip(args.sample_names,entropy_histogram_data):
+        plot_tasks.append(plot_task("entropy histogram for " + sample_name,per_sample_entropy_distribution_histogram,entropy_histogram,sample_name,args.plot_title,args.output_prefix,args.hist_bins))
+    for (sample_name_1, sample_name_2), pairwise_scatter in zip(sample_pairs(args.sample_names),pairwise_scatter_data):
+        plot_tasks.append(plot_task("pairwise entropy scatterplot for " + sample_name_1 + " vs. " + sample_name_2,pairwise_entropy_scatterplot,pairwise_scatter,sample_name_1,sample_name_2,args.plot_title,args.output_prefix,args.scatter_mode,args.scatter_bins))
+    for sample_name, read_count_scatter in zip(args.sample_names,read_count_scatter_data):
+        plot_tasks.append(plot_task("entropy vs. read count scatterplot for " + sample_name,per_sample_entropy_read_count_scatterplot,read_count_scatter,sample_name,args.plot_title,args.output_prefix,args.read_count_cutoff,args.scatter_mode,args.scatter_bins))
+    # per DMR plots - label, plot function, and arguments after the output prefix
+    dmr_plots=[
+        ("entropy vs. methylation change scatterplot",per_sample_entropy_methylation_changes_scatterplot,[args.scatter_mode,args.scatter_bins]),
+        ("entropy vs. dmr length",per_sample_entropy_DMR_length_scatterplot,[args.scatter_mode,args.scatter_bins]),
+        ("DMR change vs. DMR length",per_sample_DMR_change_DMR_length_scatterplot,[args.scatter_mode,args.scatter_bins]),
+        ("DMR length histogram",per_sample_DMR_length_distribution_histogram,[args.hist_bins]),
+        ("DMR change histogram",per_sample_DMR_change_distribution_histogram,[args.hist_bins])
+    ]
+    for label, plot_function, plot_args in dmr_plots:
+        for sample_name in args.sample_names:
+            plot_tasks.append(plot_task(label + " for " + sample_name,plot_function,dmr_entropy_table,sample_name,args.plot_title,args.output_prefix,*plot_args))
+    return plot_tasks
+
 # main script subroutine
 def main():
     # Parse the arguments
     args = parse_args()
-    # load entropy files
-    sample_1_bulk_entropy_df=pd.read_csv(args.sample_1_bulk_entropy,sep="\t",header=None)
-    sample_2_bulk_entropy_df=pd.read_csv(args.sample_2_bulk_entropy,sep="\t",header=None)
-    sample_1_modkit_dmr_entropy_df=pd.read_csv(args.sample_1_modkit_dmr_entropy,sep="\t",header=None)
-    sample_2_modkit_dmr_entropy_df=pd.read_csv(args.sample_2_modkit_dmr_entropy,sep="\t",header=None)
-    sample_1_dss_unsmoothed_dmr_entropy_df=pd.read_csv(args.sample_1_dss_unsmoothed_dmr_entropy,sep="\t",header=None)
-    sample_2_dss_unsmoothed_dmr_entropy_df=pd.read_csv(args.sample_2_dss_unsmoothed_dmr_entropy,sep="\t",header=None)
-    sample_1_dss_smoothed_dmr_entropy_df=pd.read_csv(args.sample_1_dss_smoothed_dmr_entropy,sep="\t",header=None)
-    sample_2_dss_smoothed_dmr_entropy_df=pd.read_csv(args.sample_2_dss_smoothed_dmr_entropy,sep="\t",header=None)
-    # add headers (column names) where necessary
-    sample_1_bulk_entropy_df.columns=['chrom','start','end','entropy','strand','num_reads']
-    sample_2_bulk_entropy_df.columns=['chrom','start','end','entropy','strand','num_reads']
-    sample_1_modkit_dmr_entropy_df.columns=['chrom','start','end','region_name','mean_entropy','strand','median_entropy','min_entropy','max_entropy','mean_num_reads','min_num_reads','max_num_reads','successful_window_count','failed_window_count']
-    sample_2_modkit_dmr_entropy_df.columns=['chrom','start','end','region_name','mean_entropy','strand','median_entropy','min_entropy','max_entropy','mean_num_reads','min_num_reads','max_num_reads','successful_window_count','failed_window_count']
-    sample_1_dss_unsmoothed_dmr_entropy_df.columns=['chrom','start','end','region_name','mean_entropy','strand','median_entropy','min_entropy','max_entropy','mean_num_reads','min_num_reads','max_num_reads','successful_window_count','failed_window_count']
-    sample_1_dss_smoothed_dmr_entropy_df.columns=['chrom','start','end','region_name','mean_entropy','strand','median_entropy','min_entropy','max_entropy','mean_num_reads','min_num_reads','max_num_reads','successful_window_count','failed_window_count']
-    sample_2_dss_unsmoothed_dmr_entropy_df.columns=['chrom','start','end','region_name','mean_entropy','strand','median_entropy','min_entropy','max_entropy','mean_num_reads','min_num_reads','max_num_reads','successful_window_count','failed_window_count']
-    sample_2_dss_smoothed_dmr_entropy_df.columns=['chrom','start','end','region_name','mean_entropy','strand','median_entropy','min_entropy','max_entropy','mean_num_reads','min_num_reads','max_num_reads','successful_window_count','failed_window_count']
-    # load DMRs
-    modkit_dmr_segments_df=pd.read_csv(args.modkit_dmr_segments,sep="\t",header=None)
-    dss_unsmoothed_dmr_df=pd.read_csv(args.dss_unsmoothed_dmrs,sep="\t")
-    # rename columns
-    dss_unsmoothed_dmr_df=dss_unsmoothed_dmr_df.rename(columns={'chr': 'chrom'})
-    dss_smoothed_dmr_df=pd.read_csv(args.dss_smoothed_dmrs,sep="\t")
-    # rename columns
-    dss_smoothed_dmr_df=dss_smoothed_dmr_df.rename(columns={'chr': 'chrom'})
-    # add headers (column names) where necessary
-    modkit_dmr_segments_df.columns=['chrom','start','end','state-name','score','N-sites','sample_a_counts','sample_b_counts','sample_a_percents','sample_b_percents','sample_a_fraction_modified','sample_b_fraction_modified','effect_size','cohen_h','cohen_h_low','cohen_h_high']
-    # add region name column for table join
-    # note that you need to first convert start/end positions to integer, and then to string...note trailing .0 in smoothed dmr values
-    modkit_dmr_segments_df['region_name']=modkit_dmr_segments_df['chrom'].astype(str)+":"+modkit_dmr_segments_df['start'].astype(int).astype(str)+"-"+modkit_dmr_segments_df['end'].astype(int).astype(str)
-    dss_unsmoothed_dmr_df['region_name']=dss_unsmoothed_dmr_df['chrom'].astype(str)+":"+dss_unsmoothed_dmr_df['start'].astype(int).astype(str)+"-"+dss_unsmoothed_dmr_df['end'].astype(int).astype(str)
-    dss_smoothed_dmr_df['region_name']=dss_smoothed_dmr_df['chrom'].astype(str)+":"+dss_smoothed_dmr_df['start'].astype(int).astype(str)+"-"+dss_smoothed_dmr_df['end'].astype(int).astype(str)
-    # get dmr segments tagged different
-    # modkit_dmr_segments_df=modkit_dmr_segments_df[modkit_dmr_segments_df['state-name']=='different']
-    # combine entropies and DMRs appropriately
-    # all sample 1
-    sample_1_modkit_dmr_segments_entropy_df=pd.merge(sample_1_modkit_dmr_entropy_df,modkit_dmr_segments_df,on=['region_name'])
-    sample_1_dss_unsmoothed_dmr_entropy_dmrs_df=pd.merge(sample_1_dss_unsmoothed_dmr_entropy_df,dss_unsmoothed_dmr_df,on=['region_name'])
-    sample_1_dss_smoothed_dmr_entropy_dmrs_df=pd.merge(sample_1_dss_smoothed_dmr_entropy_df,dss_smoothed_dmr_df,on=['region_name'])
-    # filter for modkit dmr segments that are truly different in methylation
-    sample_1_modkit_dmr_segments_entropy_df=sample_1_modkit_dmr_segments_entropy_df[sample_1_modkit_dmr_segments_entropy_df['state-name']=='different']
-    # get just necessary columns for plotting
-    sample_1_modkit_dmr_segments_entropy_diff_df=sample_1_modkit_dmr_segments_entropy_df[['region_name','mean_entropy','N-sites','effect_size']].rename(columns={'N-sites': 'DMR length'})
-    sample_1_dss_unsmoothed_dmr_entropy_dmrs_diff_df=sample_1_dss_unsmoothed_dmr_entropy_dmrs_df[['region_name','mean_entropy','length','diff.Methy']].rename(columns={'diff.Methy': 'effect_size', 'length': 'DMR length'})
-    sample_1_dss_smoothed_dmr_entropy_dmrs_diff_df=sample_1_dss_smoothed_dmr_entropy_dmrs_df[['region_name','mean_entropy','length','diff.Methy']].rename(columns={'diff.Methy': 'effect_size', 'length': 'DMR length'})
-    # name by region type
-    sample_1_modkit_dmr_segments_entropy_diff_df.insert(loc=0, column='name', value=args.sample_name_1 + " modkit DMR segments")
-    sample_1_dss_unsmoothed_dmr_entropy_dmrs_diff_df.insert(loc=0, column='name', value=args.sample_name_1 + " DSS unsmoothed DMRs")
-    sample_1_dss_smoothed_dmr_entropy_dmrs_diff_df.insert(loc=0, column='name', value=args.sample_name_1 + " DSS smoothed DMRs")
-    # concatenate sample 1 entropy/dmr tables
-    sample_1_concat_dmr_entropy_table=pd.concat([sample_1_modkit_dmr_segments_entropy_diff_df,sample_1_dss_unsmoothed_dmr_entropy_dmrs_diff_df,sample_1_dss_smoothed_dmr_entropy_dmrs_diff_df],ignore_index=True)
-    # debugging
-    # print(sample_1_concat_dmr_entropy_table)
-    # get name column data type
-    # print(sample_1_concat_dmr_entropy_table['name'].dtype)
-    # set name column to string data type
-    sample_1_concat_dmr_entropy_table['name'] = sample_1_concat_dmr_entropy_table['name'].astype('string')
-    # sample 1 just entropies after join
-    sample_1_bulk_entropy_renamed_df=sample_1_bulk_entropy_df.rename(columns={'chrom': 'chrom_x', 'start': 'start_x', 'end': 'end_x', 'entropy': 'mean_entropy', 'num_reads': 'mean_num_reads'}).drop(columns=['strand'])
-    sample_1_modkit_dmr_segments_entropy_only_df=sample_1_modkit_dmr_segments_entropy_df[['chrom_x','start_x','end_x','mean_entropy','mean_num_reads']]
-    sample_1_dss_unsmoothed_dmr_entropy_only_dmrs_df=sample_1_dss_unsmoothed_dmr_entropy_dmrs_df[['chrom_x','start_x','end_x','mean_entropy','mean_num_reads']]
-    sample_1_dss_smoothed_dmr_entropy_only_dmrs_df=sample_1_dss_smoothed_dmr_entropy_dmrs_df[['chrom_x','start_x','end_x','mean_entropy','mean_num_reads']]
-    # name entropy by region type
-    sample_1_bulk_entropy_renamed_df.insert(loc=0, column='name', value=args.sample_name_1 + " genomic windows")
-    # sample_1_bulk_entropy_renamed_df['name']=args.sample_name_1 + " genomic windows"
-    sample_1_modkit_dmr_segments_entropy_only_df.insert(loc=0, column='name', value=args.sample_name_1 + " modkit DMR segments")
-    # sample_1_modkit_dmr_segments_entropy_only_df.loc[:,'name']=args.sample_name_1 + " modkit DMR segments"
-    sample_1_dss_unsmoothed_dmr_entropy_only_dmrs_df.insert(loc=0, column='name', value=args.sample_name_1 + " DSS unsmoothed DMRs")
-    # sample_1_dss_unsmoothed_dmr_entropy_only_dmrs_df.loc[:,'name']=args.sample_name_1 + " DSS unsmoothed DMRs"
-    sample_1_dss_smoothed_dmr_entropy_only_dmrs_df.insert(loc=0, column='name', value=args.sample_name_1 + " DSS smoothed DMRs")
-    # sample_1_dss_smoothed_dmr_entropy_only_dmrs_df.loc[:,'name']=args.sample_name_1 + " DSS smoothed DMRs"
-    # concat above tables
-    sample_1_concat_entropy_table=pd.concat([sample_1_bulk_entropy_renamed_df,sample_1_modkit_dmr_segments_entropy_only_df,sample_1_dss_unsmoothed_dmr_entropy_only_dmrs_df,sample_1_dss_smoothed_dmr_entropy_only_dmrs_df],ignore_index=True)
-    # set name column to string data type
-    sample_1_concat_entropy_table['name'] = sample_1_concat_entropy_table['name'].astype('string')
-    # all sample 2
-    sample_2_modkit_dmr_segments_entropy_df=pd.merge(sample_2_modkit_dmr_entropy_df,modkit_dmr_segments_df,on=['region_name'])
-    sample_2_dss_unsmoothed_dmr_entropy_dmrs_df=pd.merge(sample_2_dss_unsmoothed_dmr_entropy_df,dss_unsmoothed_dmr_df,on=['region_name'])
-    sample_2_dss_smoothed_dmr_entropy_dmrs_df=pd.merge(sample_2_dss_smoothed_dmr_entropy_df,dss_smoothed_dmr_df,on=['region_name'])
-    # filter for modkit dmr segments that are truly different in methylation
-    sample_2_modkit_dmr_segments_entropy_df=sample_2_modkit_dmr_segments_entropy_df[sample_2_modkit_dmr_segments_entropy_df['state-name']=='different']
-    # get just necessary columns for plotting
-    sample_2_modkit_dmr_segments_entropy_diff_df=sample_2_modkit_dmr_segments_entropy_df[['region_name','mean_entropy','N-sites','effect_size']].rename(columns={'N-sites': 'DMR length'})
-    sample_2_dss_unsmoothed_dmr_entropy_dmrs_diff_df=sample_2_dss_unsmoothed_dmr_entropy_dmrs_df[['region_name','mean_entropy','length','diff.Methy']].rename(columns={'diff.Methy': 'effect_size', 'length': 'DMR length'})
-    sample_2_dss_smoothed_dmr_entropy_dmrs_diff_df=sample_2_dss_smoothed_dmr_entropy_dmrs_df[['region_name','mean_entropy','length','diff.Methy']].rename(columns={'diff.Methy': 'effect_size', 'length': 'DMR length'})
-    # name by region type
-    sample_2_modkit_dmr_segments_entropy_diff_df.insert(loc=0, column='name', value=args.sample_name_2 + " modkit DMR segments")
-    sample_2_dss_unsmoothed_dmr_entropy_dmrs_diff_df.insert(loc=0, column='name', value=args.sample_name_2 + " DSS unsmoothed DMRs")
-    sample_2_dss_smoothed_dmr_entropy_dmrs_diff_df.insert(loc=0, column='name', value=args.sample_name_2 + " DSS smoothed DMRs")
-    # concatenate sample 1 entropy/dmr tables
-    sample_2_concat_dmr_entropy_table=pd.concat([sample_2_modkit_dmr_segments_entropy_diff_df,sample_2_dss_unsmoothed_dmr_entropy_dmrs_diff_df,sample_2_dss_smoothed_dmr_entropy_dmrs_diff_df],ignore_index=True)
-    # set name column to string data type
-    sample_2_concat_dmr_entropy_table['name'] = sample_2_concat_dmr_entropy_table['name'].astype('string')
-    # sample 2 just entropies after join
-    sample_2_bulk_entropy_renamed_df=sample_2_bulk_entropy_df.rename(columns={'chrom': 'chrom_x', 'start': 'start_x', 'end': 'end_x', 'entropy': 'mean_entropy', 'num_reads': 'mean_num_reads'}).drop(columns=['strand'])
-    sample_2_modkit_dmr_segments_entropy_only_df=sample_2_modkit_dmr_segments_entropy_df[['chrom_x','start_x','end_x','mean_entropy','mean_num_reads']]
-    sample_2_dss_unsmoothed_dmr_entropy_only_dmrs_df=sample_2_dss_unsmoothed_dmr_entropy_dmrs_df[['chrom_x','start_x','end_x','mean_entropy','mean_num_reads']]
-    sample_2_dss_smoothed_dmr_entropy_only_dmrs_df=sample_2_dss_smoothed_dmr_entropy_dmrs_df[['chrom_x','start_x','end_x','mean_entropy','mean_num_reads']]
-    # name entropy by region type
-    sample_2_bulk_entropy_renamed_df.insert(loc=0, column='name', value=args.sample_name_2 + " genomic windows")
-    sample_2_modkit_dmr_segments_entropy_only_df.insert(loc=0, column='name', value=args.sample_name_2 + " modkit DMR segments")
-    sample_2_dss_unsmoothed_dmr_entropy_only_dmrs_df.insert(loc=0, column='name', value=args.sample_name_2 + " DSS unsmoothed DMRs")
-    sample_2_dss_smoothed_dmr_entropy_only_dmrs_df.insert(loc=0, column='name', value=args.sample_name_2 + " DSS smoothed DMRs")
-    # concat above tables
-    sample_2_concat_entropy_table=pd.concat([sample_2_bulk_entropy_renamed_df,sample_2_modkit_dmr_segments_entropy_only_df,sample_2_dss_unsmoothed_dmr_entropy_only_dmrs_df,sample_2_dss_smoothed_dmr_entropy_only_dmrs_df],ignore_index=True)
-    # set name column to string data type
-    sample_2_concat_entropy_table['name'] = sample_2_concat_entropy_table['name'].astype('string')
-    # sample 1 + 2 combined
-    samples_1_and_2_combined_concat_entropies=pd.merge(sample_1_concat_entropy_table,sample_2_concat_entropy_table,on=['chrom_x','start_x','end_x'])
-    samples_1_and_2_combined_concat_entropies['common_name']=samples_1_and_2_combined_concat_entropies['name_x']
-    # remove sample name 1 from common name column.
-    pattern = re.escape(args.sample_name_1) + r'\s'
-    samples_1_and_2_combined_concat_entropies['common_name']=samples_1_and_2_combined_concat_entropies['common_name'].str.replace(pattern, '', regex=True, n=1)
-    samples_1_and_2_combined_concat_entropies['common_name']=samples_1_and_2_combined_concat_entropies['common_name'].str.replace('genomic windows', 'Genomic windows', regex=True, n=1)
-    # make 'common_name' data type string
-    samples_1_and_2_combined_concat_entropies['common_name']=samples_1_and_2_combined_concat_entropies['common_name'].astype('string')
+    # time and memory per stage and plot are written to (output_prefix)_run_report.json
+    run_report=init_run_report(os.path.basename(__file__),args.output_prefix,args.profile)
+    # check that pyarrow is available if requested as csv engine
+    if (args.csv_engine == 'pyarrow') and (importlib.util.find_spec('pyarrow') is None):
+        quit('ERROR: --csv_engine pyarrow requested but pyarrow is not installed!')
+    # streaming mode draws bulk scatterplots from binned counts only
+    if args.streaming and (args.scatter_mode not in BINNED_SCATTER_MODES):
+        quit('ERROR: --streaming requires --scatter_mode ' + ' or '.join(BINNED_SCATTER_MODES) + '!')
+    # chromosome-parallel jobs add up streaming accumulators
+    if (parallel_workers(args)>1) and (not args.streaming):
+        quit('ERROR: --processes and --threads require --streaming!')
+    # figure format and resolution, or plotted data only
+    figure_options=figure_output_options(args)
+    # parsed inputs are reused from --cache_dir when unchanged
+    input_cache=cache_settings(args)
+    # --regions/--chrom read only bulk windows overlapping the selected regions (DMRs are filtered after loading)
+    selection=region_selection(args)
+    if selection is not None:
+        unindexed_inputs=unindexed_region_inputs(args.bulk_entropy)
+        if len(unindexed_inputs)>0:
+            quit('ERROR: --regions and --chrom need uncompressed bulk entropy inputs or bgzipped inputs with a tabix/CSI index and pysam installed: ' + ', '.join(unindexed_inputs))
+        if len(selection)==0:
+            quit('ERROR: No regions in ' + args.regions + ' are on the chromosomes given with --chrom!')
+        check_selection_chromosomes(selection,args.bulk_entropy)
+    if not args.streaming:
+        with measure_stage(run_report,"load bulk entropy") as stage:
+            # load entropy files with explicit compact dtypes and only the columns used for plotting
+            bulk_entropy_dfs=[]
+            for sample_name, path in zip(args.sample_names,args.bulk_entropy):
+                load_start_time=time.perf_counter()
+                bulk_entropy_dfs.append(load_bulk_entropy_selection(input_cache,path,args.csv_engine,args.chunksize,selection))
+                report_load_usage(sample_name + " bulk entropy",bulk_entropy_dfs[-1],load_start_time)
+            stage['rows']=sum(len(df) for df in bulk_entropy_dfs)
+    with measure_stage(run_report,"load DMRs and per DMR entropies") as stage:
+        load_start_time=time.perf_counter()
+        # load DMRs
+        modkit_dmr_segments_df=select_region_rows(cached_load(load_modkit_dmr_segments,args.modkit_dmr_segments,input_cache,args.csv_engine,args.chunksize),selection)
+        dss_unsmoothed_dmr_df=select_region_rows(cached_load(load_dss_dmrs,args.dss_unsmoothed_dmrs,input_cache,args.csv_engine,args.chunksize),selection)
+        dss_smoothed_dmr_df=select_region_rows(cached_load(load_dss_dmrs,args.dss_smoothed_dmrs,input_cache,args.csv_engine,args.chunksize),selection)
+        dmr_df_list=[modkit_dmr_segments_df,dss_unsmoothed_dmr_df,dss_smoothed_dmr_df]
+        # load per DMR entropies where provided (modkit entropy --regions output) - per sample lists in DMR_SETS order, None where not provided
+        sample_dmr_entropy_dfs=[[load_optional_region_entropy(input_cache,getattr(args,dmr_set + '_dmr_entropy')[sample_idx],args.csv_engine,args.chunksize,selection) for dmr_set in DMR_SETS] for sample_idx in range(len(args.sample_names))]
+        per_region_df_list=[df for dmr_entropy_dfs in sample_dmr_entropy_dfs for df in dmr_entropy_dfs if df is not None]
+        report_load_usage("per region entropies and DMRs",per_region_df_list+dmr_df_list,load_start_time)
+        stage['rows']=sum(len(df) for df in per_region_df_list+dmr_df_list)
+    # share one chrom category set across all inputs so concatenation and joins keep chrom categorical
+    if args.streaming:
+        harmonize_chrom_categories(dmr_df_list+per_region_df_list)
+    else:
+        harmonize_chrom_categories(bulk_entropy_dfs+dmr_df_list+per_region_df_list)
+    if args.streaming:
+        # read bulk entropies one chromosome at a time - bulk plots are drawn from accumulated histograms and binned densities
+        with measure_stage(run_report,"stream bulk entropy") as stage:
+            dmr_entropy_table, entropy_histogram_data, read_count_scatter_data, pairwise_scatter_data = stream_sample_tables(args,dmr_df_list,sample_dmr_entropy_dfs,selection)
+            # entropies added to the histograms
+            stage['rows']=int(sum(histogram['counts'].sum() for histogram in entropy_histogram_data))
+    else:
+        # summarize bulk window entropies over DMRs where per DMR entropies were not provided
+        with measure_stage(run_report,"summarize bulk windows over DMRs") as stage:
+            summary_start_time=time.perf_counter()
+            for bulk_entropy_df, dmr_entropy_dfs in zip(bulk_entropy_dfs,sample_dmr_entropy_dfs):
+                for set_idx, dmr_df in enumerate(dmr_df_list):
+                    if dmr_entropy_dfs[set_idx] is None:
+                        dmr_entropy_dfs[set_idx]=summarize_windows_over_regions(bulk_entropy_df,dmr_df)
+            if len(per_region_df_list)<len(dmr_df_list)*len(args.sample_names):
+                report_load_usage("per DMR entropies summarized from bulk windows",[df for dmr_entropy_dfs in sample_dmr_entropy_dfs for df in dmr_entropy_dfs],summary_start_time)
+            stage['rows']=sum(len(df) for df in bulk_entropy_dfs)
+        # get dmr segments tagged different
+        # modkit_dmr_segments_df=modkit_dmr_segments_df[modkit_dmr_segments_df['state-name']=='different']
+        # combine entropies and DMRs appropriately - join on integer (chrom, start, end) keys rather than chrom:start-end strings
+        with measure_stage(run_report,"join sample tables") as stage:
+            # one long table of every sample's bulk windows and per DMR entropies, and one of every sample's per DMR entropies, DMR lengths, and methylation changes
+            dmr_entropy_table, entropy_table = build_sample_tables(args.sample_names,bulk_entropy_dfs,sample_dmr_entropy_dfs,dmr_df_list)
+            # bulk windows are held by the long table from here on
+            del bulk_entropy_dfs
+            stage['rows']=len(entropy_table)
+        # bulk plots are drawn from the long table, narrowed to each sample or joined for each sample pair while plotting
+        entropy_histogram_data=read_count_scatter_data=[entropy_table]*len(args.sample_names)
+        pairwise_scatter_data=[entropy_table]*len(sample_pairs(args.sample_names))
     # print statistics on each DMR set
     # print number of DMRs, average change, standard error of changes, average length, and standard error of lengths
     # proceed with plotting
@@ -350,37 +650,13 @@ def main():
     # filter out 
     if (args.dmr_length_cutoff is not None):
         print("Filtering out all DMRs over",args.dmr_length_cutoff,"bp in length before plotting...")
-        sample_1_concat_dmr_entropy_table=sample_1_concat_dmr_entropy_table[sample_1_concat_dmr_entropy_table['DMR length']<args.dmr_length_cutoff]
-        sample_2_concat_dmr_entropy_table=sample_2_concat_dmr_entropy_table[sample_2_concat_dmr_entropy_table['DMR length']<args.dmr_length_cutoff]
-    # entropy histogram for sample 1
-    per_sample_entropy_distribution_histogram(sample_1_concat_entropy_table,args.sample_name_1,args.plot_title,args.output_prefix)
-    # entropy histogram for sample 2
-    per_sample_entropy_distribution_histogram(sample_2_concat_entropy_table,args.sample_name_2,args.plot_title,args.output_prefix)
-    # pairwise entropy scatterplot for both samples
-    pairwise_entropy_scatterplot(samples_1_and_2_combined_concat_entropies,args.sample_name_1,args.sample_name_2,args.plot_title,args.output_prefix)
-    # entropy vs. read count scatterplot for sample 1
-    per_sample_entropy_read_count_scatterplot(sample_1_concat_entropy_table,args.sample_name_1,args.plot_title,args.output_prefix,args.read_count_cutoff)
-    # entropy vs. read count scatterplot for sample 2
-    per_sample_entropy_read_count_scatterplot(sample_2_concat_entropy_table,args.sample_name_2,args.plot_title,args.output_prefix,args.read_count_cutoff)
-    # entropy vs. methylation change scatterplot for sample 1
-    per_sample_entropy_methylation_changes_scatterplot(sample_1_concat_dmr_entropy_table,args.sample_name_1,args.plot_title,args.output_prefix)
-    # entropy vs. methylation change scatterplot for sample 2
-    per_sample_entropy_methylation_changes_scatterplot(sample_2_concat_dmr_entropy_table,args.sample_name_2,args.plot_title,args.output_prefix)
-    # entropy vs. dmr length for sample 1
-    per_sample_entropy_DMR_length_scatterplot(sample_1_concat_dmr_entropy_table,args.sample_name_1,args.plot_title,args.output_prefix)
-    # entropy vs. dmr length for sample 2
-    per_sample_entropy_DMR_length_scatterplot(sample_2_concat_dmr_entropy_table,args.sample_name_2,args.plot_title,args.output_prefix)
-    # DMR change vs. DMR length for sample 1
-    per_sample_DMR_change_DMR_length_scatterplot(sample_1_concat_dmr_entropy_table,args.sample_name_1,args.plot_title,args.output_prefix)
-    # DMR change vs. DMR length for sample 2
-    per_sample_DMR_change_DMR_length_scatterplot(sample_2_concat_dmr_entropy_table,args.sample_name_2,args.plot_title,args.output_prefix)
-    # DMR length histogram for sample 1
-    per_sample_DMR_length_distribution_histogram(sample_1_concat_dmr_entropy_table,args.sample_name_1,args.plot_title,args.output_prefix)
-    # DMR length histogram for sample 2
-    per_sample_DMR_length_distribution_histogram(sample_2_concat_dmr_entropy_table,args.sample_name_2,args.plot_title,args.output_prefix)
-    # DMR change histogram for sample 1
-    per_sample_DMR_change_distribution_histogram(sample_1_concat_dmr_entropy_table,args.sample_name_1,args.plot_title,args.output_prefix)
-    # DMR change histogram for sample 2
-    per_sample_DMR_change_distribution_histogram(sample_2_concat_dmr_entropy_table,args.sample_name_2,args.plot_title,args.output_prefix)
+        dmr_entropy_table=dmr_entropy_table[(dmr_entropy_table['DMR length']<args.dmr_length_cutoff).to_numpy()].reset_index(drop=True)
+    # make each output plot - figures are independent, so render them with up to --jobs worker processes
+    plot_tasks=entropy_plot_tasks(args,entropy_histogram_data,read_count_scatter_data,pairwise_scatter_data,dmr_entropy_table)
+    with measure_stage(run_report,"render plots") as stage:
+        report_render_errors(render_plots(plot_tasks,args.jobs,run_report['plots'],render_manifest_path(args.output_prefix),args.rerender,figure_options))
+        stage['rows']=len(plot_tasks)
+    run_report['completed']=True
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
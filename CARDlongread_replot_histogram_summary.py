@@ -0,0 +1,33 @@
+#!/usr/bin/python
+
+# CARDlongread_replot_histogram_summary.py
+# script to redraw a histogram from the summary TSV written next to each histogram by CARDlongread_methylation_entropy_pairwise_comparison.py
+# only the fixed-bin histogram and KDE summary is read, so figures can be restyled without reloading the entropy/DMR inputs
+
+import argparse
+import matplotlib
+matplotlib.use('Agg')
+from CARDlongread_meth_stats import read_histogram_summary
+from CARDlongread_meth_plotting import plot_histogram_summary
+
+# subroutine to parse command line arguments
+def parse_args():
+    parser = argparse.ArgumentParser(description="Redraw a per sample histogram from its saved histogram/KDE summary TSV.")
+    # argument for summary input
+    parser.add_argument("--summary", required=True, help="Histogram summary TSV (e.g., (output_prefix)_(sample_name)_per_sample_entropy_distribution_histogram.tsv).")
+    # argument for output png
+    parser.add_argument("--output", required=True, help="Output png file.")
+    # arguments for labels
+    parser.add_argument("--xlabel", required=False, default="Methylation entropy per region", help="X-axis label (default \"Methylation entropy per region\").")
+    parser.add_argument("--ylabel", required=False, default="Proportion of regions", help="Y-axis label (default \"Proportion of regions\").")
+    parser.add_argument("--plot_title", required=False, default="ONT pairwise entropy comparison", help="Title for the output plot.")
+    # return parsed arguments
+    return parser.parse_args()
+
+# main script subroutine
+def main():
+    # Parse the arguments
+    args = parse_args()
+    plot_histogram_summary(read_histogram_summary(args.summary),args.xlabel,args.ylabel,args.plot_title,args.output)
+if __name__ == "__main__":
+    main()
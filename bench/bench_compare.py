@@ -0,0 +1,72 @@
+#!/usr/bin/python
+
+# bench_compare.py
+# compare two stage measurement JSON files from bench_pipeline_stages.py (e.g., runs on two commits with the same synthetic inputs)
+# prints wall time, CPU time, and peak RSS growth ratios per stage and exits with an error if any stage regressed past the thresholds
+
+import argparse
+import json
+
+# measurements compared per stage - JSON key and printed name
+COMPARED_MEASUREMENTS=[('wall_s','wall s'),('cpu_s','CPU s'),('peak_rss_delta_mb','peak RSS growth MB')]
+
+# subroutine to parse command line arguments
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare two bench_pipeline_stages.py JSON files and report stage regressions.")
+    # argument for baseline results
+    parser.add_argument("--baseline", required=True, help="Baseline stage measurement JSON (e.g., from the main branch).")
+    # argument for candidate results
+    parser.add_argument("--candidate", required=True, help="Candidate stage measurement JSON to check against the baseline.")
+    # argument for time regression threshold
+    parser.add_argument("--time_threshold", required=False, type=float, default=1.2, help="Candidate/baseline wall time ratio counted as a regression (default 1.2).")
+    # argument for memory regression threshold
+    parser.add_argument("--memory_threshold", required=False, type=float, default=1.2, help="Candidate/baseline peak RSS growth ratio counted as a regression (default 1.2).")
+    # argument for minimum memory compared
+    parser.add_argument("--min_mb", required=False, type=float, default=20.0, help="Stages growing RSS less than this in the baseline are not checked for memory regressions (default 20 MB).")
+    # argument for minimum time compared
+    parser.add_argument("--min_seconds", required=False, type=float, default=0.1, help="Stages faster than this in the baseline are not checked for time regressions (default 0.1 s).")
+    # return parsed arguments
+    return parser.parse_args()
+
+# subroutine to load stage measurements - returns (results, dict of (pipeline, stage) -> stage record)
+def load_stages(path):
+    with open(path) as f:
+        results=json.load(f)
+    return results, {(stage['pipeline'],stage['stage']): stage for stage in results['stages']}
+
+# subroutine to get a candidate/baseline ratio - None if the baseline is zero or missing
+def ratio(candidate_value,baseline_value):
+    if (candidate_value is None) or (not baseline_value):
+        return None
+    return candidate_value/baseline_value
+
+# main script subroutine
+def main():
+    # Parse the arguments
+    args = parse_args()
+    baseline_results, baseline_stages = load_stages(args.baseline)
+    candidate_results, candidate_stages = load_stages(args.candidate)
+    print("baseline:",baseline_results.get('label'),"- candidate:",candidate_results.get('label'))
+    if baseline_results.get('input_bytes')!=candidate_results.get('input_bytes'):
+        print("WARNING: baseline and candidate were run on different inputs.")
+    regressions=[]
+    for key, candidate_stage in candidate_stages.items():
+        if key not in baseline_stages:
+            print(" ".join(key),"- not in baseline")
+            continue
+        baseline_stage=baseline_stages[key]
+        ratios={measurement: ratio(candidate_stage.get(measurement),baseline_stage.get(measurement)) for measurement, _ in COMPARED_MEASUREMENTS}
+        print(" ".join(key),"-",", ".join(name + " " + str(round(baseline_stage[measurement],2)) + " -> " + str(round(candidate_stage[measurement],2)) + ("" if ratios[measurement] is None else " (" + str(round(ratios[measurement],2)) + "x)") for measurement, name in COMPARED_MEASUREMENTS))
+        if (ratios['wall_s'] is not None) and (baseline_stage['wall_s']>=args.min_seconds) and (ratios['wall_s']>args.time_threshold):
+            regressions.append(" ".join(key) + " wall time " + str(round(ratios['wall_s'],2)) + "x")
+        if (ratios['peak_rss_delta_mb'] is not None) and (baseline_stage['peak_rss_delta_mb']>=args.min_mb) and (ratios['peak_rss_delta_mb']>args.memory_threshold):
+            regressions.append(" ".join(key) + " peak RSS growth " + str(round(ratios['peak_rss_delta_mb'],2)) + "x")
+    if len(regressions)>0:
+        print("Regressions:")
+        for regression in regressions:
+            print(" ",regression)
+        quit('ERROR: ' + str(len(regressions)) + ' stage regression(s) past thresholds!')
+    print("No regressions past thresholds.")
+
+if __name__ == "__main__":
+    main()
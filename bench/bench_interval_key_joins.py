@@ -0,0 +1,78 @@
+#!/usr/bin/python
+
+# bench_interval_key_joins.py
+# benchmark joining per DMR entropy tables to DMR tables on "chrom:start-end" region_name strings vs. integer interval keys
+# generates synthetic DMRs, checks both joins give identical output, and prints timings
+
+import argparse
+import pandas as pd
+import numpy as np
+import time
+import os
+import sys
+
+# import interval key join from repository root
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from CARDlongread_meth_intervals import interval_key_merge
+
+# subroutine to parse command line arguments
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark region_name string joins against integer interval key joins on synthetic DMRs.")
+    # argument for number of DMRs
+    parser.add_argument("--num_dmrs", required=False, type=int, default=3000000, help="Number of synthetic DMRs (default 3,000,000).")
+    # argument for number of timing repeats
+    parser.add_argument("--repeats", required=False, type=int, default=3, help="Number of timing repeats per join (best time reported; default 3).")
+    # argument for random seed
+    parser.add_argument("--seed", required=False, type=int, default=0, help="Random seed for synthetic DMRs.")
+    # return parsed arguments
+    return parser.parse_args()
+
+# subroutine to make synthetic DMR and per DMR entropy tables with the dtypes used by CARDlongread_meth_io
+def make_synthetic_tables(num_dmrs,seed):
+    rng=np.random.default_rng(seed)
+    chrom_dtype=pd.CategoricalDtype(['chr' + str(i) for i in range(1,23)] + ['chrX','chrY'])
+    chroms=pd.Categorical.from_codes(rng.integers(0,len(chrom_dtype.categories),num_dmrs),dtype=chrom_dtype)
+    starts=rng.integers(0,248000000,num_dmrs).astype('int32')
+    ends=(starts+rng.integers(50,3000,num_dmrs)).astype('int32')
+    dmr_df=pd.DataFrame({'chrom': chroms, 'start': starts, 'end': ends, 'length': (ends-starts).astype('int32'), 'diff.Methy': rng.normal(0,0.3,num_dmrs).astype('float32')})
+    # entropy reported for a shuffled 90% subset of DMRs
+    entropy_idx=rng.permutation(num_dmrs)[:int(num_dmrs*0.9)]
+    entropy_df=pd.DataFrame({'chrom': chroms[entropy_idx], 'start': starts[entropy_idx], 'end': ends[entropy_idx], 'mean_entropy': rng.random(len(entropy_idx)).astype('float32'), 'mean_num_reads': rng.uniform(1,100,len(entropy_idx)).astype('float32')})
+    return entropy_df, dmr_df
+
+# subroutine for previous join - build region_name strings on both tables and merge on them
+def region_name_merge(entropy_df,dmr_df):
+    entropy_df=entropy_df.copy()
+    dmr_df=dmr_df.copy()
+    entropy_df['region_name']=entropy_df['chrom'].astype(str)+":"+entropy_df['start'].astype(int).astype(str)+"-"+entropy_df['end'].astype(int).astype(str)
+    dmr_df['region_name']=dmr_df['chrom'].astype(str)+":"+dmr_df['start'].astype(int).astype(str)+"-"+dmr_df['end'].astype(int).astype(str)
+    return pd.merge(entropy_df,dmr_df,on=['region_name']).drop(columns=['region_name'])
+
+# subroutine to time a join function - returns best wall time and last result
+def time_join(join_function,entropy_df,dmr_df,repeats):
+    best_time=None
+    for i in range(repeats):
+        start_time=time.perf_counter()
+        merged_df=join_function(entropy_df,dmr_df)
+        elapsed=time.perf_counter()-start_time
+        if (best_time is None) or (elapsed<best_time):
+            best_time=elapsed
+    return best_time, merged_df
+
+# main script subroutine
+def main():
+    # Parse the arguments
+    args = parse_args()
+    entropy_df, dmr_df = make_synthetic_tables(args.num_dmrs,args.seed)
+    string_time, string_merged_df = time_join(region_name_merge,entropy_df,dmr_df,args.repeats)
+    key_time, key_merged_df = time_join(interval_key_merge,entropy_df,dmr_df,args.repeats)
+    # both joins must give the same rows in the same order
+    if not string_merged_df.equals(key_merged_df):
+        quit('ERROR: region_name string join and interval key join outputs differ!')
+    print("DMRs:",args.num_dmrs,"- joined rows:",len(key_merged_df))
+    print("region_name string join:",round(string_time,3),"s")
+    print("integer interval key join:",round(key_time,3),"s")
+    print("speedup:",round(string_time/key_time,1),"x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/python
+
+# bench_pipeline_stages.py
+# time and memory-profile the load, join, aggregate, and render stages of the repository scripts on synthetic inputs
+# (bench_synthetic_data.py) and write the measurements to JSON, so runs on different commits can be compared (bench_compare.py)
+# stages call the same functions as each script's main(); the benchmark's join and aggregate stages stream their inputs again, so each includes the stages before it
+
+import argparse
+import contextlib
+import datetime
+import json
+import platform
+import subprocess
+import time
+import os
+import sys
+import pandas as pd
+import numpy as np
+
+# import repository scripts from repository root
+REPO_DIR=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,REPO_DIR)
+import CARDlongread_methylation_entropy_pairwise_comparison as entropy_script
+import CARDlongread_ONT_meth_benchmark as benchmark_script
+import modkit_sample_probs_comparison as sample_probs_script
+from CARDlongread_meth_io import load_bulk_entropy, load_region_entropy, load_modkit_dmr_segments, load_dss_dmrs, load_sample_probs, harmonize_chrom_categories
+from CARDlongread_meth_intervals import summarize_windows_over_regions
+from CARDlongread_meth_merge import iter_methylation_pieces, iter_merged_methylation_blocks
+from CARDlongread_meth_render_pool import render_plots, report_render_errors
+from CARDlongread_meth_instrument import measure_usage
+from bench_synthetic_data import write_synthetic_dataset, dataset_paths
+
+# pipelines that can be benchmarked
+PIPELINES=['entropy','benchmark','sample_probs']
+# DMR sets in per DMR entropy input order
+DMR_SETS=['modkit','dss_unsmoothed','dss_smoothed']
+
+# subroutine to parse command line arguments
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time and memory-profile pipeline stages on synthetic inputs and write the results to JSON.")
+    # argument for synthetic input directory
+    parser.add_argument("--data_dir", required=True, help="Directory of synthetic inputs (bench_synthetic_data.py) - generated there with --rows if missing.")
+    # argument for rows per bulk input when generating inputs
+    parser.add_argument("--rows", required=False, type=int, default=1000000, help="Rows per bulk input when generating synthetic inputs (default 1,000,000; 10^4 to 10^8).")
+    # argument for output JSON
+    parser.add_argument("--output", required=True, help="Output JSON file of stage measurements.")
+    # argument for pipelines to benchmark
+    parser.add_argument("--pipelines", required=False, nargs='+', choices=PIPELINES, default=PIPELINES, help="Pipelines to benchmark (default all).")
+    # argument for number of plot rendering processes
+    parser.add_argument("--jobs", required=False, type=int, default=1, help="Number of worker processes rendering plots (default 1).")
+    # argument for chunk size
+    parser.add_argument("--chunksize", required=False, type=int, default=None, help="Rows per chunk when reading inputs (default each script's default).")
+    # argument for run label
+    parser.add_argument("--label", required=False, default=None, help="Label stored with the results (default current git commit).")
+    # return parsed arguments
+    return parser.parse_args()
+
+# subroutine to get the current git commit of the repository - None outside a git checkout
+def git_commit():
+    try:
+        return subprocess.run(['git','-C',REPO_DIR,'rev-parse','--short','HEAD'],capture_output=True,text=True,check=True).stdout.strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+# subroutine to parse a repository script's arguments from an argument list
+def script_args(script,argv):
+    saved_argv=sys.argv
+    sys.argv=[script.__name__ + ".py"]+argv
+    try:
+        return script.parse_args()
+    finally:
+        sys.argv=saved_argv
+
+# subroutine to measure one stage (CARDlongread_meth_instrument.measure_usage) - yields the stage record so the stage can set its row count
+# the finished record, with peak RSS growth over the stage start added, is appended to stages
+@contextlib.contextmanager
+def measure_stage(stages,pipeline,stage_name):
+    record={'pipeline': pipeline, 'stage': stage_name, 'rows': None}
+    try:
+        with measure_usage(record):
+            yield record
+    finally:
+        # peak growth over the stage start - comparable across runs of different pipeline sets
+        record['peak_rss_delta_mb']=record['peak_rss_mb']-record['rss_start_mb']
+        record['rows_per_s']=record['rows']/record['wall_s'] if (record['rows'] is not None) and (record['wall_s']>0) else None
+        stages.append(record)
+        print(pipeline,stage_name,"-",record['rows'],"rows,",round(record['wall_s'],2),"s wall,",round(record['cpu_s'],2),"s CPU, peak RSS",round(record['peak_rss_mb'],1),"MB (+" + str(round(record['peak_rss_delta_mb'],1)) + " MB)")
+
+# subroutine to benchmark the entropy comparison (in-memory load, join, aggregate into binned accumulators, render, then streaming mode)
+def bench_entropy(paths,output_prefix,args,stages):
+    argv=['--sample_names','Sample1','Sample2','--bulk_entropy',paths['sample_1_bulk_entropy'],paths['sample_2_bulk_entropy'],
+        '--modkit_dmr_segments',paths['modkit_dmr_segments'],'--dss_unsmoothed_dmrs',paths['dss_unsmoothed_dmrs'],'--dss_smoothed_dmrs',paths['dss_smoothed_dmrs'],
+        '--output_prefix',output_prefix + "_entropy",'--scatter_mode','hist2d','--jobs',str(args.jobs)]
+    if args.chunksize is not None:
+        argv+=['--chunksize',str(args.chunksize)]
+    entropy_args=script_args(entropy_script,argv)
+    with measure_stage(stages,'entropy','load') as stage:
+        bulk_dfs=[load_bulk_entropy(paths['sample_' + str(idx) + '_bulk_entropy'],'c',args.chunksize) for idx in [1,2]]
+        dmr_dfs=[load_modkit_dmr_segments(paths['modkit_dmr_segments'],'c',args.chunksize),load_dss_dmrs(paths['dss_unsmoothed_dmrs'],'c',args.chunksize),load_dss_dmrs(paths['dss_smoothed_dmrs'],'c',args.chunksize)]
+        # DSS per DMR entropies from input - modkit DMR entropies are summarized from bulk windows in the join stage
+        sample_dss_entropy_dfs=[[load_region_entropy(paths['sample_' + str(idx) + '_' + dmr_set + '_dmr_entropy'],'c',args.chunksize) for dmr_set in DMR_SETS[1:]] for idx in [1,2]]
+        harmonize_chrom_categories(bulk_dfs+dmr_dfs+[df for dfs in sample_dss_entropy_dfs for df in dfs])
+        stage['rows']=sum(len(df) for df in bulk_dfs+dmr_dfs)+sum(len(df) for dfs in sample_dss_entropy_dfs for df in dfs)
+    with measure_stage(stages,'entropy','join') as stage:
+        sample_dmr_entropy_dfs=[[summarize_windows_over_regions(bulk_df,dmr_dfs[0])]+dss_entropy_dfs for bulk_df, dss_entropy_dfs in zip(bulk_dfs,sample_dss_entropy_dfs)]
+        dmr_entropy_table, entropy_table = entropy_script.build_sample_tables(entropy_args.sample_names,bulk_dfs,sample_dmr_entropy_dfs,dmr_dfs)
+        stage['rows']=len(entropy_table)
+    with measure_stage(stages,'entropy','aggregate') as stage:
+        accumulators=entropy_script.update_stream_accumulators(entropy_args,entropy_script.init_stream_accumulators(entropy_args),entropy_table)
+        stage['rows']=len(entropy_table)
+    with measure_stage(stages,'entropy','render') as stage:
+        plot_tasks=entropy_script.entropy_plot_tasks(entropy_args,accumulators['entropy_histograms'],accumulators['read_count_densities'],accumulators['pairwise_densities'],dmr_entropy_table)
+        report_render_errors(render_plots(plot_tasks,args.jobs))
+        stage['rows']=len(plot_tasks)
+    del bulk_dfs, entropy_table, dmr_entropy_table
+    # streaming mode - load, join, and aggregate one chromosome at a time
+    with measure_stage(stages,'entropy','stream') as stage:
+        _, entropy_histograms, _, _ = entropy_script.stream_sample_tables(entropy_args,dmr_dfs,[[None]+dfs for dfs in sample_dss_entropy_dfs])
+        stage['rows']=int(sum(histogram['counts'].sum() for histogram in entropy_histograms))
+
+# subroutine to benchmark the ONT methylation benchmark (parse each input, k-way merge, summarize, render and write the spreadsheet)
+def bench_benchmark(paths,output_prefix,args,stages):
+    argv=['--ont_methylbeds',paths['ont_1'],paths['ont_2'],'--bisulfite',paths['bisulfite'],'--output_prefix',output_prefix + "_benchmark",'--jobs',str(args.jobs)]
+    if args.chunksize is not None:
+        argv+=['--chunksize',str(args.chunksize)]
+    benchmark_args=script_args(benchmark_script,argv)
+    inputs=[(path,'modkit_pileup') for path in benchmark_args.ont_methylbeds]+[(path,'bismark_coverage') for path in benchmark_args.bisulfite]
+    with measure_stage(stages,'benchmark','load') as stage:
+        stage['rows']=sum(len(piece[0]) for path, input_type in inputs for _, piece in iter_methylation_pieces(path,input_type,benchmark_args.mod_code,benchmark_args.chunksize))
+    with measure_stage(stages,'benchmark','join') as stage:
+        stage['rows']=sum(len(block['position']) for block in iter_merged_methylation_blocks(inputs,benchmark_args.mod_code,benchmark_args.chunksize))
+    with measure_stage(stages,'benchmark','aggregate') as stage:
+        ont_names=benchmark_script.default_names(benchmark_args.ont_methylbeds)
+        bisulfite_names=benchmark_script.default_names(benchmark_args.bisulfite)
+        coverage_bounds=[benchmark_args.min_coverage]+sorted(bound for bound in set(benchmark_args.coverage_strata) if bound>benchmark_args.min_coverage)
+        summary=benchmark_script.init_benchmark_summary(ont_names,bisulfite_names,[(0,2),(1,2)],benchmark_args.prop_bins,benchmark_args.lineplot_bins,benchmark_args.hist_bins,coverage_bounds,benchmark_args.rank_bins)
+        stage['rows']=0
+        for block in iter_merged_methylation_blocks(inputs,benchmark_args.mod_code,benchmark_args.chunksize):
+            benchmark_script.update_benchmark_summary(summary,block,benchmark_args.min_coverage)
+            stage['rows']+=len(block['position'])
+        tables, figures, plot_tasks = benchmark_script.benchmark_report(summary,benchmark_args.prop_bins,benchmark_args.plot_title,benchmark_args.output_prefix)
+    with measure_stage(stages,'benchmark','render') as stage:
+        report_render_errors(render_plots(plot_tasks,args.jobs))
+        benchmark_script.make_benchmark_spreadsheet(tables,figures,benchmark_args.output_prefix)
+        stage['rows']=len(plot_tasks)
+
+# subroutine to benchmark the sample-probs comparison (load and concatenate inputs, partition by base/modification, render)
+def bench_sample_probs(paths,output_prefix,args,stages):
+    names=["Sample" + str(idx+1) for idx in range(len(paths['sample_probs']))]
+    sample_probs_args=script_args(sample_probs_script,['--input']+paths['sample_probs']+['--names']+names+['--output_prefix',output_prefix + "_sample_probs",'--jobs',str(args.jobs)])
+    with measure_stage(stages,'sample_probs','load') as stage:
+        meth_probabilities_df_list=[]
+        for path, name in zip(sample_probs_args.input,sample_probs_args.names):
+            meth_probabilities_df=load_sample_probs(path,'c',args.chunksize)
+            meth_probabilities_df['name']=name
+            meth_probabilities_df_list.append(meth_probabilities_df)
+        concat_meth_probabilities_df=pd.concat(meth_probabilities_df_list,ignore_index=True)
+        stage['rows']=len(concat_meth_probabilities_df)
+    del meth_probabilities_df_list
+    with measure_stage(stages,'sample_probs','aggregate') as stage:
+        unique_base_mod_pairs=sample_probs_script.get_bases_modifications(concat_meth_probabilities_df)
+        filtered_df=sample_probs_script.filter_ml_range(concat_meth_probabilities_df,sample_probs_args.min_ml,sample_probs_args.max_ml)
+        base_mod_rows=filtered_df.groupby(['code','primary_base'],observed=True,sort=False).indices
+        stage['rows']=len(filtered_df)
+    with measure_stage(stages,'sample_probs','render') as stage:
+        sample_probs_script.meth_likelihood_plot(unique_base_mod_pairs,concat_meth_probabilities_df,sample_probs_args.dependent_variable,sample_probs_args.plot_title,sample_probs_args.output_prefix,sample_probs_args.min_ml,sample_probs_args.max_ml,args.jobs)
+        stage['rows']=len(base_mod_rows)
+
+# main script subroutine
+def main():
+    # Parse the arguments
+    args = parse_args()
+    paths=dataset_paths(args.data_dir)
+    if not os.path.exists(paths['sample_1_bulk_entropy']):
+        generate_start_time=time.perf_counter()
+        write_synthetic_dataset(args.data_dir,args.rows)
+        print("Generated synthetic inputs with",args.rows,"rows per bulk input in",round(time.perf_counter()-generate_start_time,1),"s")
+    input_paths=[path for value in paths.values() for path in (value if isinstance(value,list) else [value])]
+    # plots and spreadsheets go next to the JSON output
+    output_prefix=os.path.splitext(args.output)[0]
+    stages=[]
+    bench_functions={'entropy': bench_entropy, 'benchmark': bench_benchmark, 'sample_probs': bench_sample_probs}
+    for pipeline in args.pipelines:
+        bench_functions[pipeline](paths,output_prefix,args,stages)
+    results={
+        'label': args.label if args.label is not None else git_commit(),
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'data_dir': os.path.abspath(args.data_dir),
+        'input_bytes': {os.path.basename(path): os.path.getsize(path) for path in input_paths},
+        'settings': {'jobs': args.jobs, 'chunksize': args.chunksize, 'pipelines': args.pipelines},
+        'environment': {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count()},
+        'stages': stages
+    }
+    with open(args.output,'w') as f:
+        json.dump(results,f,indent=2)
+    print("Wrote",len(stages),"stage measurements to",args.output)
+
+if __name__ == "__main__":
+    main()
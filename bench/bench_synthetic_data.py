@@ -0,0 +1,252 @@
+#!/usr/bin/python
+
+# bench_synthetic_data.py
+# generate synthetic inputs in the formats read by the repository scripts (modkit entropy bulk and per region BEDs, modkit dmr pair
+# segments, DSS callDMR tables, modkit sample-probs probabilities.tsv, modkit pileup bedMethyls, and Bismark coverage files)
+# rows are written one block at a time, so 10^8 row inputs can be generated in bounded memory; the same seed gives the same files
+
+import argparse
+import pandas as pd
+import numpy as np
+import os
+
+# hg38 primary assembly chromosome lengths - rows are spread over chromosomes in proportion to length
+HG38_CHROMOSOME_LENGTHS={
+    'chr1': 248956422, 'chr2': 242193529, 'chr3': 198295559, 'chr4': 190214555, 'chr5': 181538259, 'chr6': 170805979,
+    'chr7': 159345973, 'chr8': 145138636, 'chr9': 138394717, 'chr10': 133797422, 'chr11': 135086622, 'chr12': 133275309,
+    'chr13': 114364328, 'chr14': 107043718, 'chr15': 101991189, 'chr16': 90338345, 'chr17': 83257441, 'chr18': 80373285,
+    'chr19': 58617616, 'chr20': 64444167, 'chr21': 46709983, 'chr22': 50818468, 'chrX': 156040895, 'chrY': 57227415
+}
+# rows generated and written per block
+BLOCK_ROWS=1000000
+# modkit entropy window size (--window-size default 50 bp)
+ENTROPY_WINDOW=50
+# sample-probs base/modification codes (- is canonical)
+SAMPLE_PROBS_CODES=[('A','-'),('A','a'),('C','-'),('C','h'),('C','m')]
+
+# subroutine to parse command line arguments
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic modkit, DSS, and Bismark inputs for benchmarking the repository scripts.")
+    # argument for output directory
+    parser.add_argument("--output_dir", required=True, help="Directory to write synthetic inputs to (created if missing).")
+    # argument for rows per bulk input
+    parser.add_argument("--rows", required=False, type=int, default=1000000, help="Rows per bulk entropy window set, pileup bedMethyl, and sample-probs table (default 1,000,000).")
+    # argument for number of DMRs
+    parser.add_argument("--dmr_rows", required=False, type=int, default=None, help="DMRs per DMR set (default rows/200, at least 100).")
+    # argument for random seed
+    parser.add_argument("--seed", required=False, type=int, default=0, help="Random seed for synthetic inputs.")
+    # return parsed arguments
+    return parser.parse_args()
+
+# subroutine to get default DMRs per DMR set for a number of rows
+def default_dmr_rows(rows):
+    return max(rows//200,100)
+
+# subroutine to get the paths of a synthetic input set in output_dir
+def dataset_paths(output_dir):
+    paths={
+        'modkit_dmr_segments': os.path.join(output_dir,"modkit_dmr_segments.bed"),
+        'dss_unsmoothed_dmrs': os.path.join(output_dir,"dss_unsmoothed_dmrs.tsv"),
+        'dss_smoothed_dmrs': os.path.join(output_dir,"dss_smoothed_dmrs.tsv"),
+        'bisulfite': os.path.join(output_dir,"bisulfite.CpG_report.merged_CpG_evidence.cov"),
+        'sample_probs': [os.path.join(output_dir,"sample_" + str(idx) + "_probabilities.tsv") for idx in [1,2,3]]
+    }
+    for idx in [1,2]:
+        sample=os.path.join(output_dir,"sample_" + str(idx))
+        paths['sample_' + str(idx) + '_bulk_entropy']=sample + "_bulk_entropy.bed"
+        for dmr_set in ['modkit','dss_unsmoothed','dss_smoothed']:
+            paths['sample_' + str(idx) + '_' + dmr_set + '_dmr_entropy']=sample + "_" + dmr_set + "_dmr_entropy.bed"
+        paths['ont_' + str(idx)]=sample + "_pileup.bed"
+    return paths
+
+# subroutine to split rows over chromosomes in proportion to chromosome length (largest remainders get the leftover rows)
+def chromosome_row_counts(rows):
+    lengths=np.array(list(HG38_CHROMOSOME_LENGTHS.values()),dtype=np.float64)
+    shares=rows*lengths/lengths.sum()
+    counts=np.floor(shares).astype(np.int64)
+    counts[np.argsort(counts-shares)[:rows-counts.sum()]]+=1
+    return dict(zip(HG38_CHROMOSOME_LENGTHS,counts))
+
+# subroutine to generate sorted, non-overlapping positions chromosome by chromosome
+# yields (chromosome, positions, latent methylation level) blocks of at most BLOCK_ROWS rows; the same seed gives the same blocks,
+# so separate inputs (e.g., two samples, ONT and bisulfite) drawn from one seed share positions and methylation levels
+def iter_position_blocks(rows,seed,min_gap):
+    rng=np.random.default_rng(seed)
+    for chrom, chrom_rows in chromosome_row_counts(rows).items():
+        # mean gap spreads rows along the chromosome
+        mean_extra_gap=max(HG38_CHROMOSOME_LENGTHS[chrom]/max(chrom_rows,1)-min_gap,0)
+        last_position=10000
+        for block_start in range(0,chrom_rows,BLOCK_ROWS):
+            block_rows=min(BLOCK_ROWS,chrom_rows-block_start)
+            positions=last_position+np.cumsum(min_gap+rng.geometric(1/(mean_extra_gap+1),block_rows)-1)
+            last_position=positions[-1]
+            # bimodal methylation - most CpGs mostly methylated or mostly unmethylated
+            methylated=rng.random(block_rows)<0.7
+            levels=np.where(methylated,rng.beta(8,1.5,block_rows),rng.beta(1.2,10,block_rows))
+            yield chrom, positions, levels
+
+# subroutine to write data frame blocks to one tab-separated file (header from the first block if header is True)
+def write_table_blocks(path,table_blocks,header=False):
+    mode='w'
+    for table_df in table_blocks:
+        table_df.to_csv(path,sep='\t',header=header and (mode=='w'),index=False,mode=mode,float_format='%.6g')
+        mode='a'
+    # empty input - still write the file
+    if mode=='w':
+        open(path,'w').close()
+
+# subroutine to write one sample's modkit entropy bulk windows - keeps keep_fraction of the windows drawn from position_seed
+def write_bulk_entropy(path,rows,position_seed,sample_seed,keep_fraction=0.95):
+    rng=np.random.default_rng(sample_seed)
+    def table_blocks():
+        for chrom, positions, levels in iter_position_blocks(rows,position_seed,ENTROPY_WINDOW+1):
+            keep=rng.random(len(positions))<keep_fraction
+            starts=positions[keep]
+            # entropy is highest for intermediate methylation levels
+            entropy=np.clip(rng.beta(2,5,len(starts))+0.5*levels[keep]*(1-levels[keep]),0,1)
+            yield pd.DataFrame({'chrom': chrom, 'start': starts, 'end': starts+ENTROPY_WINDOW, 'entropy': entropy, 'strand': '.', 'num_reads': rng.poisson(25,len(starts))+1})
+    write_table_blocks(path,table_blocks())
+
+# subroutine to make sorted synthetic DMRs (chrom, start, end, length, methylation difference, region state)
+def make_dmrs(dmr_rows,seed):
+    rng=np.random.default_rng(seed+1)
+    dmr_blocks=[]
+    for chrom, positions, levels in iter_position_blocks(dmr_rows,seed,3001):
+        lengths=rng.integers(50,3000,len(positions))
+        dmr_blocks.append(pd.DataFrame({'chrom': chrom, 'start': positions, 'end': positions+lengths, 'length': lengths, 'diff': rng.normal(0,0.3,len(positions)), 'different': rng.random(len(positions))<0.6}))
+    return pd.concat(dmr_blocks,ignore_index=True)
+
+# subroutine to write modkit dmr pair segments (16 columns, no header)
+def write_modkit_dmr_segments(path,dmr_df,seed):
+    rng=np.random.default_rng(seed)
+    num_dmrs=len(dmr_df)
+    sample_a_fraction=rng.random(num_dmrs)
+    sample_b_fraction=np.clip(sample_a_fraction+dmr_df['diff'].to_numpy(),0,1)
+    n_sites=np.maximum(dmr_df['length'].to_numpy()//100,1)
+    segments_df=pd.DataFrame({
+        'chrom': dmr_df['chrom'], 'start': dmr_df['start'], 'end': dmr_df['end'],
+        'state-name': np.where(dmr_df['different'],'different','same'), 'score': rng.random(num_dmrs), 'N-sites': n_sites,
+        'sample_a_counts': 'm:' + (n_sites*10).astype(str), 'sample_b_counts': 'm:' + (n_sites*10).astype(str),
+        'sample_a_percents': 'm:' + np.round(sample_a_fraction*100,2).astype(str), 'sample_b_percents': 'm:' + np.round(sample_b_fraction*100,2).astype(str),
+        'sample_a_fraction_modified': sample_a_fraction, 'sample_b_fraction_modified': sample_b_fraction,
+        'effect_size': sample_a_fraction-sample_b_fraction, 'cohen_h': rng.normal(0,0.5,num_dmrs), 'cohen_h_low': rng.normal(-0.5,0.1,num_dmrs), 'cohen_h_high': rng.normal(0.5,0.1,num_dmrs)
+    })
+    write_table_blocks(path,[segments_df])
+
+# subroutine to write a DSS callDMR table (header; every tenth coordinate written as an R numeric, e.g., 1510.0)
+def write_dss_dmrs(path,dmr_df,seed):
+    rng=np.random.default_rng(seed)
+    num_dmrs=len(dmr_df)
+    float_rows=np.arange(num_dmrs)%10==0
+    def coordinate_strings(values):
+        strings=values.astype(str)
+        strings[float_rows]=strings[float_rows] + ".0"
+        return strings
+    mean_methy_1=rng.random(num_dmrs)
+    mean_methy_2=np.clip(mean_methy_1-dmr_df['diff'].to_numpy(),0,1)
+    dss_df=pd.DataFrame({
+        'chr': dmr_df['chrom'], 'start': coordinate_strings(dmr_df['start'].to_numpy()), 'end': coordinate_strings(dmr_df['end'].to_numpy()),
+        'length': dmr_df['length'], 'nCG': np.maximum(dmr_df['length'].to_numpy()//100,3), 'meanMethy1': mean_methy_1, 'meanMethy2': mean_methy_2,
+        'diff.Methy': mean_methy_1-mean_methy_2, 'areaStat': rng.normal(0,200,num_dmrs)
+    })
+    write_table_blocks(path,[dss_df],header=True)
+
+# subroutine to write one sample's per DMR entropies (modkit entropy --regions output, 14 columns) for 90% of DMRs
+def write_region_entropy(path,dmr_df,seed):
+    rng=np.random.default_rng(seed)
+    region_df=dmr_df[rng.random(len(dmr_df))<0.9]
+    num_regions=len(region_df)
+    mean_entropy=rng.beta(2,5,num_regions)
+    region_names=region_df['chrom'].astype(str) + ":" + region_df['start'].astype(str) + "-" + region_df['end'].astype(str)
+    entropy_df=pd.DataFrame({
+        'chrom': region_df['chrom'], 'start': region_df['start'], 'end': region_df['end'], 'region_name': region_names,
+        'mean_entropy': mean_entropy, 'strand': '.', 'median_entropy': mean_entropy, 'min_entropy': mean_entropy*rng.random(num_regions), 'max_entropy': np.minimum(mean_entropy*2,1),
+        'mean_num_reads': rng.gamma(25,1,num_regions), 'min_num_reads': 1, 'max_num_reads': rng.integers(30,200,num_regions),
+        'successful_window_count': np.maximum(region_df['length'].to_numpy()//ENTROPY_WINDOW,1), 'failed_window_count': rng.integers(0,3,num_regions)
+    })
+    write_table_blocks(path,[entropy_df])
+
+# subroutine to write a modkit pileup bedMethyl with strand-combined 5hmC (h) and 5mC (m) rows per CpG (rows//2 CpGs)
+def write_modkit_pileup(path,rows,position_seed,sample_seed):
+    rng=np.random.default_rng(sample_seed)
+    def table_blocks():
+        for chrom, positions, levels in iter_position_blocks(rows//2,position_seed,2):
+            num_cpgs=len(positions)
+            coverage=rng.poisson(30,num_cpgs)+1
+            count_m=rng.binomial(coverage,levels*0.95)
+            count_h=rng.binomial(coverage-count_m,0.05)
+            count_canonical=coverage-count_m-count_h
+            # h row then m row at each CpG
+            starts=np.repeat(positions,2)
+            valid_coverage=np.repeat(coverage,2)
+            count_modified=np.stack([count_h,count_m],axis=1).ravel()
+            yield pd.DataFrame({
+                'chrom': chrom, 'start': starts, 'end': starts+1, 'code': np.tile(['h','m'],num_cpgs), 'score': valid_coverage, 'strand': '.',
+                'thick_start': starts, 'thick_end': starts+1, 'color': '255,0,0', 'valid_coverage': valid_coverage,
+                'percent_modified': np.round(100*count_modified/valid_coverage,2), 'count_modified': count_modified, 'count_canonical': np.repeat(count_canonical,2),
+                'count_other_mod': np.stack([count_m,count_h],axis=1).ravel(), 'count_delete': 0, 'count_fail': np.repeat(rng.poisson(1,num_cpgs),2),
+                'count_diff': 0, 'count_nocall': 0
+            })
+    write_table_blocks(path,table_blocks())
+
+# subroutine to write a Bismark coverage file (1-based, merged CpG strands) covering 90% of the CpGs of the pileup bedMethyls
+def write_bismark_coverage(path,rows,position_seed,sample_seed):
+    rng=np.random.default_rng(sample_seed)
+    def table_blocks():
+        for chrom, positions, levels in iter_position_blocks(rows//2,position_seed,2):
+            keep=rng.random(len(positions))<0.9
+            starts=positions[keep]+1
+            coverage=rng.poisson(20,len(starts))+1
+            count_methylated=rng.binomial(coverage,levels[keep])
+            yield pd.DataFrame({'chrom': chrom, 'start': starts, 'end': starts+1, 'methylation_percentage': 100*count_methylated/coverage, 'count_methylated': count_methylated, 'count_unmethylated': coverage-count_methylated})
+    write_table_blocks(path,table_blocks())
+
+# subroutine to write a modkit sample-probs probabilities.tsv with rows split over base/modification codes (equal-width likelihood bins)
+def write_sample_probs(path,rows,seed):
+    rng=np.random.default_rng(seed)
+    bins=max(rows//len(SAMPLE_PROBS_CODES),1)
+    range_start=np.arange(bins)/bins
+    def table_blocks():
+        for primary_base, code in SAMPLE_PROBS_CODES:
+            # calls pile up at high likelihoods
+            counts=rng.poisson(1000*np.exp(4*range_start)*rng.uniform(0.5,1.5))
+            percentile_rank=np.cumsum(counts)/max(counts.sum(),1)
+            yield pd.DataFrame({'primary_base': primary_base, 'code': code, 'range_start': range_start, 'range_end': range_start+1/bins, 'count': counts, 'frac': counts/max(counts.sum(),1), 'percentile_rank': percentile_rank*100})
+    write_table_blocks(path,table_blocks(),header=True)
+
+# subroutine to write a full synthetic input set - returns its paths (see dataset_paths)
+def write_synthetic_dataset(output_dir,rows,dmr_rows=None,seed=0):
+    os.makedirs(output_dir,exist_ok=True)
+    if dmr_rows is None:
+        dmr_rows=default_dmr_rows(rows)
+    paths=dataset_paths(output_dir)
+    # both samples' windows, and ONT and bisulfite CpGs, share positions drawn from one seed each
+    for idx in [1,2]:
+        write_bulk_entropy(paths['sample_' + str(idx) + '_bulk_entropy'],rows,seed,seed+idx)
+        write_modkit_pileup(paths['ont_' + str(idx)],rows,seed+100,seed+100+idx)
+    write_bismark_coverage(paths['bisulfite'],rows,seed+100,seed+103)
+    # DMR sets drawn separately
+    for set_idx, dmr_set in enumerate(['modkit','dss_unsmoothed','dss_smoothed']):
+        dmr_seed=seed+200+10*set_idx
+        dmr_df=make_dmrs(dmr_rows,dmr_seed)
+        if dmr_set=='modkit':
+            write_modkit_dmr_segments(paths['modkit_dmr_segments'],dmr_df,dmr_seed+5)
+        else:
+            write_dss_dmrs(paths[dmr_set + '_dmrs'],dmr_df,dmr_seed+5)
+        for idx in [1,2]:
+            write_region_entropy(paths['sample_' + str(idx) + '_' + dmr_set + '_dmr_entropy'],dmr_df,dmr_seed+5+idx)
+    for idx, sample_probs_path in enumerate(paths['sample_probs']):
+        write_sample_probs(sample_probs_path,rows,seed+300+idx)
+    return paths
+
+# main script subroutine
+def main():
+    # Parse the arguments
+    args = parse_args()
+    if args.rows<=0:
+        quit('ERROR: --rows must be positive!')
+    write_synthetic_dataset(args.output_dir,args.rows,args.dmr_rows,args.seed)
+    print("Wrote synthetic inputs with",args.rows,"rows per bulk input to",args.output_dir)
+
+if __name__ == "__main__":
+    main()
@@ -9,16 +9,21 @@ import pandas as pd
 import numpy as np
 import seaborn as sb
 import matplotlib.pyplot as plt
-import time
-import psutil
 import os
-import re
+import concurrent.futures
+from CARDlongread_meth_render_pool import plot_task, render_plots, report_render_errors
+from CARDlongread_meth_render_manifest import add_render_manifest_arguments, render_manifest_path
+from CARDlongread_meth_figure_output import add_figure_output_arguments, figure_output_options, figure_data_only, set_figure_data, save_figure
+from CARDlongread_meth_plotting import hue_colors
+from CARDlongread_meth_io import load_sample_probs
+from CARDlongread_meth_cache import add_cache_arguments, cache_settings, cached_load
+from CARDlongread_meth_instrument import add_instrument_arguments, init_run_report, measure_stage
 
 # subroutine to parse command line arguments
 def parse_args():
     parser = argparse.ArgumentParser(description="Compare modkit sample-probs methylation probabilities TSVs between samples by drawing counts or fractions vs. methylation likelihood for given base/modification. Uses all provided bases/modifications by default.")
     # argument for inputs - 1 or more inputs
-    parser.add_argument("--input", required=True, nargs="*", help="Input methylation probabilities TSV file(s).")
+    parser.add_argument("--input", required=False, nargs="*", help="Input methylation probabilities TSV file(s).")
     # argument for names - 0 or more names
     parser.add_argument("--names", required=False, nargs="+", help="Name(s) of input methylation probabilities TSV file(s).")
     # argument for output prefix
@@ -31,66 +36,264 @@ def parse_args():
     parser.add_argument("--min_ml", required=False, type=float, help="Minimum methylation likelihood to plot (between 0 and 1).")
     # argument for maximum methylation likelihood
     parser.add_argument("--max_ml", required=False, type=float, help="Maximum methylation likelihood to plot (between 0 and 1).")
+    # argument for number of parallel plot rendering processes
+    parser.add_argument("--jobs", required=False, type=int, default=1, help="Number of worker processes rendering lineplots in parallel (default 1).")
+    # argument to redraw figures with unchanged inputs and parameters
+    add_render_manifest_arguments(parser)
+    # arguments for figure format, resolution, and data only output
+    add_figure_output_arguments(parser)
+    # argument for batch manifest
+    parser.add_argument("--manifest", required=False, help="Batch mode: TSV with path, name, and group columns (one row per methylation probabilities TSV) used instead of --input/--names.")
+    # argument for batch lineplot layout
+    parser.add_argument("--batch_plot", choices=["grouped", "faceted"], default="grouped", required=False, help="Batch mode lineplots: mean per group with 95%% confidence band (grouped, default) or one panel per group with a line per input (faceted).")
+    # argument for number of loading threads
+    parser.add_argument("--load_threads", required=False, type=int, default=4, help="Batch mode: number of threads loading and summarizing inputs concurrently (default 4).")
+    # arguments for persistent cache of parsed inputs
+    add_cache_arguments(parser)
+    # argument for per stage cProfile dumps (timing and memory are always written to the run report)
+    add_instrument_arguments(parser)
     # return parsed arguments
     return parser.parse_args()
     
+# labels per (modification code, primary base) - e.g., 6mA, 5mC, 5hmC, etc.
+# extend with new modkit codes (single letter or ChEBI) here; unlisted combinations are labeled (primary base)_(code)
+MODIFICATION_LABELS={
+    ('-','A'): 'A',
+    ('a','A'): '6mA',
+    ('-','C'): 'C',
+    ('m','C'): '5mC',
+    ('h','C'): '5hmC',
+    ('f','C'): '5fC',
+    ('c','C'): '5caC',
+    ('21839','C'): '4mC',
+    ('-','G'): 'G',
+    ('o','G'): '8oxoG',
+    ('-','T'): 'T',
+    ('g','T'): '5hmU',
+    ('e','T'): '5fU',
+    ('b','T'): '5caU',
+    ('17596','A'): 'Inosine'
+}
+
+# subroutine to label one base/modification combination
+def modification_label(code,primary_base):
+    return MODIFICATION_LABELS.get((str(code),str(primary_base)),str(primary_base) + "_" + str(code))
+
 # find unique list of base modifications and relabel to modification type
 def get_bases_modifications(meth_probabilities_df):
     # get unique set of 'code'/'primary_base' combinations
-    base_mod_combos=meth_probabilities_df[['code','primary_base']].drop_duplicates(ignore_index=True)
-    # relabel to modification type - e.g., 6mA, 5mC, 5hmC, etc.
-    base_mod_combos.insert(2,'label',np.nan)
-    # currently handles A, C, 6mA, 5mC, and 5hmC
-    base_mod_combos.loc[(base_mod_combos['code']=='-') & (base_mod_combos['primary_base']=='A'),'label']='A'
-    base_mod_combos.loc[(base_mod_combos['code']=='a') & (base_mod_combos['primary_base']=='A'),'label']='6mA'
-    base_mod_combos.loc[(base_mod_combos['code']=='-') & (base_mod_combos['primary_base']=='C'),'label']='C'
-    base_mod_combos.loc[(base_mod_combos['code']=='h') & (base_mod_combos['primary_base']=='C'),'label']='5hmC'
-    base_mod_combos.loc[(base_mod_combos['code']=='m') & (base_mod_combos['primary_base']=='C'),'label']='5mC'
+    base_mod_combos=meth_probabilities_df[['code','primary_base']].drop_duplicates(ignore_index=True).astype('object')
+    # relabel to modification type from lookup table
+    base_mod_combos['label']=pd.Series([modification_label(code,primary_base) for code, primary_base in zip(base_mod_combos['code'],base_mod_combos['primary_base'])],dtype='object')
     # return base_mod_combos object
     return(base_mod_combos)
 
-# make methylation likelihood plots for all base/modification combos    
-def meth_likelihood_plot(base_mod_combos,concat_meth_probabilities_df,dependent_variable,plot_title,output_prefix,min_ml,max_ml):
-    for idx in range(len(base_mod_combos)):
-        # for debugging
-        # print(idx)
-        # get base mod subset df
-        current_base_mod_subset_df=concat_meth_probabilities_df.loc[(concat_meth_probabilities_df['code']==base_mod_combos.loc[idx,'code']) & (concat_meth_probabilities_df['primary_base']==base_mod_combos.loc[idx,'primary_base'])]
-        # for debugging
-        # print(current_base_mod_subset_df)
-        # filter by min and max ML
-        # if (min_ml is not None):
-        #     current_base_mod_subset_df=current_base_mod_subset_df[current_base_mod_subset_df['range_start']>min_ml]
-        # if (max_ml is not None):
-        #    current_base_mod_subset_df=current_base_mod_subset_df[current_base_mod_subset_df['range_start']<max_ml]
-        # initialize figure
-        fig, ax = plt.subplots()
+# subroutine to keep methylation likelihood bins overlapping the min_ml to max_ml range (either may be None)
+def filter_ml_range(meth_probabilities_df,min_ml,max_ml):
+    keep=np.ones(len(meth_probabilities_df),dtype=bool)
+    if min_ml is not None:
+        keep&=(meth_probabilities_df['range_end']>=min_ml).to_numpy()
+    if max_ml is not None:
+        keep&=(meth_probabilities_df['range_start']<=max_ml).to_numpy()
+    return meth_probabilities_df[keep]
+
+# make methylation likelihood plots for all base/modification combos - each plot rendered by up to jobs worker processes
+# plot_usage (e.g., a run report's plots list) gets each plot's time and memory record; plots unchanged since the run recorded in manifest_path are skipped
+# figure_options (figure_output_options) sets the figure format and resolution or data only output
+def meth_likelihood_plot(base_mod_combos,concat_meth_probabilities_df,dependent_variable,plot_title,output_prefix,min_ml,max_ml,jobs=1,plot_usage=None,manifest_path=None,rerender=False,figure_options=None):
+    # filter by min and max ML once so fewer points are drawn
+    concat_meth_probabilities_df=filter_ml_range(concat_meth_probabilities_df,min_ml,max_ml)
+    # partition rows by base/modification once - dict of (code, primary_base) -> row positions
+    base_mod_rows=concat_meth_probabilities_df.groupby(['code','primary_base'],observed=True,sort=False).indices
+    plot_tasks=[]
+    for code, primary_base, label in base_mod_combos[['code','primary_base','label']].itertuples(index=False):
+        if (code,primary_base) not in base_mod_rows:
+            print("No",label,"methylation likelihoods between --min_ml and --max_ml, skipping lineplot.")
+            continue
+        # workers only receive this base/modification's rows
+        current_base_mod_subset_df=concat_meth_probabilities_df.iloc[base_mod_rows[(code,primary_base)]]
+        plot_tasks.append(plot_task(label + " methylation likelihood lineplot",single_meth_likelihood_plot,current_base_mod_subset_df,label,dependent_variable,plot_title,output_prefix,min_ml,max_ml))
+    report_render_errors(render_plots(plot_tasks,jobs,plot_usage,manifest_path,rerender,figure_options))
+
+# make methylation likelihood plot for a single base/modification combo
+def single_meth_likelihood_plot(current_base_mod_subset_df,label,dependent_variable,plot_title,output_prefix,min_ml,max_ml):
+    # initialize figure
+    fig, ax = plt.subplots()
+    # data only mode (CARDlongread_meth_figure_output.py) keeps the plotted data without drawing it
+    if figure_data_only():
+        set_figure_data(fig,current_base_mod_subset_df[['name','range_start','range_end','count' if dependent_variable=='counts' else 'frac']])
+    else:
         # set up lineplot - different configuration if plotting raw site counts or fractions
         if (dependent_variable == 'counts'):
             ax = sb.lineplot(x='range_start', y='count', hue='name', data=current_base_mod_subset_df)
             # use logarithmic y axis scale for counts
             ax.set_yscale('log')
             # set axis labels
-            ax.set(xlabel=base_mod_combos.loc[idx,'label'] + " methylation likelihood",ylabel="Counts")
+            ax.set(xlabel=label + " methylation likelihood",ylabel="Counts")
         elif (dependent_variable == 'fractions'):
             ax = sb.lineplot(x='range_start', y='frac', hue='name', data=current_base_mod_subset_df)
             # set axis labels
-            ax.set(xlabel=base_mod_combos.loc[idx,'label'] + " methylation likelihood",ylabel="Fractions")
-        # set x axis limits based on min and max ML (methylation likelihood) - tried doing ML filtering before
+            ax.set(xlabel=label + " methylation likelihood",ylabel="Fractions")
+        # set x axis limits based on min and max ML (methylation likelihood) - rows outside were filtered before plotting
         ax.set_xlim(min_ml,max_ml)
         # set plot title
         ax.set(title=plot_title)
         # set legend title
         ax.get_legend().set_title("Input")
-        # save figure - file name is (output_prefix)_(modification_name)_ML_lineplot.png
-        fig.savefig(output_prefix + "_" + base_mod_combos.loc[idx,'label'] + "_ML_lineplot.png", format='png', dpi=300, bbox_inches='tight')
-        # close figure
-        fig.clf()
+    # save figure - file name is (output_prefix)_(modification_name)_ML_lineplot.png
+    save_figure(fig,output_prefix + "_" + label + "_ML_lineplot.png",bbox_inches='tight')
+    # close figure
+    fig.clf()
         
+# batch mode subroutine to read the manifest - one row per input with path, name, and group
+def read_manifest(manifest_path):
+    manifest_df=pd.read_csv(manifest_path,sep='\t',dtype=str,comment='#')
+    missing_columns=[col for col in ['path','name','group'] if col not in manifest_df.columns]
+    if len(missing_columns)>0:
+        quit('ERROR: Manifest ' + manifest_path + ' is missing column(s) ' + ', '.join(missing_columns) + '!')
+    if manifest_df['name'].duplicated().any():
+        quit('ERROR: Manifest ' + manifest_path + ' has duplicate names!')
+    return manifest_df
+
+# batch mode subroutine to load one input and reduce it right away to per base/modification arrays of ML bin starts and the dependent variable
+# returns (name, group, dict of (code, primary_base) -> (range_start array, value array)); the loaded table is released on return
+def summarize_sample_probs(path,name,group,input_cache,dependent_variable,min_ml,max_ml):
+    meth_probabilities_df=filter_ml_range(cached_load(load_sample_probs,path,input_cache),min_ml,max_ml)
+    value_col='count' if dependent_variable=='counts' else 'frac'
+    range_starts=meth_probabilities_df['range_start'].to_numpy()
+    values=meth_probabilities_df[value_col].to_numpy()
+    base_mod_summaries={}
+    for (code,primary_base), rows in meth_probabilities_df.groupby(['code','primary_base'],observed=True,sort=False).indices.items():
+        base_mod_summaries[(str(code),str(primary_base))]=(range_starts[rows],values[rows])
+    return name, group, base_mod_summaries
+
+# batch mode subroutine to load and summarize all manifest inputs with a thread pool (file parsing releases the GIL)
+# returns list of (name, group, summaries) in manifest order
+def load_batch_summaries(manifest_df,input_cache,dependent_variable,min_ml,max_ml,load_threads):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(load_threads,1)) as executor:
+        futures=[executor.submit(summarize_sample_probs,row.path,row.name,row.group,input_cache,dependent_variable,min_ml,max_ml) for row in manifest_df.itertuples(index=False)]
+        return [future.result() for future in futures]
+
+# batch mode subroutine to get mean and 95% confidence half-width (normal approximation) of values per ML bin start across inputs
+def mean_and_ci_by_bin(range_start_arrays,value_arrays):
+    bin_starts, bin_idx = np.unique(np.concatenate(range_start_arrays),return_inverse=True)
+    values=np.concatenate(value_arrays).astype(np.float64)
+    n=np.bincount(bin_idx,minlength=len(bin_starts))
+    sums=np.bincount(bin_idx,weights=values,minlength=len(bin_starts))
+    sum_squares=np.bincount(bin_idx,weights=values*values,minlength=len(bin_starts))
+    means=sums/n
+    # sample standard deviation - zero width for bins seen in a single input
+    variances=np.where(n>1,(sum_squares-n*means*means)/np.maximum(n-1,1),0)
+    ci_half_widths=1.96*np.sqrt(np.maximum(variances,0)/n)
+    return bin_starts, means, ci_half_widths
+
+# batch mode subroutine to draw one base/modification as a line per group (mean across the group's inputs with 95% confidence band)
+def grouped_meth_likelihood_plot(group_arrays,label,dependent_variable,plot_title,output_prefix,min_ml,max_ml):
+    # initialize figure
+    fig, ax = plt.subplots()
+    colors=hue_colors(len(group_arrays))
+    # data only mode keeps the plotted data without drawing it
+    draw=not figure_data_only()
+    # plotted data - mean and 95% confidence half-width per group and ML bin
+    group_dfs=[]
+    for (group, (range_start_arrays, value_arrays)), color in zip(group_arrays.items(),colors):
+        bin_starts, means, ci_half_widths = mean_and_ci_by_bin(range_start_arrays,value_arrays)
+        group_dfs.append(pd.DataFrame({'group': group, 'inputs': len(value_arrays), 'range_start': bin_starts, 'mean': means, 'ci_half_width': ci_half_widths}))
+        if draw:
+            ax.plot(bin_starts,means,color=color,label=group + " (n=" + str(len(value_arrays)) + ")")
+            ax.fill_between(bin_starts,means-ci_half_widths,means+ci_half_widths,color=color,alpha=0.2,linewidth=0)
+    if draw:
+        # use logarithmic y axis scale for counts
+        if (dependent_variable == 'counts'):
+            ax.set_yscale('log')
+        # set axis labels
+        ax.set(xlabel=label + " methylation likelihood",ylabel="Counts" if dependent_variable=='counts' else "Fractions")
+        # set x axis limits based on min and max ML (methylation likelihood)
+        ax.set_xlim(min_ml,max_ml)
+        # set plot title
+        ax.set(title=plot_title)
+        # set legend title
+        ax.legend(title="Group")
+    set_figure_data(fig,pd.concat(group_dfs,ignore_index=True))
+    # save figure - file name is (output_prefix)_(modification_name)_ML_grouped_lineplot.png
+    save_figure(fig,output_prefix + "_" + label + "_ML_grouped_lineplot.png",bbox_inches='tight')
+    # close figure
+    fig.clf()
+
+# batch mode subroutine to draw one base/modification with one panel per group and one line per input
+# legends are drawn for panels with up to 12 inputs
+def faceted_meth_likelihood_plot(group_arrays,group_names,label,dependent_variable,plot_title,output_prefix,min_ml,max_ml):
+    # plotted data - one line per input
+    input_dfs=[pd.DataFrame({'group': group, 'name': name, 'range_start': range_starts, 'count' if dependent_variable=='counts' else 'frac': values}) for group, (range_start_arrays, value_arrays) in group_arrays.items() for name, range_starts, values in zip(group_names[group],range_start_arrays,value_arrays)]
+    # data only mode keeps the plotted data without drawing it
+    if figure_data_only():
+        fig=plt.figure()
+        set_figure_data(fig,pd.concat(input_dfs,ignore_index=True))
+    else:
+        # initialize figure with one panel per group sharing axes
+        fig, axes = plt.subplots(1,len(group_arrays),figsize=(4*len(group_arrays),4),sharex=True,sharey=True,squeeze=False)
+        for ax, (group, (range_start_arrays, value_arrays)) in zip(axes[0],group_arrays.items()):
+            colors=hue_colors(len(value_arrays))
+            for name, range_starts, values, color in zip(group_names[group],range_start_arrays,value_arrays,colors):
+                ax.plot(range_starts,values,color=color,label=name)
+            ax.set(title=group,xlabel=label + " methylation likelihood")
+            if len(value_arrays)<=12:
+                ax.legend(title="Input",fontsize='small')
+        # use logarithmic y axis scale for counts
+        if (dependent_variable == 'counts'):
+            axes[0][0].set_yscale('log')
+        axes[0][0].set(ylabel="Counts" if dependent_variable=='counts' else "Fractions")
+        # set x axis limits based on min and max ML (methylation likelihood)
+        axes[0][0].set_xlim(min_ml,max_ml)
+        # set plot title
+        fig.suptitle(plot_title)
+    # save figure - file name is (output_prefix)_(modification_name)_ML_faceted_lineplot.png
+    save_figure(fig,output_prefix + "_" + label + "_ML_faceted_lineplot.png",bbox_inches='tight')
+    # close figure
+    fig.clf()
+
+# batch mode subroutine to make grouped or faceted lineplots for every base/modification from per input summaries
+# plots unchanged since the run recorded in manifest_path are skipped
+def batch_meth_likelihood_plots(batch_summaries,batch_plot,dependent_variable,plot_title,output_prefix,min_ml,max_ml,jobs=1,plot_usage=None,manifest_path=None,rerender=False,figure_options=None):
+    # base/modification combinations in order of first appearance
+    base_mods=list(dict.fromkeys(base_mod for _, _, summaries in batch_summaries for base_mod in summaries))
+    plot_tasks=[]
+    for code, primary_base in base_mods:
+        label=modification_label(code,primary_base)
+        # group -> (range start arrays, value arrays) of this base/modification, groups and inputs in manifest order
+        group_arrays={}
+        group_names={}
+        for name, group, summaries in batch_summaries:
+            if (code,primary_base) in summaries:
+                range_starts, values = summaries[(code,primary_base)]
+                group_arrays.setdefault(group,([],[]))
+                group_arrays[group][0].append(range_starts)
+                group_arrays[group][1].append(values)
+                group_names.setdefault(group,[]).append(name)
+        if batch_plot=='grouped':
+            plot_tasks.append(plot_task(label + " grouped methylation likelihood lineplot",grouped_meth_likelihood_plot,group_arrays,label,dependent_variable,plot_title,output_prefix,min_ml,max_ml))
+        else:
+            plot_tasks.append(plot_task(label + " faceted methylation likelihood lineplot",faceted_meth_likelihood_plot,group_arrays,group_names,label,dependent_variable,plot_title,output_prefix,min_ml,max_ml))
+    report_render_errors(render_plots(plot_tasks,jobs,plot_usage,manifest_path,rerender,figure_options))
+
 # main script subroutine
 def main():
     # Parse the arguments
     args = parse_args()
+    # time and memory per stage and plot are written to (output_prefix)_run_report.json
+    run_report=init_run_report(os.path.basename(__file__),args.output_prefix,args.profile)
+    figure_options=figure_output_options(args)
+    # batch mode - inputs listed in manifest are reduced to per base/modification arrays as they load
+    if args.manifest is not None:
+        manifest_df=read_manifest(args.manifest)
+        with measure_stage(run_report,"load and summarize inputs") as stage:
+            batch_summaries=load_batch_summaries(manifest_df,cache_settings(args),args.dependent_variable,args.min_ml,args.max_ml,args.load_threads)
+            stage['rows']=sum(len(range_starts) for _, _, summaries in batch_summaries for range_starts, _ in summaries.values())
+        with measure_stage(run_report,"render plots") as stage:
+            batch_meth_likelihood_plots(batch_summaries,args.batch_plot,args.dependent_variable,args.plot_title,args.output_prefix,args.min_ml,args.max_ml,args.jobs,run_report['plots'],render_manifest_path(args.output_prefix),args.rerender,figure_options)
+            stage['rows']=len(run_report['plots'])
+        run_report['completed']=True
+        return
     # throw error if no input file provided
     if args.input is None:
         quit('ERROR: No input file (-input) provided!')
@@ -98,18 +301,24 @@ def main():
     if len(args.input)>1:
         if len(args.names)<=1:
             quit('ERROR: Multiple input files provided but not multiple names (-names).')
-    # import methylation probabilities TSV files
-    meth_probabilities_df_list=[0] * len(args.input)
-    for idx, i in enumerate(args.input):
-        meth_probabilities_df_list[idx]=pd.read_csv(i,sep='\t')
-        # add name column to each imported data frame based on --names argument order
-        meth_probabilities_df_list[idx]['name']=args.names[idx]
-    # concatenate data frames into single data frame
-    concat_meth_probabilities_df=pd.concat(meth_probabilities_df_list[:],ignore_index=True)
+    # import methylation probabilities TSV files - reused from --cache_dir when unchanged
+    input_cache=cache_settings(args)
+    with measure_stage(run_report,"load inputs") as stage:
+        meth_probabilities_df_list=[0] * len(args.input)
+        for idx, i in enumerate(args.input):
+            meth_probabilities_df_list[idx]=cached_load(load_sample_probs,i,input_cache)
+            # add name column to each imported data frame based on --names argument order
+            meth_probabilities_df_list[idx]['name']=args.names[idx]
+        # concatenate data frames into single data frame
+        concat_meth_probabilities_df=pd.concat(meth_probabilities_df_list[:],ignore_index=True)
+        stage['rows']=len(concat_meth_probabilities_df)
     # get base/modification list
     unique_base_mod_pairs=get_bases_modifications(concat_meth_probabilities_df)
     # make methylation likelihood plots
-    meth_likelihood_plot(unique_base_mod_pairs,concat_meth_probabilities_df,args.dependent_variable,args.plot_title,args.output_prefix,args.min_ml,args.max_ml)
+    with measure_stage(run_report,"render plots") as stage:
+        meth_likelihood_plot(unique_base_mod_pairs,concat_meth_probabilities_df,args.dependent_variable,args.plot_title,args.output_prefix,args.min_ml,args.max_ml,args.jobs,run_report['plots'],render_manifest_path(args.output_prefix),args.rerender,figure_options)
+        stage['rows']=len(run_report['plots'])
+    run_report['completed']=True
     
 if __name__ == "__main__":
     main()
\ No newline at end of file